@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016-2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Amazon Software License (the "License"). You may not use this file except in
+# compliance with the License. A copy of the License is located at
+#
+#     http://aws.amazon.com/asl/
+#
+# or in the "license" file accompanying this file. This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+"""Batch validation of archived request/response pairs.
+
+This module re-validates a JSONL corpus in which every line is a {"request": ..., "response": ...}
+record. Lines are read lazily, grouped into chunks and validated on a pool of worker processes,
+because validation is pure CPU work. It writes a JSON summary (counts per response name and per
+failing rule) and, optionally, a JSONL file with one line per failing record.
+
+Usage:
+    python validation.py corpus.jsonl --failures failures.jsonl
+    cat corpus.jsonl | python batch_validation.py - --workers 8
+"""
+
+import argparse
+import collections
+import json
+import multiprocessing
+import sys
+
+from validation import check_response,parse_json
+
+DEFAULT_CHUNK_SIZE = 1000
+INVALID_NAME = '<invalid>'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Validate a JSONL corpus of {"request", "response"} records.')
+    parser.add_argument('input',nargs='?',default='-',help='JSONL file to validate, or - for stdin (default)')
+    parser.add_argument('-f','--failures',help='write one JSON line per failing record to this file')
+    parser.add_argument('-w','--workers',type=int,default=multiprocessing.cpu_count(),help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('-c','--chunk-size',type=int,default=DEFAULT_CHUNK_SIZE,help='records per chunk sent to a worker (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    input_file = sys.stdin if args.input == '-' else open(args.input)
+    failures_file = open(args.failures,'w') if args.failures else None
+    try:
+        summary = validate_corpus(input_file,failures_file,args.workers,args.chunk_size)
+    finally:
+        if input_file is not sys.stdin: input_file.close()
+        if failures_file is not None: failures_file.close()
+
+    json.dump(summary,sys.stdout,indent=2,separators=(',',': '),sort_keys=True)
+    sys.stdout.write('\n')
+    return 1 if summary['invalid'] else 0
+
+def validate_corpus(lines,failures_file=None,workers=1,chunk_size=DEFAULT_CHUNK_SIZE):
+    """Validate every record in an iterable of JSONL lines and return the summary dict.
+
+    Chunks are validated on a pool of worker processes, with at most two chunks per worker in flight so
+    that memory stays bounded however large the corpus is. Results are merged in input order, so the
+    failures file lists failing records in the same order as the corpus.
+    """
+
+    summary = {
+        'records': 0,
+        'valid': 0,
+        'invalid': 0,
+        'responses': collections.Counter(),
+        'rules': collections.Counter()
+    }
+
+    chunks = iter_chunks(lines,chunk_size)
+    if workers <= 1:
+        for chunk in chunks:
+            merge_chunk_result(summary,validate_chunk(chunk),failures_file)
+    else:
+        pool = multiprocessing.Pool(workers)
+        try:
+            pending = collections.deque()
+            for chunk in chunks:
+                pending.append(pool.apply_async(validate_chunk,(chunk,)))
+                if len(pending) >= 2 * workers:
+                    merge_chunk_result(summary,pending.popleft().get(),failures_file)
+            while pending:
+                merge_chunk_result(summary,pending.popleft().get(),failures_file)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    summary['responses'] = dict(summary['responses'])
+    summary['rules'] = dict(summary['rules'])
+    return summary
+
+def iter_chunks(lines,chunk_size):
+    chunk = []
+    for line_number,line in enumerate(lines,1):
+        if not line.strip(): continue
+        chunk.append((line_number,line))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk: yield chunk
+
+def validate_chunk(chunk):
+    """Validate a chunk of (line number, line) pairs in a worker process.
+
+    Returns the response name and rule counts of the chunk together with its failure records, which
+    is all the parent process needs to merge into the summary.
+    """
+
+    responses = collections.Counter()
+    rules = collections.Counter()
+    failures = []
+
+    for line_number,line in chunk:
+        request_name,response_name,result = validate_line(line)
+        responses[response_name] += 1
+        if result is not None:
+            rules[result['rule']] += 1
+            result.update({'line': line_number,'request': request_name,'response': response_name})
+            failures.append(result)
+
+    return len(chunk),responses,rules,failures
+
+def validate_line(line):
+    try:
+        record = parse_json(line)
+        request = record['request']
+        response = record['response']
+    except (ValueError,KeyError,TypeError):
+        return INVALID_NAME,INVALID_NAME,{'rule': 'record.invalid','path': None,'message': 'line is not a {"request", "response"} JSON record'}
+
+    request_name = get_header_name(request)
+    response_name = get_header_name(response)
+    try:
+        result = check_response(request,response)
+    except Exception as error:
+        # Malformed responses can still trip the validator itself; count them instead of aborting the run
+        return request_name,response_name,{'rule': 'exception.' + type(error).__name__,'path': None,'message': format(error)}
+
+    if result.ok: return request_name,response_name,None
+    return request_name,response_name,{'rule': result.rule,'path': result.path,'message': str(result.to_error())}
+
+def get_header_name(message):
+    try:
+        name = message['header']['name']
+    except (KeyError,TypeError,IndexError):
+        return INVALID_NAME
+    return name if isinstance(name,(str,type(u''))) else INVALID_NAME
+
+def merge_chunk_result(summary,chunk_result,failures_file):
+    records,responses,rules,failures = chunk_result
+    summary['records'] += records
+    summary['invalid'] += len(failures)
+    summary['valid'] += records - len(failures)
+    summary['responses'].update(responses)
+    summary['rules'].update(rules)
+    if failures_file is not None:
+        for failure in failures:
+            failures_file.write(json.dumps(failure,sort_keys=True) + '\n')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016-2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Amazon Software License (the "License"). You may not use this file except in
+# compliance with the License. A copy of the License is located at
+#
+#     http://aws.amazon.com/asl/
+#
+# or in the "license" file accompanying this file. This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+"""Benchmarks for the validation package and the sample Lambda function.
+
+Micro benchmarks time validation.py on its own, per namespace and with valid and failing responses.
+Macro benchmarks time lambda_handler in lambda.py end to end. Import benchmarks time importing both
+modules in a fresh interpreter (cold) and executing their module body again in a warm one.
+
+Run it from the python directory; the results are written as JSON so that runs can be compared
+across commits:
+    python -m benchmarks --output before.json
+    python -m benchmarks --output after.json --compare before.json
+"""
+
+import os
+import sys
+import timeit
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDA_PATH = os.path.join(PYTHON_DIR,'lambda.py')
+VALIDATION_PATH = os.path.join(PYTHON_DIR,'validation.py')
+
+DEFAULT_REPEAT = 5
+DEFAULT_MIN_TIME = 0.1
+
+
+class Benchmark(object):
+    """A function to time, with the namespace and input it covers.
+
+    kind is 'micro' or 'macro', and expected is 'valid' or 'invalid'. setup and teardown, if given,
+    are called before and after the function is timed, outside of the timed loop.
+    """
+
+    def __init__(self,name,namespace,kind,expected,function,setup=None,teardown=None):
+        self.name = name
+        self.namespace = namespace
+        self.kind = kind
+        self.expected = expected
+        self.function = function
+        self.setup = setup
+        self.teardown = teardown
+
+def time_benchmark(benchmark,repeat=DEFAULT_REPEAT,min_time=DEFAULT_MIN_TIME):
+    """Time a benchmark and return its result dict, with times per call in microseconds.
+
+    The number of calls per repetition is raised by powers of ten until a repetition takes at least
+    min_time seconds; the median over repeat repetitions is the figure to compare.
+    """
+
+    if benchmark.setup is not None: benchmark.setup()
+    try:
+        timer = timeit.Timer(benchmark.function)
+        number = 1
+        while timer.timeit(number) < min_time and number < 10 ** 7:
+            number *= 10
+        timings = sorted(timer.timeit(number) / number * 1e6 for _ in range(repeat))
+    finally:
+        if benchmark.teardown is not None: benchmark.teardown()
+
+    return {
+        'namespace': benchmark.namespace,
+        'kind': benchmark.kind,
+        'expected': benchmark.expected,
+        'number': number,
+        'repeat': repeat,
+        'min_us': timings[0],
+        'median_us': timings[len(timings) // 2],
+        'max_us': timings[-1]
+    }
+
+def load_lambda_module(name='lambda_function',path=LAMBDA_PATH):
+    """Load lambda.py as a module; 'lambda' is a keyword, so it cannot be imported by name."""
+
+    if PYTHON_DIR not in sys.path: sys.path.insert(0,PYTHON_DIR)
+    try:
+        import importlib.util
+    except ImportError:
+        import imp
+        return imp.load_source(name,path)
+
+    spec = importlib.util.spec_from_file_location(name,path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except Exception:
+        del sys.modules[name]
+        raise
+    return module
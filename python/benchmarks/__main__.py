@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016-2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Amazon Software License (the "License"). You may not use this file except in
+# compliance with the License. A copy of the License is located at
+#
+#     http://aws.amazon.com/asl/
+#
+# or in the "license" file accompanying this file. This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+"""Run the benchmarks and write the results as JSON, optionally comparing them with a previous run.
+
+Usage:
+    python -m benchmarks --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import sys
+import time
+
+from benchmarks import DEFAULT_MIN_TIME,DEFAULT_REPEAT,PYTHON_DIR,load_lambda_module,time_benchmark
+from benchmarks.imports import DEFAULT_COLD_RUNS,time_imports
+from benchmarks.suite import build_benchmarks
+
+# A change in median time below this ratio is reported as noise
+COMPARE_THRESHOLD = 0.05
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark validation.py and lambda.py.')
+    parser.add_argument('-o','--output',help='write the JSON results to this file instead of stdout')
+    parser.add_argument('-c','--compare',help='compare the results with those of a previous run in this JSON file')
+    parser.add_argument('-k','--filter',help='only run benchmarks whose name contains this string')
+    parser.add_argument('-r','--repeat',type=int,default=DEFAULT_REPEAT,help='repetitions per benchmark (default: %(default)s)')
+    parser.add_argument('-t','--min-time',type=float,default=DEFAULT_MIN_TIME,help='minimum seconds per repetition (default: %(default)s)')
+    parser.add_argument('--cold-runs',type=int,default=DEFAULT_COLD_RUNS,help='fresh interpreters per cold import timing (default: %(default)s)')
+    parser.add_argument('--no-imports',action='store_true',help='skip the import timings')
+    args = parser.parse_args(argv)
+
+    # lambda.py logs every request and response; keep the records, but do not print them
+    logging.getLogger().addHandler(logging.NullHandler())
+
+    results = {
+        'environment': get_environment(),
+        'benchmarks': {},
+        'skipped': {}
+    }
+
+    try:
+        lambda_module = load_lambda_module()
+    except Exception as error:
+        lambda_module = None
+        results['skipped']['macro'] = 'lambda.py cannot be loaded: ' + type(error).__name__ + ': ' + format(error)
+
+    for benchmark in build_benchmarks(lambda_module):
+        if args.filter and args.filter not in benchmark.name: continue
+        result = time_benchmark(benchmark,args.repeat,args.min_time)
+        results['benchmarks'][benchmark.name] = result
+        sys.stderr.write('%-60s %12.2f us\n' % (benchmark.name,result['median_us']))
+
+    if not args.no_imports:
+        results['imports'] = time_imports(args.cold_runs,args.repeat)
+
+    output = json.dumps(results,indent=2,separators=(',',': '),sort_keys=True) + '\n'
+    if args.output:
+        with open(args.output,'w') as output_file:
+            output_file.write(output)
+    else:
+        sys.stdout.write(output)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        sys.stderr.write(format_comparison(baseline,results))
+    return 0
+
+def get_environment():
+    environment = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ',time.gmtime()),
+        'commit': None
+    }
+    try:
+        commit = subprocess.check_output(['git','rev-parse','HEAD'],cwd=PYTHON_DIR,stderr=subprocess.STDOUT)
+        environment['commit'] = commit.decode('ascii').strip()
+    except (OSError,subprocess.CalledProcessError):
+        pass
+    return environment
+
+def format_comparison(baseline,results):
+    """Return a table of the median time per benchmark in both runs, and their ratio."""
+
+    lines = ['%-60s %12s %12s %8s' % ('benchmark','baseline us','current us','ratio')]
+    for name in sorted(results['benchmarks']):
+        current = results['benchmarks'][name]['median_us']
+        if name not in baseline.get('benchmarks',{}):
+            lines.append('%-60s %12s %12.2f %8s' % (name,'-',current,'new'))
+            continue
+        previous = baseline['benchmarks'][name]['median_us']
+        ratio = current / previous
+        verdict = ''
+        if ratio > 1 + COMPARE_THRESHOLD: verdict = ' slower'
+        elif ratio < 1 - COMPARE_THRESHOLD: verdict = ' faster'
+        lines.append('%-60s %12.2f %12.2f %8.2f%s' % (name,previous,current,ratio,verdict))
+    return '\n'.join(lines) + '\n'
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016-2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Amazon Software License (the "License"). You may not use this file except in
+# compliance with the License. A copy of the License is located at
+#
+#     http://aws.amazon.com/asl/
+#
+# or in the "license" file accompanying this file. This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+"""Local HTTP stand-in for the Alexa directive channel, to load test lambda_handler without AWS.
+
+Every directive POSTed to the server, as the JSON request Alexa sends, is passed to lambda_handler in
+lambda.py with a LambdaContext that counts down from the function timeout, on a pool of worker threads
+or processes. The reply is the JSON the handler returned (200), or a Lambda error object (500) if it
+raised, with the handler time and the validation outcome (valid, or the id of the failing rule) in its
+X-Handler-Millis and X-Validation-Outcome headers. GET /stats returns the requests per outcome and the
+latency percentiles since the server started, which are also printed when it is stopped with Ctrl-C:
+    python -m benchmarks.directive_server --pool process --workers 4
+    curl -d @directive.json http://127.0.0.1:8080/
+"""
+
+import argparse
+import collections
+import json
+import logging
+import multiprocessing.pool
+import sys
+import threading
+import time
+import uuid
+
+try:
+    from http.server import BaseHTTPRequestHandler,HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler,HTTPServer
+    from SocketServer import ThreadingMixIn
+
+from benchmarks import load_lambda_module
+from validation import TIMER,parse_json
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT_MILLIS = 7000
+LATENCY_PERCENTILES = (50,90,99,99.9)
+
+VALID_OUTCOME = 'valid'
+POOL_KINDS = collections.OrderedDict([('thread','threads'),('process','processes')])
+
+
+class LambdaContext(object):
+    """Lambda context object of one invocation, whose remaining time counts down from timeout_millis."""
+
+    def __init__(self,timeout_millis=DEFAULT_TIMEOUT_MILLIS,function_name='lambda_handler',memory_limit_in_mb=128):
+        self.deadline = time.time() + timeout_millis / 1000.0
+        self.function_name = function_name
+        self.function_version = '$LATEST'
+        self.memory_limit_in_mb = memory_limit_in_mb
+        self.aws_request_id = str(uuid.uuid4())
+
+    def get_remaining_time_in_millis(self):
+        return max(0,int((self.deadline - time.time()) * 1000))
+
+
+"""Worker side: the sample Lambda function, loaded once per worker process."""
+
+lambda_module = None
+
+def init_worker():
+    global lambda_module
+    if lambda_module is not None: return
+    # lambda.py logs every request and response; keep the records, but do not print them
+    logging.getLogger().addHandler(logging.NullHandler())
+    lambda_module = load_lambda_module()
+
+def invoke(event,timeout_millis):
+    """Invoke lambda_handler as the Lambda runtime does, and return (status, body, outcome, handler_ms)."""
+
+    context = LambdaContext(timeout_millis)
+    started = TIMER()
+    try:
+        response = lambda_module.lambda_handler(event,context)
+    except Exception as error:
+        handler_ms = (TIMER() - started) * 1000
+        rule = getattr(error,'rule',None)
+        outcome = rule if rule is not None else 'error.' + type(error).__name__
+        body = {'errorType': type(error).__name__,'errorMessage': format(error)}
+        return 500,json.dumps(body),outcome,handler_ms
+
+    handler_ms = (TIMER() - started) * 1000
+    return 200,json.dumps(response),VALID_OUTCOME,handler_ms
+
+
+"""Server side."""
+
+class LatencyStats(object):
+    """Latencies of the requests served, per validation outcome; shared by the server threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.outcomes = collections.Counter()
+        self.latencies_ms = []
+        self.handler_latencies_ms = []
+
+    def record(self,outcome,latency_ms,handler_ms):
+        with self.lock:
+            self.outcomes[outcome] += 1
+            self.latencies_ms.append(latency_ms)
+            self.handler_latencies_ms.append(handler_ms)
+
+    def summary(self):
+        with self.lock:
+            elapsed = time.time() - self.started
+            requests = len(self.latencies_ms)
+            return {
+                'requests': requests,
+                'seconds': elapsed,
+                'requests_per_second': requests / elapsed if elapsed > 0 else 0.0,
+                'outcomes': dict(self.outcomes),
+                'latency_ms': percentiles(self.latencies_ms),
+                'handler_ms': percentiles(self.handler_latencies_ms)
+            }
+
+def percentiles(values):
+    if not values: return {}
+    values = sorted(values)
+    result = dict(('p' + format(percentile),values[min(len(values) - 1,int(len(values) * percentile / 100.0))]) for percentile in LATENCY_PERCENTILES)
+    result['max'] = values[-1]
+    return result
+
+class DirectiveServer(ThreadingMixIn,HTTPServer):
+    """HTTP server that invokes lambda_handler on a worker pool for every directive POSTed to it.
+
+    Each connection is served by its own thread, which waits for a worker of the pool; latency is
+    measured from the directive being read to the reply being ready, so it includes the wait. If
+    request_log is given, one JSON line per request is written to it.
+    """
+
+    daemon_threads = True
+
+    def __init__(self,address,pool,timeout_millis=DEFAULT_TIMEOUT_MILLIS,request_log=None):
+        HTTPServer.__init__(self,address,DirectiveRequestHandler)
+        self.pool = pool
+        self.timeout_millis = timeout_millis
+        self.request_log = request_log
+        self.request_log_lock = threading.Lock()
+        self.stats = LatencyStats()
+
+    def log_request(self,entry):
+        if self.request_log is None: return
+        line = json.dumps(entry,sort_keys=True) + '\n'
+        with self.request_log_lock:
+            self.request_log.write(line)
+
+class DirectiveRequestHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        started = TIMER()
+        try:
+            event = parse_json(body)
+        except ValueError:
+            return self.reply(400,json.dumps({'errorType': 'ValueError','errorMessage': 'directive must be valid JSON'}))
+
+        status,response_body,outcome,handler_ms = self.server.pool.apply(invoke,(event,self.server.timeout_millis))
+        latency_ms = (TIMER() - started) * 1000
+        self.server.stats.record(outcome,latency_ms,handler_ms)
+        self.server.log_request({'name': get_directive_name(event),'outcome': outcome,'latency_ms': latency_ms,'handler_ms': handler_ms})
+        self.reply(status,response_body,{'X-Handler-Millis': '%.3f' % handler_ms,'X-Validation-Outcome': outcome})
+
+    def do_GET(self):
+        if self.path.rstrip('/') != '/stats': return self.reply(404,json.dumps({'errorMessage': 'POST directives to any path, or GET /stats'}))
+        self.reply(200,json.dumps(self.server.stats.summary(),sort_keys=True))
+
+    def reply(self,status,body,headers=None):
+        if not isinstance(body,bytes): body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type','application/json')
+        self.send_header('Content-Length',str(len(body)))
+        for name,value in (headers or {}).items():
+            self.send_header(name,value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self,format,*args):
+        # Requests are counted in the stats and the request log instead of the access log on stderr
+        pass
+
+def get_directive_name(event):
+    try:
+        return event['header']['name']
+    except (KeyError,TypeError):
+        return None
+
+def create_pool(kind,workers):
+    """Return a pool of worker threads or processes, each with lambda.py loaded."""
+
+    if kind == 'thread':
+        # The threads share the module loaded here, as the invocations of one container would
+        init_worker()
+        return multiprocessing.pool.ThreadPool(workers)
+    return multiprocessing.Pool(workers,init_worker)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve lambda_handler over HTTP, as a local stand-in for the Alexa directive channel.')
+    parser.add_argument('--host',default=DEFAULT_HOST,help='address to listen on (default: %(default)s)')
+    parser.add_argument('-p','--port',type=int,default=DEFAULT_PORT,help='port to listen on (default: %(default)s)')
+    parser.add_argument('--pool',choices=list(POOL_KINDS),default='thread',help='run the handler on worker threads of one process, or on worker processes (default: %(default)s)')
+    parser.add_argument('-w','--workers',type=int,default=DEFAULT_WORKERS,help='size of the worker pool (default: %(default)s)')
+    parser.add_argument('--timeout',type=int,default=DEFAULT_TIMEOUT_MILLIS,help='function timeout in milliseconds that the context counts down from (default: %(default)s)')
+    parser.add_argument('--request-log',help='write one JSON line per request, with its outcome and latencies, to this file')
+    args = parser.parse_args(argv)
+
+    pool = create_pool(args.pool,args.workers)
+    request_log = open(args.request_log,'a') if args.request_log else None
+    server = DirectiveServer((args.host,args.port),pool,args.timeout,request_log)
+    sys.stderr.write('Serving lambda_handler on http://%s:%d/ with %d worker %s\n' % (args.host,server.server_address[1],args.workers,POOL_KINDS[args.pool]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.terminate()
+        if request_log is not None: request_log.close()
+
+    json.dump(server.stats.summary(),sys.stdout,indent=2,separators=(',',': '),sort_keys=True)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
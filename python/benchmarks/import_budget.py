@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016-2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Amazon Software License (the "License"). You may not use this file except in
+# compliance with the License. A copy of the License is located at
+#
+#     http://aws.amazon.com/asl/
+#
+# or in the "license" file accompanying this file. This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+"""Check the cold import time of validation.py and lambda.py against a budget.
+
+The import of lambda.py includes its warm-up, so its budget is the whole Lambda init cost of the
+sample function. The exit status is 1 if the median cold import of any module is over its budget:
+    python -m benchmarks.import_budget --validation-budget 50 --lambda-budget 100
+"""
+
+import argparse
+import sys
+
+from benchmarks.imports import DEFAULT_COLD_RUNS,IMPORTS,time_cold_import
+
+# Median cold import time, in milliseconds, allowed per module
+DEFAULT_BUDGETS = {
+    'validation': 50.0,
+    'lambda': 100.0
+}
+
+
+def check_budgets(budgets,cold_runs=DEFAULT_COLD_RUNS):
+    """Return a (name, median_ms, budget_ms) tuple per module, in the order of IMPORTS."""
+
+    results = []
+    for name,statement,_ in IMPORTS:
+        timings = time_cold_import(statement,cold_runs)
+        results.append((name,timings['median_ms'],budgets[name]))
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check the cold import time of validation.py and lambda.py against a budget.')
+    parser.add_argument('--validation-budget',type=float,default=DEFAULT_BUDGETS['validation'],help='milliseconds allowed for importing validation.py (default: %(default)s)')
+    parser.add_argument('--lambda-budget',type=float,default=DEFAULT_BUDGETS['lambda'],help='milliseconds allowed for importing lambda.py (default: %(default)s)')
+    parser.add_argument('--cold-runs',type=int,default=DEFAULT_COLD_RUNS,help='fresh interpreters per module (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    budgets = {'validation': args.validation_budget,'lambda': args.lambda_budget}
+    over_budget = 0
+    for name,median_ms,budget_ms in check_budgets(budgets,args.cold_runs):
+        verdict = 'ok'
+        if median_ms > budget_ms:
+            verdict = 'OVER BUDGET'
+            over_budget += 1
+        sys.stdout.write('%-10s %8.2f ms of %8.2f ms  %s\n' % (name,median_ms,budget_ms,verdict))
+    return 1 if over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016-2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Amazon Software License (the "License"). You may not use this file except in
+# compliance with the License. A copy of the License is located at
+#
+#     http://aws.amazon.com/asl/
+#
+# or in the "license" file accompanying this file. This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+"""Cold and warm import timings of validation.py and lambda.py.
+
+A cold import is timed inside a fresh interpreter, as on the first invocation of a new Lambda
+container: it includes reading the bytecode and importing every dependency, but not the startup of
+the interpreter itself. A warm import executes the already compiled module body again in the running
+interpreter, where every dependency is loaded, which is the module's own initialization cost.
+"""
+
+import subprocess
+import sys
+import timeit
+
+from benchmarks import LAMBDA_PATH,PYTHON_DIR,VALIDATION_PATH
+
+COLD_IMPORT_SCRIPT = '''
+import sys
+import timeit
+sys.path.insert(0,%(python_dir)r)
+from benchmarks import load_lambda_module
+start = timeit.default_timer()
+%(statement)s
+sys.stdout.write(repr(timeit.default_timer() - start))
+'''
+
+IMPORTS = [
+    ('validation','import validation',VALIDATION_PATH),
+    ('lambda','load_lambda_module()',LAMBDA_PATH)
+]
+
+DEFAULT_COLD_RUNS = 10
+
+
+def time_imports(cold_runs=DEFAULT_COLD_RUNS,repeat=5):
+    """Return the import timings of every module, in milliseconds, keyed by module name.
+
+    A module that fails to import is reported with an 'error' entry instead of timings.
+    """
+
+    results = {}
+    for name,statement,path in IMPORTS:
+        try:
+            results[name] = {
+                'cold': time_cold_import(statement,cold_runs),
+                'warm': time_warm_import(path,repeat)
+            }
+        except Exception as error:
+            results[name] = {'error': type(error).__name__ + ': ' + format(error)}
+    return results
+
+def time_cold_import(statement,runs):
+    script = COLD_IMPORT_SCRIPT % {'python_dir': PYTHON_DIR,'statement': statement}
+    timings = []
+    for _ in range(runs):
+        process = subprocess.Popen([sys.executable,'-c',script],cwd=PYTHON_DIR,stdout=subprocess.PIPE,stderr=subprocess.PIPE)
+        output,errors = process.communicate()
+        if process.returncode != 0: raise ImportError(errors.decode('utf-8','replace').strip().splitlines()[-1])
+        timings.append(float(output) * 1e3)
+    return summarize(timings)
+
+def time_warm_import(path,repeat):
+    with open(path,'rb') as source_file:
+        code = compile(source_file.read(),path,'exec')
+
+    def execute_module():
+        exec(code,{'__name__': 'benchmark_import','__file__': path})
+
+    execute_module()
+    timer = timeit.Timer(execute_module)
+    return summarize([timer.timeit(1) * 1e3 for _ in range(repeat)])
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        'runs': len(timings),
+        'min_ms': timings[0],
+        'median_ms': timings[len(timings) // 2],
+        'max_ms': timings[-1]
+    }
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016-2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Amazon Software License (the "License"). You may not use this file except in
+# compliance with the License. A copy of the License is located at
+#
+#     http://aws.amazon.com/asl/
+#
+# or in the "license" file accompanying this file. This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+"""Requests and responses used as benchmark inputs.
+
+Every input is built deterministically, so that runs on different commits time the same work.
+Failing responses are copies of valid ones with a single field broken, see invalidate().
+"""
+
+import copy
+
+MESSAGE_ID = '01ebf625-0b89-4c4d-b3aa-32340e894688'
+ACCESS_TOKEN = 'benchmark-access-token'
+DISCOVERY_APPLIANCE_LIMIT = 300
+
+
+def generate_request(namespace,name,payload):
+    return {
+        'header': {
+            'namespace': namespace,
+            'name': name,
+            'payloadVersion': '2',
+            'messageId': MESSAGE_ID
+        },
+        'payload': payload
+    }
+
+def generate_response(request,name,payload):
+    return {
+        'header': {
+            'namespace': request['header']['namespace'],
+            'name': name,
+            'payloadVersion': '2',
+            'messageId': request['header']['messageId']
+        },
+        'payload': payload
+    }
+
+def generate_appliance(index):
+    return {
+        'applianceId': 'Benchmark-Dimmer-' + str(index),
+        'manufacturerName': 'Benchmark Manufacturer',
+        'modelName': 'Dimmer',
+        'version': '1',
+        'friendlyName': 'Living Room Light ' + str(index),
+        'friendlyDescription': 'Dimmer number ' + str(index) + ' used by the benchmarks',
+        'isReachable': True,
+        'actions': [
+            'turnOn',
+            'turnOff',
+            'setPercentage',
+            'incrementPercentage',
+            'decrementPercentage'
+        ],
+        'additionalApplianceDetails': {
+            'room': 'Living Room',
+            'hubId': 'hub-' + str(index % 8)
+        }
+    }
+
+def discovery_request():
+    return generate_request('Alexa.ConnectedHome.Discovery','DiscoverAppliancesRequest',{'accessToken': ACCESS_TOKEN})
+
+def discovery_response(request,appliance_count):
+    appliances = [generate_appliance(index) for index in range(appliance_count)]
+    return generate_response(request,'DiscoverAppliancesResponse',{'discoveredAppliances': appliances})
+
+def control_request(name,appliance_id,payload=None):
+    request_payload = {
+        'accessToken': ACCESS_TOKEN,
+        'appliance': {
+            'applianceId': appliance_id,
+            'additionalApplianceDetails': {}
+        }
+    }
+    request_payload.update(payload or {})
+    return generate_request('Alexa.ConnectedHome.Control',name,request_payload)
+
+def query_request(name,appliance_id):
+    request = control_request(name,appliance_id)
+    request['header']['namespace'] = 'Alexa.ConnectedHome.Query'
+    return request
+
+def target_temperature_response(request):
+    return generate_response(request,'GetTargetTemperatureResponse',{
+        'targetTemperature': {
+            'value': 21.0
+        },
+        'temperatureMode': {
+            'value': 'AUTO'
+        },
+        'applianceResponseTimestamp': '2017-01-01T00:00:00Z'
+    })
+
+def health_check_request():
+    return generate_request('Alexa.ConnectedHome.System','HealthCheckRequest',{'initiationTimestamp': '1435302567000'})
+
+def health_check_response(request):
+    return generate_response(request,'HealthCheckResponse',{
+        'isHealthy': True,
+        'description': 'The system is currently healthy'
+    })
+
+def invalidate(message,path,value):
+    """Return a copy of message with the field at path, a list of keys and indexes, set to value."""
+
+    message = copy.deepcopy(message)
+    parent = message
+    for key in path[:-1]:
+        parent = parent[key]
+    parent[path[-1]] = value
+    return message
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016-2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Amazon Software License (the "License"). You may not use this file except in
+# compliance with the License. A copy of the License is located at
+#
+#     http://aws.amazon.com/asl/
+#
+# or in the "license" file accompanying this file. This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+"""Check that every broken response of a synthetic workload fails the rule its mutation breaks.
+
+Every record is checked with check_response, which must not raise, and must return the expected rule
+of the record, or CHECK_OK if the response was not broken. Requests are never broken by the workload,
+so MALFORMED_REQUEST_HEADERS adds a discovery request with each of those headers, and a few control
+requests, including one in the wrong namespace, are checked against a discovery with the discovery
+index enabled. The exit status is 1 if any verdict differs, or if a mutation is never drawn, which more records or another seed fixes:
+    python -m benchmarks.rule_coverage --records 30000 --seed 7
+"""
+
+import argparse
+import collections
+import json
+import sys
+
+from benchmarks.inputs import control_request,discovery_request,discovery_response,generate_response,health_check_request,health_check_response
+from benchmarks.workload import MUTATIONS,WorkloadGenerator
+from validation import check_response,disable_discovery_index,enable_discovery_index
+
+DEFAULT_RECORDS = 30000
+DEFAULT_ERROR_SHARE = 0.2
+DEFAULT_INVALID_SHARE = 0.5
+NAMESPACE_MIX = [
+    ('Alexa.ConnectedHome.Discovery',10),
+    ('Alexa.ConnectedHome.Control',50),
+    ('Alexa.ConnectedHome.Query',30),
+    ('Alexa.ConnectedHome.System',10)
+]
+
+MALFORMED_REQUEST_HEADERS = [
+    ('request.invalid',{'name': 'DiscoverAppliancesRequest'}),
+    ('request.name.missing',{'namespace': 'Alexa.ConnectedHome.Discovery'}),
+    ('request.name.invalid',{'namespace': 'Alexa.ConnectedHome.Discovery','name': 'UnknownRequest'}),
+    ('request.namespace.invalid',{'namespace': 'Alexa.ConnectedHome.Unknown','name': 'DiscoverAppliancesRequest'})
+]
+
+
+def check_rule(request,response):
+    try:
+        result = check_response(request,response)
+    except Exception as error:
+        return 'exception.' + type(error).__name__
+    return None if result.ok else result.rule
+
+def malformed_request_records():
+    request = discovery_request()
+    response = discovery_response(request,1)
+    for rule,header in MALFORMED_REQUEST_HEADERS:
+        yield {'request': dict(request,header=header),'response': response,'expected': rule}
+
+def discovery_index_records():
+    """Yield a discovery, and then control requests that the discovery index checks against it."""
+
+    request = discovery_request()
+    yield {'request': request,'response': discovery_response(request,1),'expected': None}
+    request = control_request('TurnOnRequest','Benchmark-Dimmer-0')
+    yield {'request': request,'response': generate_response(request,'TurnOnConfirmation',{}),'expected': None}
+    request = control_request('TurnOnRequest','Benchmark-Dimmer-1')
+    yield {'request': request,'response': generate_response(request,'TurnOnConfirmation',{}),'expected': 'appliance.undiscovered'}
+    # Not a control request name, for an appliance the index knows
+    request = control_request('HealthCheckRequest','Benchmark-Dimmer-0')
+    yield {'request': request,'response': health_check_response(health_check_request()),'expected': None}
+
+def find_wrong_verdicts(records):
+    """Return the records whose rule is not the expected one, and the number of records per expected rule."""
+
+    wrong = []
+    expected_rules = collections.Counter()
+    for record in records:
+        rule = check_rule(record['request'],record['response'])
+        if rule != record['expected']: wrong.append({'expected': record['expected'],'actual': rule,'response': record['response']})
+        expected_rules[record['expected']] += 1
+    return wrong,expected_rules
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check that every broken response of a synthetic workload fails the rule its mutation breaks.')
+    parser.add_argument('-n','--records',type=int,default=DEFAULT_RECORDS,help='number of records (default: %(default)s)')
+    parser.add_argument('-s','--seed',type=int,default=0,help='random seed (default: %(default)s)')
+    parser.add_argument('-e','--error-share',type=float,default=DEFAULT_ERROR_SHARE,help='share of directives answered with an error response (default: %(default)s)')
+    parser.add_argument('-i','--invalid-share',type=float,default=DEFAULT_INVALID_SHARE,help='share of invalid responses (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    generator = WorkloadGenerator(args.seed,namespace_mix=NAMESPACE_MIX,error_share=args.error_share,invalid_share=args.invalid_share)
+    wrong,expected_rules = find_wrong_verdicts(generator.records(args.records))
+    wrong_requests,_ = find_wrong_verdicts(malformed_request_records())
+    enable_discovery_index()
+    try:
+        wrong_indexed,indexed_rules = find_wrong_verdicts(discovery_index_records())
+    finally:
+        disable_discovery_index()
+    wrong.extend(wrong_requests + wrong_indexed)
+    never_drawn = sorted(set(mutation.rule for mutation in MUTATIONS) - set(expected_rules))
+
+    for verdict in wrong[:10]:
+        sys.stderr.write(json.dumps(verdict,sort_keys=True,default=repr) + '\n')
+    summary = {
+        'records': args.records + len(MALFORMED_REQUEST_HEADERS) + sum(indexed_rules.values()),
+        'wrong': len(wrong),
+        'never_drawn': never_drawn
+    }
+    json.dump(summary,sys.stdout,indent=2,separators=(',',': '),sort_keys=True)
+    sys.stdout.write('\n')
+    return 1 if wrong or never_drawn else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016-2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Amazon Software License (the "License"). You may not use this file except in
+# compliance with the License. A copy of the License is located at
+#
+#     http://aws.amazon.com/asl/
+#
+# or in the "license" file accompanying this file. This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+"""Check that the compiled schema engine gives the same verdicts as the rules of validation.py.
+
+Every record of a synthetic workload is checked with the rules alone and with the engine enabled,
+and the (ok, rule, path) results are compared. The workload breaks a large share of the responses by
+default, so that every rule is hit, and every discovery response is also checked with its arrays
+replaced by tuples, strings and list subclasses, which JSON validators may take for arrays, and with
+its request sent in every other namespace, which the workload never does. The exit status is 1 if any verdict differs, or if the schema of a response rejects it although it passes the
+rules, which would make the engine useless for it:
+    python -m benchmarks.schema_parity --records 20000 --seed 7
+"""
+
+import argparse
+import collections
+import json
+import sys
+
+import validation
+from benchmarks.workload import DEFAULT_ERROR_SHARE,WorkloadGenerator
+from validation_schema import enable_compiled_schemas
+
+DEFAULT_RECORDS = 20000
+DEFAULT_INVALID_SHARE = 0.5
+
+
+def check_verdict(request,response):
+    try:
+        result = validation.check_response(request,response)
+    except Exception as error:
+        return ('raised',type(error).__name__)
+    return (result.ok,result.rule,result.path)
+
+class ApplianceList(list):
+    pass
+
+def with_sequence_variants(records):
+    """Yield every record, followed by variants of each discovery response with other sequence types."""
+
+    for record in records:
+        yield record
+        response = record['response']
+        try:
+            appliances = response['payload']['discoveredAppliances']
+        except (KeyError,TypeError):
+            continue
+        if not isinstance(appliances,list): continue
+
+        for variant in [tuple(appliances),ApplianceList(appliances)]:
+            yield with_payload(record,{'discoveredAppliances': variant})
+        if appliances and isinstance(appliances[0],dict) and isinstance(appliances[0].get('actions'),list):
+            for actions in [tuple(appliances[0]['actions']),' '.join(appliances[0]['actions']),ApplianceList(appliances[0]['actions'])]:
+                yield with_payload(record,{'discoveredAppliances': [dict(appliances[0],actions=actions)] + appliances[1:]})
+
+def with_namespace_variants(records):
+    """Yield every record, followed by variants of it whose request has each other namespace."""
+
+    for record in records:
+        yield record
+        for namespace in validation.NAMESPACE_CHECKS:
+            if namespace == record['request']['header']['namespace']: continue
+            header = dict(record['request']['header'],namespace=namespace)
+            yield dict(record,request=dict(record['request'],header=header))
+
+def with_payload(record,payload):
+    response = dict(record['response'],payload=dict(record['response']['payload'],**payload))
+    return dict(record,response=response)
+
+def is_schema_namespace(record):
+    """Return whether the schema of the response stands in for the check of the request namespace."""
+
+    return record['response']['header']['name'] in validation.SCHEMA_RESPONSE_NAME_SETS.get(record['request']['header']['namespace'],())
+
+def compare_engines(records,engine):
+    """Return the records whose verdicts differ, and the response names whose valid responses the schemas reject."""
+
+    mismatches = []
+    rejected_valid = collections.Counter()
+    for record in records:
+        validation.disable_schema_engine()
+        expected = check_verdict(record['request'],record['response'])
+        validation.enable_schema_engine(engine)
+        rejected = engine.rejected
+        actual = check_verdict(record['request'],record['response'])
+        if actual != expected:
+            mismatches.append({'expected': expected,'actual': actual,'response': record['response']})
+        elif expected[0] is True and engine.rejected > rejected and is_schema_namespace(record):
+            rejected_valid[record['response']['header']['name']] += 1
+    validation.disable_schema_engine()
+    return mismatches,rejected_valid
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check that the compiled schema engine gives the same verdicts as the rules of validation.py.')
+    parser.add_argument('-n','--records',type=int,default=DEFAULT_RECORDS,help='number of records (default: %(default)s)')
+    parser.add_argument('-s','--seed',type=int,default=0,help='random seed (default: %(default)s)')
+    parser.add_argument('-e','--error-share',type=float,default=DEFAULT_ERROR_SHARE,help='share of directives answered with an error response (default: %(default)s)')
+    parser.add_argument('-i','--invalid-share',type=float,default=DEFAULT_INVALID_SHARE,help='share of invalid responses (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    engine = enable_compiled_schemas()
+    if engine is None:
+        sys.stderr.write('fastjsonschema is not installed\n')
+        return 2
+    validation.disable_schema_engine()
+
+    generator = WorkloadGenerator(args.seed,error_share=args.error_share,invalid_share=args.invalid_share)
+    mismatches,rejected_valid = compare_engines(with_namespace_variants(with_sequence_variants(generator.records(args.records))),engine)
+
+    for mismatch in mismatches[:10]:
+        sys.stderr.write(json.dumps(mismatch,sort_keys=True,default=repr) + '\n')
+    summary = {
+        'records': args.records,
+        'mismatches': len(mismatches),
+        'rejected_valid': dict(rejected_valid),
+        'engine': engine.stats()
+    }
+    json.dump(summary,sys.stdout,indent=2,separators=(',',': '),sort_keys=True)
+    sys.stdout.write('\n')
+    return 1 if mismatches or rejected_valid else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016-2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Amazon Software License (the "License"). You may not use this file except in
+# compliance with the License. A copy of the License is located at
+#
+#     http://aws.amazon.com/asl/
+#
+# or in the "license" file accompanying this file. This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+"""Micro benchmarks of validation.py and macro benchmarks of lambda_handler, per namespace.
+
+Benchmark names read <namespace>.<function>.<input>.<valid|invalid>, and must stay stable so that
+results can be compared across commits.
+"""
+
+import random
+
+import validation
+from benchmarks import Benchmark
+from benchmarks import inputs
+
+
+class FakeContext(object):
+    """The part of the Lambda context object that lambda_handler uses."""
+
+    def __init__(self,remaining_time_in_millis=6000):
+        self.remaining_time_in_millis = remaining_time_in_millis
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_time_in_millis
+
+def build_benchmarks(lambda_module=None):
+    """Return the micro benchmarks, and the macro benchmarks if lambda_module is given."""
+
+    benchmarks = build_micro_benchmarks()
+    if lambda_module is not None: benchmarks += build_macro_benchmarks(lambda_module)
+    return benchmarks
+
+def build_micro_benchmarks():
+    benchmarks = []
+
+    # Discovery
+    request = inputs.discovery_request()
+    response_1 = inputs.discovery_response(request,1)
+    response_300 = inputs.discovery_response(request,inputs.DISCOVERY_APPLIANCE_LIMIT)
+    last_appliance = ['payload','discoveredAppliances',inputs.DISCOVERY_APPLIANCE_LIMIT - 1]
+    benchmarks += [
+        validate_response_benchmark('discovery.validateResponse.1.valid','Discovery',request,response_1),
+        validate_response_benchmark('discovery.validateResponse.300.valid','Discovery',request,response_300),
+        validate_response_benchmark('discovery.validateResponse.300.invalid','Discovery',request,inputs.invalidate(response_300,last_appliance + ['friendlyName'],'Light #300')),
+        validate_response_benchmark('discovery.validateResponse.301.invalid','Discovery',request,inputs.discovery_response(request,inputs.DISCOVERY_APPLIANCE_LIMIT + 1)),
+        validate_response_benchmark('discovery.validateResponse.header.invalid','Discovery',request,inputs.invalidate(response_300,['header','payloadVersion'],'1')),
+        validate_response_benchmark('discovery.validateDiscoveryResponse.300.valid','Discovery',request,response_300,validation.validateDiscoveryResponse),
+        validate_response_benchmark('discovery.validateResponse.300.cached.valid','Discovery',request,response_300,
+            setup=validation.enable_appliance_cache,teardown=validation.disable_appliance_cache)
+    ]
+
+    # Control
+    request = inputs.control_request('TurnOnRequest','Benchmark-Dimmer-0')
+    response = inputs.generate_response(request,'TurnOnConfirmation',{})
+    temperature_request = inputs.control_request('SetTargetTemperatureRequest','Benchmark-Thermostat-0',{'targetTemperature': {'value': 40.0}})
+    error_response = inputs.generate_response(temperature_request,'ValueOutOfRangeError',{'minimumValue': 5.0,'maximumValue': 30.0})
+    benchmarks += [
+        validate_response_benchmark('control.validateResponse.confirmation.valid','Control',request,response),
+        validate_response_benchmark('control.validateResponse.confirmation.invalid','Control',request,inputs.invalidate(response,['header','messageId'],'message id!')),
+        validate_response_benchmark('control.validateResponse.confirmation.sampled.valid','Control',request,response,sampled_validate(0.05)),
+        validate_response_benchmark('control.validateResponse.error.valid','Control',temperature_request,error_response),
+        validate_response_benchmark('control.validateResponse.error.invalid','Control',temperature_request,inputs.invalidate(error_response,['payload','maximumValue'],'thirty'))
+    ]
+
+    # Query
+    request = inputs.query_request('GetTargetTemperatureRequest','Benchmark-Thermostat-0')
+    response = inputs.target_temperature_response(request)
+    benchmarks += [
+        validate_response_benchmark('query.validateResponse.targetTemperature.valid','Query',request,response),
+        validate_response_benchmark('query.validateResponse.targetTemperature.invalid','Query',request,inputs.invalidate(response,['payload','temperatureMode','value'],'WARM'))
+    ]
+
+    # System
+    request = inputs.health_check_request()
+    response = inputs.health_check_response(request)
+    benchmarks += [
+        validate_response_benchmark('system.validateResponse.healthCheck.valid','System',request,response),
+        validate_response_benchmark('system.validateResponse.healthCheck.invalid','System',request,inputs.invalidate(response,['payload','isHealthy'],'yes'))
+    ]
+
+    return benchmarks
+
+def build_macro_benchmarks(lambda_module):
+    context = FakeContext()
+    benchmarks = [
+        lambda_handler_benchmark('discovery.lambda_handler.sample.valid','Discovery',lambda_module,inputs.discovery_request(),context),
+        lambda_handler_benchmark('control.lambda_handler.turnOn.valid','Control',lambda_module,inputs.control_request('TurnOnRequest','Switch-001'),context),
+        lambda_handler_benchmark('control.lambda_handler.setTargetTemperature.valid','Control',lambda_module,inputs.control_request('SetTargetTemperatureRequest','ThermostatAuto-001',{'targetTemperature': {'value': 22.0}}),context),
+        lambda_handler_benchmark('control.lambda_handler.noSuchTarget.valid','Control',lambda_module,inputs.control_request('TurnOnRequest','Unknown-001'),context),
+        lambda_handler_benchmark('query.lambda_handler.targetTemperature.valid','Query',lambda_module,inputs.query_request('GetTargetTemperatureRequest','ThermostatAuto-001'),context),
+        lambda_handler_benchmark('control.lambda_handler.context.invalid','Control',lambda_module,inputs.control_request('TurnOnRequest','Switch-001'),FakeContext(10000))
+    ]
+    return benchmarks
+
+def validate_response_benchmark(name,namespace,request,response,validate=validation.validateResponse,setup=None,teardown=None):
+    result = validation.check_response(request,response)
+    expected = 'valid' if result.ok else 'invalid'
+    if not name.endswith('.' + expected): raise AssertionError(name + ' is ' + expected + ': ' + format(result.rule))
+
+    if result.ok: return Benchmark(name,namespace,'micro',expected,lambda: validate(request,response),setup,teardown)
+    return Benchmark(name,namespace,'micro',expected,lambda: expect_validation_error(validate,request,response),setup,teardown)
+
+def sampled_validate(fraction):
+    policy = validation.SamplingPolicy(fraction,random_source=random.Random(0))
+    return lambda request,response: validation.validateResponse(request,response,policy)
+
+def lambda_handler_benchmark(name,namespace,lambda_module,event,context):
+    if name.endswith('.valid'): return Benchmark(name,namespace,'macro','valid',lambda: lambda_module.lambda_handler(event,context))
+    return Benchmark(name,namespace,'macro','invalid',lambda: expect_validation_error(lambda_module.lambda_handler,event,context))
+
+def expect_validation_error(function,*args):
+    try:
+        function(*args)
+    except validation.ValidationError:
+        return
+    raise AssertionError(function.__name__ + ' did not raise ValidationError')
@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016-2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Amazon Software License (the "License"). You may not use this file except in
+# compliance with the License. A copy of the License is located at
+#
+#     http://aws.amazon.com/asl/
+#
+# or in the "license" file accompanying this file. This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+"""Synthetic request/response corpora of any size, shaped like production traffic.
+
+A pool of accounts is generated first, each with its own mix of switches, dimmers, thermostats and
+locks. Records are then streamed one at a time: a Discovery, Control, Query or HealthCheck request
+from a random account, and the response a skill would send. A share of the responses are error
+responses, and a share are broken by one of the MUTATIONS below, so that every rule in validation.py
+is hit. Every record is a {"request", "response", "expected"} JSON line, where expected is the rule id
+the response must fail, or null; batch_validation.py reads the same format and ignores expected.
+
+Only random.random() is drawn from the generator, so a seed produces the same corpus on Python 2
+and 3. Memory is bounded by the account pool; the number of records is not.
+
+Usage:
+    python -m benchmarks.workload --records 1000000 --seed 7 --invalid-share 0.05 > corpus.jsonl
+"""
+
+import argparse
+import collections
+import copy
+import json
+import random
+import sys
+
+from validation import MAX_DISCOVERED_APPLIANCES,REQUIRED_DISCOVERED_APPLIANCE_KEYS,REQUIRED_HEADER_KEYS,VALID_CONTROL_RESPONSE_NAMES,VALID_NON_EMPTY_PAYLOAD_RESPONSE_NAMES,VALID_QUERY_RESPONSE_NAMES,VALID_RESPONSE_NAMES
+
+DEFAULT_ACCOUNTS = 1000
+DEFAULT_APPLIANCES = (1,50)
+DEFAULT_NAMESPACE_MIX = [
+    ('Alexa.ConnectedHome.Discovery',2),
+    ('Alexa.ConnectedHome.Control',70),
+    ('Alexa.ConnectedHome.Query',25),
+    ('Alexa.ConnectedHome.System',3)
+]
+DEFAULT_ERROR_SHARE = 0.05
+DEFAULT_INVALID_SHARE = 0.05
+BASE_TIMESTAMP = 1483228800
+
+DeviceType = collections.namedtuple('DeviceType',['name','weight','actions','control_requests','query_requests'])
+
+DEVICE_TYPES = [
+    DeviceType('Switch',4,['turnOn','turnOff'],['TurnOnRequest','TurnOffRequest'],[]),
+    DeviceType('Dimmer',3,['turnOn','turnOff','setPercentage','incrementPercentage','decrementPercentage'],
+        ['TurnOnRequest','TurnOffRequest','SetPercentageRequest','IncrementPercentageRequest','DecrementPercentageRequest'],[]),
+    DeviceType('Thermostat',2,['setTargetTemperature','incrementTargetTemperature','decrementTargetTemperature','getTargetTemperature','getTemperatureReading'],
+        ['SetTargetTemperatureRequest','IncrementTargetTemperatureRequest','DecrementTargetTemperatureRequest'],['GetTargetTemperatureRequest','GetTemperatureReadingRequest']),
+    DeviceType('Lock',1,['setLockState','getLockState'],['SetLockStateRequest'],['GetLockStateRequest'])
+]
+ROOMS = ['Living Room','Kitchen','Bedroom','Office','Hallway','Garage','Küche','Badezimmer']
+
+# Error responses a skill sends instead of a confirmation, with a valid payload for each
+ERROR_PAYLOADS = [
+    ('TargetOfflineError',{}),
+    ('BridgeOfflineError',{}),
+    ('NoSuchTargetError',{}),
+    ('DriverInternalError',{}),
+    ('ExpiredAccessTokenError',{}),
+    ('ValueOutOfRangeError',{'minimumValue': 5.0,'maximumValue': 30.0}),
+    ('DependentServiceUnavailableError',{'dependentServiceName': 'Customer Credentials Database'}),
+    ('TargetFirmwareOutdatedError',{'minimumFirmwareVersion': '17','currentFirmwareVersion': '6'}),
+    ('UnableToGetValueError',{'errorInfo': {'code': 'DEVICE_BUSY','description': 'The device is busy'}}),
+    ('UnableToSetValueError',{'errorInfo': {'code': 'DEVICE_JAMMED','description': 'The device is jammed'}}),
+    ('UnwillingToSetValueError',{'errorInfo': {'code': 'ThermostatIsOff','description': 'The thermostat is off'}}),
+    ('RateLimitExceededError',{'rateLimit': '10','timeUnit': 'HOUR'}),
+    ('NotSupportedInCurrentModeError',{'currentDeviceMode': 'AWAY'}),
+    ('UnexpectedInformationReceivedError',{'faultingParameter': 'value'})
+]
+
+
+"""Mutations that break a valid response so that it fails exactly one rule."""
+
+Mutation = collections.namedtuple('Mutation',['rule','response_names','path','value'])
+
+# Path placeholder for a random appliance of a discovery response, and value that deletes the key
+APPLIANCE = '<appliance>'
+DELETE = '<delete>'
+
+def other_response_name(response):
+    name = response['header']['name']
+    if name.endswith('Confirmation'): return 'TurnOffConfirmation' if name == 'TurnOnConfirmation' else 'TurnOnConfirmation'
+    return 'GetLockStateResponse' if name != 'GetLockStateResponse' else 'GetTargetTemperatureResponse'
+
+def too_many_appliances(response):
+    appliances = response['payload']['discoveredAppliances']
+    return [appliances[index % len(appliances)] for index in range(MAX_DISCOVERED_APPLIANCES + 1)]
+
+def build_mutations():
+    any_response = None
+    discovery = frozenset(['DiscoverAppliancesResponse'])
+    directive_responses = frozenset(VALID_CONTROL_RESPONSE_NAMES + VALID_QUERY_RESPONSE_NAMES)
+    empty_payloads = frozenset(VALID_RESPONSE_NAMES) - frozenset(VALID_NON_EMPTY_PAYLOAD_RESPONSE_NAMES) - discovery - frozenset(['HealthCheckResponse'])
+    non_empty_payloads = frozenset(VALID_NON_EMPTY_PAYLOAD_RESPONSE_NAMES)
+    temperature_confirmations = frozenset(['SetTargetTemperatureConfirmation','IncrementTargetTemperatureConfirmation','DecrementTargetTemperatureConfirmation'])
+    lock_states = frozenset(['SetLockStateConfirmation','GetLockStateResponse'])
+    unable = frozenset(['UnableToGetValueError','UnableToSetValueError'])
+
+    mutations = [
+        Mutation('response.header.missing',any_response,['header'],DELETE),
+        Mutation('response.payload.missing',any_response,['payload'],DELETE),
+        Mutation('header.namespace.invalid',any_response,['header','namespace'],'Alexa.ConnectedHome.Unknown'),
+        Mutation('header.name.invalid',any_response,['header','name'],'UnknownResponse'),
+        Mutation('header.name.mismatch',directive_responses,['header','name'],other_response_name),
+        Mutation('header.payloadVersion.invalid',any_response,['header','payloadVersion'],'1'),
+        Mutation('header.messageId.charset',any_response,['header','messageId'],'message id!'),
+        Mutation('header.messageId.empty',any_response,['header','messageId'],''),
+        Mutation('header.messageId.length',any_response,['header','messageId'],'a' * 128),
+        Mutation('header.messageId.type',any_response,['header','messageId'],12345),
+        Mutation('header.type',any_response,['header'],7),
+        Mutation('payload.type',any_response,['payload'],[]),
+        Mutation('payload.mustBeEmpty',empty_payloads,['payload','unexpected'],True),
+        Mutation('payload.empty',non_empty_payloads,['payload'],{}),
+
+        # Discovery
+        Mutation('discovery.discoveredAppliances.missing',discovery,['payload','discoveredAppliances'],DELETE),
+        Mutation('discovery.discoveredAppliances.type',discovery,['payload','discoveredAppliances'],{}),
+        Mutation('discovery.discoveredAppliances.limit',discovery,['payload','discoveredAppliances'],too_many_appliances),
+        Mutation('discovery.appliance.type',discovery,['payload','discoveredAppliances',APPLIANCE],'Living Room Light'),
+        Mutation('discovery.applianceId.empty',discovery,['payload','discoveredAppliances',APPLIANCE,'applianceId'],' '),
+        Mutation('discovery.applianceId.length',discovery,['payload','discoveredAppliances',APPLIANCE,'applianceId'],'a' * 257),
+        Mutation('discovery.applianceId.charset',discovery,['payload','discoveredAppliances',APPLIANCE,'applianceId'],'appliance id'),
+        Mutation('discovery.applianceId.type',discovery,['payload','discoveredAppliances',APPLIANCE,'applianceId'],17),
+        Mutation('discovery.friendlyName.charset',discovery,['payload','discoveredAppliances',APPLIANCE,'friendlyName'],'Light #1'),
+        Mutation('discovery.isReachable.type',discovery,['payload','discoveredAppliances',APPLIANCE,'isReachable'],'yes'),
+        Mutation('discovery.actions.type',discovery,['payload','discoveredAppliances',APPLIANCE,'actions'],'turnOn'),
+        Mutation('discovery.actions.empty',discovery,['payload','discoveredAppliances',APPLIANCE,'actions'],[]),
+        Mutation('discovery.actions.invalid',discovery,['payload','discoveredAppliances',APPLIANCE,'actions'],['turnOn','dance']),
+        Mutation('discovery.additionalApplianceDetails.size',discovery,['payload','discoveredAppliances',APPLIANCE,'additionalApplianceDetails'],{'blob': 'x' * 5000}),
+
+        # Control and query payloads
+        Mutation('payload.targetTemperature.missing',temperature_confirmations,['payload','targetTemperature'],DELETE),
+        Mutation('payload.targetTemperature.type',temperature_confirmations,['payload','targetTemperature'],21.5),
+        Mutation('payload.targetTemperature.value.type',temperature_confirmations | frozenset(['GetTargetTemperatureResponse']),['payload','targetTemperature','value'],'warm'),
+        Mutation('payload.targetTemperature.value.type',temperature_confirmations,['payload','targetTemperature','value'],None),
+        Mutation('payload.temperatureMode.value.invalid',temperature_confirmations | frozenset(['GetTargetTemperatureResponse']),['payload','temperatureMode','value'],'WARM'),
+        Mutation('payload.previousState.missing',temperature_confirmations,['payload','previousState'],DELETE),
+        Mutation('payload.previousState.temperatureMode.type',temperature_confirmations,['payload','previousState','temperatureMode'],'AUTO'),
+        Mutation('payload.previousState.targetTemperature.value.type',temperature_confirmations,['payload','previousState','targetTemperature','value'],'cold'),
+        Mutation('payload.previousState.temperatureMode.value.invalid',temperature_confirmations,['payload','previousState','temperatureMode','value'],'WARM'),
+        Mutation('payload.lockState.invalid',lock_states,['payload','lockState'],'OPEN'),
+        Mutation('payload.temperatureReading.type',frozenset(['GetTemperatureReadingResponse']),['payload','temperatureReading'],None),
+        Mutation('payload.temperatureReading.value.type',frozenset(['GetTemperatureReadingResponse']),['payload','temperatureReading','value'],'warm'),
+        Mutation('payload.minimumValue.type',frozenset(['ValueOutOfRangeError']),['payload','minimumValue'],'five'),
+        Mutation('payload.dependentServiceName.charset',frozenset(['DependentServiceUnavailableError']),['payload','dependentServiceName'],'Database #1'),
+        Mutation('payload.minimumFirmwareVersion.charset',frozenset(['TargetFirmwareOutdatedError']),['payload','minimumFirmwareVersion'],'17.1'),
+        Mutation('payload.currentFirmwareVersion.empty',frozenset(['TargetFirmwareOutdatedError']),['payload','currentFirmwareVersion'],''),
+        Mutation('payload.errorInfo.type',unable | frozenset(['UnwillingToSetValueError']),['payload','errorInfo'],'DEVICE_BUSY'),
+        Mutation('payload.errorInfo.code.invalid',unable | frozenset(['UnwillingToSetValueError']),['payload','errorInfo','code'],'DEVICE_ON_FIRE'),
+        Mutation('payload.errorInfo.description.missing',unable,['payload','errorInfo','description'],DELETE),
+        Mutation('payload.rateLimit.type',frozenset(['RateLimitExceededError']),['payload','rateLimit'],'ten'),
+        Mutation('payload.rateLimit.type',frozenset(['RateLimitExceededError']),['payload','rateLimit'],10),
+        Mutation('payload.timeUnit.invalid',frozenset(['RateLimitExceededError']),['payload','timeUnit'],'WEEK'),
+        Mutation('payload.currentDeviceMode.invalid',frozenset(['NotSupportedInCurrentModeError']),['payload','currentDeviceMode'],'VACATION'),
+        Mutation('payload.faultingParameter.empty',frozenset(['UnexpectedInformationReceivedError']),['payload','faultingParameter'],' '),
+        Mutation('payload.description.empty',frozenset(['HealthCheckResponse']),['payload','description'],''),
+        Mutation('payload.isHealthy.type',frozenset(['HealthCheckResponse']),['payload','isHealthy'],'true')
+    ]
+
+    for key in REQUIRED_HEADER_KEYS:
+        mutations.append(Mutation('header.' + key + '.missing',any_response,['header',key],DELETE))
+    for key in REQUIRED_DISCOVERED_APPLIANCE_KEYS:
+        mutations.append(Mutation('discovery.' + key + '.missing',discovery,['payload','discoveredAppliances',APPLIANCE,key],DELETE))
+    for key in ['manufacturerName','modelName','version','friendlyName','friendlyDescription']:
+        mutations.append(Mutation('discovery.' + key + '.empty',discovery,['payload','discoveredAppliances',APPLIANCE,key],''))
+        mutations.append(Mutation('discovery.' + key + '.length',discovery,['payload','discoveredAppliances',APPLIANCE,key],'x' * 129))
+        mutations.append(Mutation('discovery.' + key + '.type',discovery,['payload','discoveredAppliances',APPLIANCE,key],None))
+    return mutations
+
+MUTATIONS = build_mutations()
+
+
+class WorkloadGenerator(object):
+    """Seeded generator of {"request", "response", "expected"} records.
+
+    accounts is the size of the account pool, and appliances the (minimum, maximum) number of
+    appliances per account. namespace_mix weighs the request namespaces, error_share is the share of
+    Control and Query requests answered with an error response, and invalid_share the share of
+    responses broken by a mutation. rules, if given, restricts the mutations to rule ids starting
+    with one of its prefixes.
+    """
+
+    def __init__(self,seed=0,accounts=DEFAULT_ACCOUNTS,appliances=DEFAULT_APPLIANCES,namespace_mix=DEFAULT_NAMESPACE_MIX,
+            error_share=DEFAULT_ERROR_SHARE,invalid_share=DEFAULT_INVALID_SHARE,rules=None):
+        self.random = random.Random(seed)
+        self.namespace_mix = namespace_mix
+        self.error_share = error_share
+        self.invalid_share = invalid_share
+        self.mutations = [mutation for mutation in MUTATIONS if not rules or mutation.rule.startswith(tuple(rules))]
+        if not self.mutations: raise ValueError('no mutation matches the rules ' + format(rules))
+
+        minimum,maximum = appliances
+        if not 1 <= minimum <= maximum <= MAX_DISCOVERED_APPLIANCES: raise ValueError('appliances per account must be within 1 and ' + str(MAX_DISCOVERED_APPLIANCES))
+        self.accounts = [self.generate_account(index,minimum,maximum) for index in range(accounts)]
+        self.record_count = 0
+
+    def records(self,count=None):
+        """Yield count records, or records forever if count is None."""
+
+        while count is None or self.record_count < count:
+            yield self.generate_record()
+
+    def generate_record(self):
+        self.record_count += 1
+        account = self.choose(self.accounts)
+        namespace = self.choose_weighted(self.namespace_mix)
+
+        if namespace == 'Alexa.ConnectedHome.Discovery':
+            request,response = self.generate_discovery(account)
+        elif namespace == 'Alexa.ConnectedHome.System':
+            request,response = self.generate_health_check()
+        else:
+            request,response = self.generate_directive(account,namespace)
+
+        expected = None
+        if self.random.random() < self.invalid_share:
+            mutations = [mutation for mutation in self.mutations if mutation.response_names is None or response['header']['name'] in mutation.response_names]
+            if mutations:
+                mutation = self.choose(mutations)
+                response = self.mutate(response,mutation)
+                expected = mutation.rule
+
+        return {'request': request,'response': response,'expected': expected}
+
+    def generate_account(self,index,minimum,maximum):
+        token = 'account-' + str(index) + '-' + self.generate_hex(8)
+        appliances = []
+        for number in range(minimum + int(self.random.random() * (maximum - minimum + 1))):
+            device_type = self.choose_weighted([(device_type,device_type.weight) for device_type in DEVICE_TYPES])
+            room = self.choose(ROOMS)
+            appliances.append((device_type,{
+                'applianceId': device_type.name + '-' + str(index) + '-' + str(number),
+                'manufacturerName': 'Sample Manufacturer',
+                'modelName': device_type.name,
+                'version': str(1 + int(self.random.random() * 3)),
+                'friendlyName': room + ' ' + device_type.name + ' ' + str(number),
+                'friendlyDescription': device_type.name + ' in the ' + room,
+                'isReachable': self.random.random() < 0.95,
+                'actions': list(device_type.actions),
+                'additionalApplianceDetails': {
+                    'hubId': 'hub-' + self.generate_hex(6),
+                    'room': room
+                }
+            }))
+        return token,appliances
+
+    def generate_discovery(self,account):
+        token,appliances = account
+        request = self.generate_request('Alexa.ConnectedHome.Discovery','DiscoverAppliancesRequest',{'accessToken': token})
+        appliances = [copy.deepcopy(appliance) for device_type,appliance in appliances]
+        return request,self.generate_response(request,'DiscoverAppliancesResponse',{'discoveredAppliances': appliances})
+
+    def generate_health_check(self):
+        request = self.generate_request('Alexa.ConnectedHome.System','HealthCheckRequest',{'initiationTimestamp': str((BASE_TIMESTAMP + self.record_count) * 1000)})
+        return request,self.generate_response(request,'HealthCheckResponse',{'isHealthy': True,'description': 'The system is currently healthy'})
+
+    def generate_directive(self,account,namespace):
+        token,appliances = account
+        attribute = 'control_requests' if namespace == 'Alexa.ConnectedHome.Control' else 'query_requests'
+        candidates = [(device_type,appliance) for device_type,appliance in appliances if getattr(device_type,attribute)]
+        if not candidates:
+            # The account has no appliance that answers queries
+            namespace,attribute = 'Alexa.ConnectedHome.Control','control_requests'
+            candidates = appliances
+        device_type,appliance = self.choose(candidates)
+        request_name = self.choose(getattr(device_type,attribute))
+
+        payload = {
+            'accessToken': token,
+            'appliance': {
+                'applianceId': appliance['applianceId'],
+                'additionalApplianceDetails': copy.deepcopy(appliance['additionalApplianceDetails'])
+            }
+        }
+        payload.update(self.generate_request_arguments(request_name))
+        request = self.generate_request(namespace,request_name,payload)
+
+        if not appliance['isReachable']: return request,self.generate_response(request,'TargetOfflineError',{})
+        if self.random.random() < self.error_share:
+            response_name,error_payload = self.choose(ERROR_PAYLOADS)
+            return request,self.generate_response(request,response_name,copy.deepcopy(error_payload))
+        return request,self.generate_directive_response(request)
+
+    def generate_request_arguments(self,request_name):
+        if request_name == 'SetPercentageRequest': return {'percentageState': {'value': float(int(self.random.random() * 101))}}
+        if request_name in ['IncrementPercentageRequest','DecrementPercentageRequest']: return {'deltaPercentage': {'value': float(5 + int(self.random.random() * 20))}}
+        if request_name == 'SetTargetTemperatureRequest': return {'targetTemperature': {'value': 16.0 + int(self.random.random() * 10)}}
+        if request_name in ['IncrementTargetTemperatureRequest','DecrementTargetTemperatureRequest']: return {'deltaTemperature': {'value': 1.0}}
+        if request_name == 'SetLockStateRequest': return {'lockState': self.choose(['LOCKED','UNLOCKED'])}
+        return {}
+
+    def generate_directive_response(self,request):
+        request_name = request['header']['name']
+        mode = self.choose(['HEAT','COOL','AUTO','ECO'])
+        temperature = 16.0 + int(self.random.random() * 10)
+
+        if request_name in ['SetTargetTemperatureRequest','IncrementTargetTemperatureRequest','DecrementTargetTemperatureRequest']:
+            return self.generate_response(request,request_name.replace('Request','Confirmation'),{
+                'targetTemperature': {'value': temperature},
+                'temperatureMode': {'value': mode},
+                'previousState': {
+                    'targetTemperature': {'value': temperature - 1.0},
+                    'temperatureMode': {'value': mode}
+                }
+            })
+        if request_name == 'SetLockStateRequest':
+            return self.generate_response(request,'SetLockStateConfirmation',{'lockState': request['payload']['lockState']})
+        if request_name == 'GetTargetTemperatureRequest':
+            return self.generate_response(request,'GetTargetTemperatureResponse',{
+                'targetTemperature': {'value': temperature},
+                'temperatureMode': {'value': mode},
+                'applianceResponseTimestamp': self.generate_timestamp()
+            })
+        if request_name == 'GetTemperatureReadingRequest':
+            return self.generate_response(request,'GetTemperatureReadingResponse',{
+                'temperatureReading': {'value': temperature + 0.5},
+                'applianceResponseTimestamp': self.generate_timestamp()
+            })
+        if request_name == 'GetLockStateRequest':
+            return self.generate_response(request,'GetLockStateResponse',{
+                'lockState': self.choose(['LOCKED','UNLOCKED']),
+                'applianceResponseTimestamp': self.generate_timestamp()
+            })
+        return self.generate_response(request,request_name.replace('Request','Confirmation'),{})
+
+    def generate_request(self,namespace,name,payload):
+        header = {
+            'namespace': namespace,
+            'name': name,
+            'payloadVersion': '2',
+            'messageId': self.generate_message_id()
+        }
+        return {'header': header,'payload': payload}
+
+    def generate_response(self,request,name,payload):
+        header = {
+            'namespace': request['header']['namespace'],
+            'name': name,
+            'payloadVersion': '2',
+            'messageId': request['header']['messageId']
+        }
+        return {'header': header,'payload': payload}
+
+    def mutate(self,response,mutation):
+        response = copy.deepcopy(response)
+        path = list(mutation.path)
+        if APPLIANCE in path:
+            path[path.index(APPLIANCE)] = int(self.random.random() * len(response['payload']['discoveredAppliances']))
+
+        parent = response
+        for key in path[:-1]:
+            parent = parent[key]
+        if mutation.value is DELETE:
+            del parent[path[-1]]
+        elif callable(mutation.value):
+            parent[path[-1]] = mutation.value(response)
+        else:
+            parent[path[-1]] = copy.deepcopy(mutation.value)
+        return response
+
+    def generate_message_id(self):
+        return '-'.join(self.generate_hex(length) for length in [8,4,4,4,12])
+
+    def generate_hex(self,length):
+        return ''.join('0123456789abcdef'[int(self.random.random() * 16)] for _ in range(length))
+
+    def generate_timestamp(self):
+        seconds = BASE_TIMESTAMP + self.record_count
+        return '%04d-%02d-%02dT%02d:%02d:%02dZ' % (2017,1,1 + seconds // 86400 % 28,seconds // 3600 % 24,seconds // 60 % 60,seconds % 60)
+
+    def choose(self,values):
+        return values[int(self.random.random() * len(values))]
+
+    def choose_weighted(self,weighted_values):
+        point = self.random.random() * sum(weight for value,weight in weighted_values)
+        for value,weight in weighted_values:
+            point -= weight
+            if point < 0: return value
+        return weighted_values[-1][0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write a synthetic JSONL corpus of {"request", "response", "expected"} records.')
+    parser.add_argument('-n','--records',type=int,default=10000,help='number of records (default: %(default)s)')
+    parser.add_argument('-s','--seed',type=int,default=0,help='random seed (default: %(default)s)')
+    parser.add_argument('-a','--accounts',type=int,default=DEFAULT_ACCOUNTS,help='size of the account pool (default: %(default)s)')
+    parser.add_argument('--appliances',default='%d-%d' % DEFAULT_APPLIANCES,help='appliances per account, as N or MIN-MAX (default: %(default)s)')
+    parser.add_argument('--mix',help='namespace weights, e.g. discovery=2,control=70,query=25,system=3')
+    parser.add_argument('-e','--error-share',type=float,default=DEFAULT_ERROR_SHARE,help='share of directives answered with an error response (default: %(default)s)')
+    parser.add_argument('-i','--invalid-share',type=float,default=DEFAULT_INVALID_SHARE,help='share of invalid responses (default: %(default)s)')
+    parser.add_argument('-r','--rules',help='only break responses with rules starting with one of these comma separated prefixes')
+    parser.add_argument('-o','--output',help='write the corpus to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    minimum,_,maximum = args.appliances.partition('-')
+    namespace_mix = DEFAULT_NAMESPACE_MIX
+    if args.mix:
+        weights = dict((name.strip().lower(),float(weight)) for name,_,weight in (item.partition('=') for item in args.mix.split(',')))
+        namespace_mix = [(namespace,weights.get(namespace.rsplit('.',1)[1].lower(),0)) for namespace,weight in DEFAULT_NAMESPACE_MIX]
+
+    generator = WorkloadGenerator(args.seed,args.accounts,(int(minimum),int(maximum or minimum)),namespace_mix,
+        args.error_share,args.invalid_share,args.rules.split(',') if args.rules else None)
+
+    output_file = open(args.output,'w') if args.output else sys.stdout
+    rules = collections.Counter()
+    try:
+        for record in generator.records(args.records):
+            output_file.write(json.dumps(record,sort_keys=True) + '\n')
+            if record['expected'] is not None: rules[record['expected']] += 1
+    finally:
+        if output_file is not sys.stdout: output_file.close()
+
+    summary = {'records': args.records,'invalid': sum(rules.values()),'rules': dict(rules)}
+    sys.stderr.write(json.dumps(summary,indent=2,separators=(',',': '),sort_keys=True) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
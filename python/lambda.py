@@ -11,16 +11,39 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific 
 # language governing permissions and limitations under the License.
 
+import collections
+import copy
 import logging
-import httplib
-import re
-import sys
 import time
-from validation import validateResponse, validateContext
+import validation
+from validation import validateResponse, validateResponseHeader, validateContext, warm_up, format_excerpt, ValidationDeadline
+
+try:
+    from types import MappingProxyType
+except ImportError:
+    class MappingProxyType(dict):
+        """Read-only copy of a dict, standing in for the read-only view of Python 3."""
+
+        def rejectModification(self,*args,**kwargs):
+            raise TypeError('read-only mappings cannot be modified')
+
+        __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = rejectModification
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# None validates every response; a validation.SamplingPolicy, e.g. SamplingPolicy(0.05), validates a sample
+SAMPLING_POLICY = None
+
+# None validates inline; a shadow_validation.ValidationSpool, e.g. ValidationSpool('/tmp/validation-spool'),
+# spools the responses for a shadow_validation.py worker to validate out of band
+VALIDATION_SPOOL = None
+
+# Payloads are logged as excerpts of at most PAYLOAD_LOG_EXCERPT_LENGTH characters, discovery payloads as a
+# summary; every FULL_PAYLOAD_LOG_INTERVAL-th invocation logs both payloads in full (0 never does)
+PAYLOAD_LOG_EXCERPT_LENGTH = 1000
+FULL_PAYLOAD_LOG_INTERVAL = 100
+
 SAMPLE_MANUFACTURER = 'Sample Manufacturer'
 SAMPLE_APPLIANCES = [
     {
@@ -207,8 +230,7 @@ def lambda_handler(event,context):
     try:
         validateContext(context)
 
-        logger.info('Request Header:{}'.format(event['header']))
-        logger.info('Request Payload:{}'.format(event['payload']))
+        MESSAGE_LOG.logRequest(event)
 
         response = {}
         if event['header']['namespace'] == 'Alexa.ConnectedHome.Discovery':
@@ -216,213 +238,158 @@ def lambda_handler(event,context):
         elif event['header']['namespace'] in ['Alexa.ConnectedHome.Control','Alexa.ConnectedHome.Query']:
             response = handleControl(event,context)
 
-        logger.info('Response Header:{}'.format(response['header']))
-        logger.info('Response Payload:{}'.format(response['payload']))
+        MESSAGE_LOG.logResponse(response)
 
-        validateResponse(event,response)     
+        if VALIDATION_SPOOL is not None:
+            VALIDATION_SPOOL.append(event,response)
+        elif isPrevalidatedResponse(response):
+            # the shared discovery or template payload was already validated when it was first served
+            validateResponseHeader(event,response)
+        else:
+            # Validation gives way to returning the response when the invocation is about to time out
+            deadline = ValidationDeadline.from_context(context)
+            validateResponse(event,response,SAMPLING_POLICY,deadline)
+            if deadline.degraded: logger.warning('Validation skipped from %s to meet the deadline',deadline.skipped_from)
         
         return response
     except ValueError as error:
         logger.error(error)
         raise
         
+def isPrevalidatedResponse(response):
+    """Return whether only the header of the response needs to be validated.
+
+    That is the case for responses around a shared discovery or template payload, which was validated
+    when it was first served, unless a sampling policy or the discovery index has to see every response.
+    """
+
+    if SAMPLING_POLICY is not None or validation.discovery_index is not None: return False
+    return DISCOVERY_RESPONSE_CACHE.isCachedResponse(response) or isTemplateResponse(response)
+
 def handleDiscovery(event,context):
-    response_name = 'DiscoverAppliancesResponse'
-    header = generateResponseHeader(event,response_name)
-    payload = {
-       'discoveredAppliances': SAMPLE_APPLIANCES + generateSampleErrorAppliances()
-    }
-    response = generateResponse(header,payload)
-    return response
+    return DISCOVERY_RESPONSE_CACHE.generateResponse(event)
 
 def handleControl(event,context):
-    payload = {}
     appliance_id = event['payload']['appliance']['applianceId']
-    message_id = event['header']['messageId']
     request_name = event['header']['name']
 
-    response_name = ''
+    device_type = DEVICE_TYPES.get(appliance_id)
+    if device_type is None:
+        return generateErrorResponse(event,'NoSuchTargetError')
 
-    previous_temperature = 21.0
-    minimum_temperature = 5.0
-    maximum_temperature = 30.0
+    handler = DEVICE_HANDLERS.get((device_type,request_name))
+    if handler is None:
+        handler = DEVICE_DEFAULT_HANDLERS.get(device_type)
+    if handler is None:
+        return generateErrorResponse(event,'UnsupportedOperationError')
 
-    if appliance_id == 'ThermostatAuto-001':
-        previous_mode = 'AUTO'
-        target_mode = 'AUTO'
-        response = generateTemperatureResponse(event,previous_temperature,previous_mode,target_mode,minimum_temperature,maximum_temperature)
+    return handler(event)
 
-    elif appliance_id == 'ThermostatHeat-001':
-        previous_mode = 'HEAT'
-        target_mode = 'HEAT'
-        response = generateTemperatureResponse(event,previous_temperature,previous_mode,target_mode,minimum_temperature,maximum_temperature)
-    
-    elif appliance_id == 'ThermostatCool-001':
-        previous_mode = 'COOL'
-        target_mode = 'COOL'
-        response = generateTemperatureResponse(event,previous_temperature,previous_mode,target_mode,minimum_temperature,maximum_temperature)
-
-    elif appliance_id == 'ThermostatEco-001':
-        previous_mode = 'ECO'
-        target_mode = 'ECO'
-        response = generateTemperatureResponse(event,previous_temperature,previous_mode,target_mode,minimum_temperature,maximum_temperature)
-
-    elif appliance_id == 'ThermostatCustom-001':
-        previous_mode = 'CUSTOM'
-        target_mode = 'CUSTOM'
-        response = generateTemperatureResponse(event,previous_temperature,previous_mode,target_mode,minimum_temperature,maximum_temperature)
-
-    elif appliance_id == 'ThermostatOff-001':
-        previous_mode = 'OFF'
-        target_mode = 'OFF'
-        response = generateTemperatureResponse(event,previous_temperature,previous_mode,target_mode,minimum_temperature,maximum_temperature)
-
-    elif appliance_id == 'Lock-001':
-        if request_name == 'SetLockStateRequest':
-            response_name = 'SetLockStateConfirmation'
-            payload = {
-                'lockState': event['payload']['lockState']
-            }
+# device handler registry
+DEVICE_TYPES = {}
+DEVICE_HANDLERS = {}
+DEVICE_DEFAULT_HANDLERS = {}
 
-        elif request_name == 'GetLockStateRequest':
-            response_name = 'GetLockStateResponse'
-            payload = {
-                'lockState': 'UNLOCKED',
-                'applianceResponseTimestamp': getUTCTimestamp()
-            }
-        header = generateResponseHeader(event,response_name)
-        response = generateResponse(header,payload)
+def registerDevice(appliance_id,device_type):
+    DEVICE_TYPES[appliance_id] = device_type
 
-    elif isSampleErrorAppliance(appliance_id):
-        response_name = appliance_id.replace('-001','')
-        header = generateResponseHeader(event,response_name)
-        payload = {}
-        if response_name == 'ValueOutOfRangeError':
-            payload = {
-                'minimumValue': 5.0,
-                'maximumValue': 30.0,
-            }
-        elif response_name == 'DependentServiceUnavailableError':
-            payload = {
-                'dependentServiceName': 'Customer Credentials Database',
-            }
-        elif response_name == 'TargetFirmwareOutdatedError' or response_name == 'TargetBridgeFirmwareOutdatedError':
-            payload = {
-                'minimumFirmwareVersion': '17',
-                'currentFirmwareVersion': '6',
-            }
-        elif response_name.startswith('UnableToGetValueError') or response_name.startswith('UnableToSetValueError'):
-            if response_name.startswith('UnableToGetValueError'):
-                code = response_name.replace('UnableToGetValueError-','')
-                header['namespace'] = 'Alexa.ConnectedHome.Query'
-                header['name'] = 'UnableToGetValueError'
-            else:
-                code = response_name.replace('UnableToSetValueError-','')
-                header['name'] = 'UnableToSetValueError'
-            payload = {
-                'errorInfo': {
-                    'code': code,
-                    'description': 'The requested operation cannot be completed because the device is ' + code,
-                }
-            }
-            
-        elif response_name == 'UnwillingToSetValueError':
-            payload = {
-                'errorInfo': {
-                    'code': 'ThermostatIsOff',
-                    'description': 'The requested operation is unsafe because it requires changing the mode.',
-                }
-            }
-        elif response_name == 'RateLimitExceededError':
-            payload = {
-                'rateLimit': '10',
-                'timeUnit': 'HOUR',
-            }
-        elif response_name == 'NotSupportedInCurrentModeError':
-            payload = {
-                'currentDeviceMode': 'AWAY',
-            }
-        elif response_name == 'UnexpectedInformationReceivedError':
-            payload = {
-                'faultingParameter': 'value',
-            }
+def registerDeviceHandler(device_type,request_names,handler):
+    for request_name in request_names:
+        DEVICE_HANDLERS[(device_type,request_name)] = handler
 
-        response = generateResponse(header,payload)
+def registerDeviceDefaultHandler(device_type,handler):
+    # the default handler answers every request name that has no handler of its own
+    DEVICE_DEFAULT_HANDLERS[device_type] = handler
 
-    else:
+# device handlers
+def handleConfirmation(event):
+    response_name = event['header']['name'].replace('Request','Confirmation')
+    return getEmptyResponseTemplate(response_name).generateResponse(event)
 
-        if request_name == 'TurnOnRequest': response_name = 'TurnOnConfirmation'
-        if request_name == 'TurnOffRequest': response_name = 'TurnOffConfirmation'
-        if request_name == 'SetTargetTemperatureRequest': 
-            response_name = 'SetTargetTemperatureConfirmation'
-            target_temperature = event['payload']['targetTemperature']['value']
-            payload = {
-                'targetTemperature': {
-                    'value': target_temperature
-                },
-                'temperatureMode': {
-                    'value': 'AUTO'
-                },
-                'previousState' : {
-                    'targetTemperature':{
-                        'value': 21.0
-                    },
-                    'temperatureMode':{
-                        'value': 'AUTO'
-                    }
-                }
+def handleUnreachable(event):
+    return generateErrorResponse(event,'TargetOfflineError')
+
+def handleSetLockState(event):
+    lock_state = event['payload']['lockState']
+    if lock_state in ('LOCKED','UNLOCKED'):
+        return SET_LOCK_STATE_TEMPLATES[lock_state].generateResponse(event)
+
+    # an unexpected lock state is echoed as is, for validation to catch
+    header = generateResponseHeader(event,'SetLockStateConfirmation')
+    payload = {
+        'lockState': lock_state
+    }
+    return generateResponse(header,payload)
+
+def handleGetLockState(event):
+    return GET_LOCK_STATE_TEMPLATE.generateResponse(event)
+
+def generateThermostatHandler(mode):
+    previous_temperature = 21.0
+    minimum_temperature = 5.0
+    maximum_temperature = 30.0
+
+    def handleThermostat(event):
+        return generateTemperatureResponse(event,previous_temperature,mode,mode,minimum_temperature,maximum_temperature)
+    return handleThermostat
+
+def handleSampleError(event):
+    appliance_id = event['payload']['appliance']['applianceId']
+    return SAMPLE_ERROR_APPLIANCE_INDEX[appliance_id].template.generateResponse(event)
+
+# utility functions
+def generateSampleErrorTemplate(error_name,error_code):
+    response_name = error_name
+    namespace = None
+    payload = {}
+    if response_name == 'ValueOutOfRangeError':
+        payload = {
+            'minimumValue': 5.0,
+            'maximumValue': 30.0,
+        }
+    elif response_name == 'DependentServiceUnavailableError':
+        payload = {
+            'dependentServiceName': 'Customer Credentials Database',
+        }
+    elif response_name == 'TargetFirmwareOutdatedError' or response_name == 'TargetBridgeFirmwareOutdatedError':
+        payload = {
+            'minimumFirmwareVersion': '17',
+            'currentFirmwareVersion': '6',
+        }
+    elif response_name in ['UnableToGetValueError','UnableToSetValueError']:
+        code = error_code
+        if response_name == 'UnableToGetValueError':
+            namespace = 'Alexa.ConnectedHome.Query'
+        payload = {
+            'errorInfo': {
+                'code': code,
+                'description': 'The requested operation cannot be completed because the device is ' + code,
             }
-        if request_name == 'IncrementTargetTemperatureRequest':
-            response_name = 'IncrementTargetTemperatureConfirmation'
-            delta_temperature = event['payload']['deltaTemperature']['value']
-            payload = {
-                'previousState': {
-                    'temperatureMode': {
-                        'value': 'AUTO'
-                    },
-                    'targetTemperature': {
-                        'value': 21.0
-                    }
-                },
-                'targetTemperature': {
-                    'value': 21.0 + delta_temperature
-                },
-                'temperatureMode': {
-                    'value': 'AUTO'
-                }
-            }        
-        if request_name == 'DecrementTargetTemperatureRequest':
-            response_name = 'DecrementTargetTemperatureConfirmation'
-            delta_temperature = event['payload']['deltaTemperature']['value']
-            payload = {
-                'previousState': {
-                    'temperatureMode': {
-                        'value': 'AUTO'
-                    },
-                    'targetTemperature': {
-                        'value': 21.0
-                    }
-                },
-                'targetTemperature': {
-                    'value': 21.0 - delta_temperature
-                },
-                'temperatureMode': {
-                    'value': 'AUTO'
-                }
-            }        
-        if request_name == 'SetPercentageRequest': response_name = 'SetPercentageConfirmation'
-        if request_name == 'IncrementPercentageRequest': response_name = 'IncrementPercentageConfirmation'
-        if request_name == 'DecrementPercentageRequest': response_name = 'DecrementPercentageConfirmation'
+        }
         
-        if appliance_id == 'SwitchUnreachable-001':
-            response_name = 'TargetOfflineError'
-    
-        header = generateResponseHeader(event,response_name)
-        response = generateResponse(header,payload)
+    elif response_name == 'UnwillingToSetValueError':
+        payload = {
+            'errorInfo': {
+                'code': 'ThermostatIsOff',
+                'description': 'The requested operation is unsafe because it requires changing the mode.',
+            }
+        }
+    elif response_name == 'RateLimitExceededError':
+        payload = {
+            'rateLimit': '10',
+            'timeUnit': 'HOUR',
+        }
+    elif response_name == 'NotSupportedInCurrentModeError':
+        payload = {
+            'currentDeviceMode': 'AWAY',
+        }
+    elif response_name == 'UnexpectedInformationReceivedError':
+        payload = {
+            'faultingParameter': 'value',
+        }
 
-    return response
+    return ResponseTemplate(response_name,payload,namespace)
 
-# utility functions
 def generateSampleErrorAppliances():
     # this should be in sync with same list in validation.py
     VALID_CONTROL_ERROR_RESPONSE_NAMES = [
@@ -523,21 +490,42 @@ def generateSampleErrorAppliances():
 
     return sample_error_appliances
 
-def isSampleErrorAppliance(appliance_id):
-    sample_error_appliances = generateSampleErrorAppliances()
+def buildSampleErrorApplianceIndex(sample_error_appliances):
+    # map each applianceId to its appliance, the error response it triggers, the errorInfo code, if any, and its response template
+    index = {}
     for sample_error_appliance in sample_error_appliances:
-        if sample_error_appliance['applianceId'] == appliance_id: return True
-    return False
+        error_name = sample_error_appliance['applianceId'].replace('-001','')
+        error_code = None
+        for unable_error_name in ['UnableToGetValueError','UnableToSetValueError']:
+            if error_name.startswith(unable_error_name + '-'):
+                error_code = error_name.replace(unable_error_name + '-','')
+                error_name = unable_error_name
+        template = generateSampleErrorTemplate(error_name,error_code)
+        index[sample_error_appliance['applianceId']] = SampleErrorAppliance(sample_error_appliance,error_name,error_code,template)
+    return MappingProxyType(index)
+
+def isSampleErrorAppliance(appliance_id):
+    return appliance_id in SAMPLE_ERROR_APPLIANCE_INDEX
 
-def generateResponseHeader(request,response_name):
+def generateResponseHeader(request,response_name,namespace=None):
+    request_header = request['header']
     header = {
-        'namespace': request['header']['namespace'],
+        'namespace': namespace or request_header['namespace'],
         'name': response_name,
         'payloadVersion': '2',
-        'messageId': request['header']['messageId'],        
+        'messageId': request_header['messageId'],        
     }
     return header
 
+def generateErrorResponse(request,response_name):
+    return getEmptyResponseTemplate(response_name).generateResponse(request)
+
+def getEmptyResponseTemplate(response_name):
+    template = EMPTY_RESPONSE_TEMPLATES.get(response_name)
+    if template is None:
+        template = EMPTY_RESPONSE_TEMPLATES[response_name] = ResponseTemplate(response_name,{})
+    return template
+
 def generateResponse(header,payload):
     response = {
         'header': header,
@@ -546,49 +534,41 @@ def generateResponse(header,payload):
     return response
 
 def generateTemperatureResponse(request,previous_temperature,previous_mode,target_mode,minimum_temperature,maximum_temperature):
-    request_name = request['header']['name']
-    message_id = request['header']['messageId']
-    
-    # valid request    
-    if request_name in ['SetTargetTemperatureRequest','IncrementTargetTemperatureRequest','DecrementTargetTemperatureRequest']:
-        if request_name == 'SetTargetTemperatureRequest': 
-            response_name = 'SetTargetTemperatureConfirmation'
-            target_temperature = request['payload']['targetTemperature']['value']
-        if request_name == 'IncrementTargetTemperatureRequest':
-            response_name = 'IncrementTargetTemperatureConfirmation'
-            target_temperature = previous_temperature + request['payload']['deltaTemperature']['value']
-        if request_name == 'DecrementTargetTemperatureRequest':
-            response_name = 'DecrementTargetTemperatureConfirmation'
-            target_temperature = previous_temperature - request['payload']['deltaTemperature']['value']
-
-        payload = {
-            'targetTemperature': {
-                'value': target_temperature
-            },
-            'temperatureMode': {
-                'value': target_mode
+    key = (previous_temperature,previous_mode,target_mode)
+    templates = TEMPERATURE_RESPONSE_TEMPLATES.get(key)
+    if templates is None:
+        templates = TEMPERATURE_RESPONSE_TEMPLATES[key] = TemperatureResponseTemplates(previous_temperature,previous_mode,target_mode)
+    return templates.generateResponse(request)
+
+class TemperatureResponseTemplates(object):
+    """Responses of a thermostat with a given previous state and target mode.
+
+    The query responses are ResponseTemplates. The confirmations only have their targetTemperature
+    built for each request; their temperatureMode and previousState are frozen and shared.
+    """
+
+    def __init__(self,previous_temperature,previous_mode,target_mode):
+        self.previous_temperature = previous_temperature
+        self.temperature_mode = freezePayload({
+            'value': target_mode
+        })
+        self.previous_state = freezePayload({
+            'targetTemperature':{
+                'value': previous_temperature
             },
-            'previousState' : {
-                'targetTemperature':{
-                    'value': previous_temperature
-                },
-                'temperatureMode':{
-                    'value': previous_mode
-                }
-            }        
-        }
-    elif request_name == 'GetTemperatureReadingRequest':
-        response_name = 'GetTemperatureReadingResponse'
-        payload = {
+            'temperatureMode':{
+                'value': previous_mode
+            }
+        })
+
+        self.temperature_reading_template = ResponseTemplate('GetTemperatureReadingResponse',{
             'temperatureReading': {
                 'value': 21.00,
             }
-        }
+        })
 
-    elif request_name == 'GetTargetTemperatureRequest':
-        response_name = 'GetTargetTemperatureResponse'
         payload = {
-            'applianceResponseTimestamp': getUTCTimestamp(),
+            'applianceResponseTimestamp': None,
             'temperatureMode': {
                 'value': target_mode,
                 'friendlyName': '',
@@ -610,16 +590,195 @@ def generateTemperatureResponse(request,previous_temperature,previous_mode,targe
         if target_mode == 'CUSTOM':
             payload['temperatureMode']['friendlyName'] = 'Manufacturer custom mode'
 
+        self.target_temperature_template = ResponseTemplate('GetTargetTemperatureResponse',payload,timestamp_key='applianceResponseTimestamp')
 
-    else:
-        response_name = 'UnexpectedInformationReceivedError'
-        payload = {
-            'faultingParameter': 'request.name: ' + request_name
+    def generateResponse(self,request):
+        request_name = request['header']['name']
+
+        # valid request    
+        if request_name in ['SetTargetTemperatureRequest','IncrementTargetTemperatureRequest','DecrementTargetTemperatureRequest']:
+            if request_name == 'SetTargetTemperatureRequest': 
+                response_name = 'SetTargetTemperatureConfirmation'
+                target_temperature = request['payload']['targetTemperature']['value']
+            if request_name == 'IncrementTargetTemperatureRequest':
+                response_name = 'IncrementTargetTemperatureConfirmation'
+                target_temperature = self.previous_temperature + request['payload']['deltaTemperature']['value']
+            if request_name == 'DecrementTargetTemperatureRequest':
+                response_name = 'DecrementTargetTemperatureConfirmation'
+                target_temperature = self.previous_temperature - request['payload']['deltaTemperature']['value']
+
+            payload = {
+                'targetTemperature': {
+                    'value': target_temperature
+                },
+                'temperatureMode': self.temperature_mode,
+                'previousState' : self.previous_state
+            }
+        elif request_name == 'GetTemperatureReadingRequest':
+            return self.temperature_reading_template.generateResponse(request)
+
+        elif request_name == 'GetTargetTemperatureRequest':
+            return self.target_temperature_template.generateResponse(request)
+
+        else:
+            response_name = 'UnexpectedInformationReceivedError'
+            payload = {
+                'faultingParameter': 'request.name: ' + request_name
+            }
+
+        header = generateResponseHeader(request,response_name)
+        response = generateResponse(header,payload)
+        return response
+
+class DiscoveryResponseCache(object):
+    """Discovery payload that is built and validated once per container.
+
+    Only the header, carrying the messageId of the request, is generated for each request. The payload
+    is validated the first time it is served. The payload object is shared by all discovery responses
+    and must not be modified.
+    """
+
+    def __init__(self,appliances):
+        self.payload = {
+            'discoveredAppliances': appliances
         }
+        self.validated = False
+
+    def generateResponse(self,event):
+        header = generateResponseHeader(event,'DiscoverAppliancesResponse')
+        response = generateResponse(header,self.payload)
+        if not self.validated:
+            validateResponse(event,response)
+            self.validated = True
+        return response
 
-    header = generateResponseHeader(request,response_name)
-    response = generateResponse(header,payload)
-    return response
+    def isCachedResponse(self,response):
+        return response.get('payload') is self.payload
+
+    def warmUp(self):
+        """Validate the payload now, e.g. during Lambda init, rather than on the first discovery."""
+
+        if not self.validated:
+            self.generateResponse({
+                'header': {
+                    'namespace': 'Alexa.ConnectedHome.Discovery',
+                    'name': 'DiscoverAppliancesRequest',
+                    'payloadVersion': '2',
+                    'messageId': 'warm-up'
+                },
+                'payload': {}
+            })
+
+class FrozenPayload(dict):
+    """Payload, or part of a payload, that cannot be modified once built.
+
+    It is a dict for validation and serialization; copies of it, as made by copy.copy and copy.deepcopy,
+    are plain dicts that can be modified.
+    """
+
+    def rejectModification(self,*args,**kwargs):
+        raise TypeError('response template payloads cannot be modified')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = rejectModification
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self,memo):
+        return copy.deepcopy(dict(self),memo)
+
+    def __reduce__(self):
+        return (dict,(dict(self),))
+
+def freezePayload(payload):
+    return FrozenPayload((key,freezePayload(value) if isinstance(value,dict) else value) for key,value in payload.items())
+
+class ResponseTemplate(object):
+    """Response of one name whose payload is built once, frozen and shared by every response.
+
+    Only the header, carrying the namespace (unless given) and messageId of the request, is generated
+    for each request. The whole response is validated the first time it is served; after that only its
+    header needs to be, which isTemplateResponse tells lambda_handler. If timestamp_key is given, that
+    field of the payload is set to the current UTC time, and the payload is rebuilt once per second.
+    """
+
+    def __init__(self,response_name,payload,namespace=None,timestamp_key=None):
+        self.response_name = response_name
+        self.namespace = namespace
+        self.payload = freezePayload(payload)
+        self.timestamp_key = timestamp_key
+        self.timestamped_payload = (None,self.payload)
+        self.validated = False
+
+    def generateResponse(self,request):
+        header = generateResponseHeader(request,self.response_name,self.namespace)
+        response = generateResponse(header,self.currentPayload())
+        if not self.validated:
+            validateResponse(request,response)
+            self.validated = True
+        return response
+
+    def currentPayload(self):
+        if self.timestamp_key is None: return self.payload
+        second,payload = self.timestamped_payload
+        now = int(time.time())
+        if now != second:
+            payload = dict(self.payload)
+            payload[self.timestamp_key] = getUTCTimestamp(now)
+            payload = FrozenPayload(payload)
+            self.timestamped_payload = (now,payload)
+        return payload
+
+def isTemplateResponse(response):
+    # a ResponseTemplate only serves its frozen payload once it has validated it
+    return type(response.get('payload')) is FrozenPayload
+
+class MessageLog(object):
+    """Logs the request and response of each invocation at INFO level, paying for it only when emitted.
+
+    Nothing is built when INFO is disabled, and the messages are only formatted when a handler emits the
+    record. Payloads are logged as excerpts capped at excerpt_length characters, and discovery payloads as
+    the number of appliances and a hash of their ids. Every full_payload_interval-th invocation, both
+    payloads are logged in full instead.
+    """
+
+    def __init__(self,excerpt_length,full_payload_interval):
+        self.excerpt_length = excerpt_length
+        self.full_payload_interval = full_payload_interval
+        self.invocations = 0
+        self.full = False
+
+    def logRequest(self,event):
+        self.invocations += 1
+        self.full = self.full_payload_interval > 0 and self.invocations % self.full_payload_interval == 0
+        self.logMessage('Request',event)
+
+    def logResponse(self,response):
+        self.logMessage('Response',response)
+
+    def logMessage(self,kind,message):
+        if not logger.isEnabledFor(logging.INFO): return
+        logger.info('%s Header:%s',kind,message['header'])
+        logger.info('%s Payload:%s',kind,PayloadLogEntry(message['payload'],None if self.full else self.excerpt_length))
+
+class PayloadLogEntry(object):
+    """Log argument that formats a payload, or its summary, only when the record is emitted."""
+
+    def __init__(self,payload,excerpt_length):
+        self.payload = payload
+        self.excerpt_length = excerpt_length
+
+    def __str__(self):
+        if self.excerpt_length is None: return format(self.payload)
+        if isinstance(self.payload,dict) and isinstance(self.payload.get('discoveredAppliances'),list): return summarizeDiscoveredAppliances(self.payload['discoveredAppliances'])
+        return format_excerpt(self.payload,self.excerpt_length)
+
+def summarizeDiscoveredAppliances(appliances):
+    # hashlib is only imported once a summary is emitted
+    import hashlib
+    appliance_ids = '\n'.join(repr(appliance.get('applianceId')) if isinstance(appliance,dict) else '?' for appliance in appliances)
+    if not isinstance(appliance_ids,bytes): appliance_ids = appliance_ids.encode('utf-8')
+    return '{discoveredAppliances: ' + str(len(appliances)) + ', applianceIdHash: ' + hashlib.sha1(appliance_ids).hexdigest()[:12] + '}'
 
 def generateErrorFriendlyName(device_number):
     return 'Device ' + str(device_number)
@@ -628,4 +787,60 @@ def generateErrorFriendlyName(device_number):
 """Utility functions."""
 
 def getUTCTimestamp(seconds=None):
-    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(seconds))
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ",time.gmtime(seconds))
+
+
+"""Sample error appliance catalog, built once per container and shared by discovery and control."""
+
+SampleErrorAppliance = collections.namedtuple('SampleErrorAppliance',['appliance','error_name','error_code','template'])
+
+SAMPLE_ERROR_APPLIANCES = generateSampleErrorAppliances()
+SAMPLE_ERROR_APPLIANCE_INDEX = buildSampleErrorApplianceIndex(SAMPLE_ERROR_APPLIANCES)
+
+DISCOVERY_RESPONSE_CACHE = DiscoveryResponseCache(SAMPLE_APPLIANCES + SAMPLE_ERROR_APPLIANCES)
+
+
+"""Response templates, built once per container and shared by the control and query handlers."""
+
+EMPTY_RESPONSE_TEMPLATES = {}
+TEMPERATURE_RESPONSE_TEMPLATES = {}
+SET_LOCK_STATE_TEMPLATES = dict((lock_state,ResponseTemplate('SetLockStateConfirmation',{'lockState': lock_state})) for lock_state in ['LOCKED','UNLOCKED'])
+GET_LOCK_STATE_TEMPLATE = ResponseTemplate('GetLockStateResponse',{'lockState': 'UNLOCKED','applianceResponseTimestamp': None},timestamp_key='applianceResponseTimestamp')
+
+MESSAGE_LOG = MessageLog(PAYLOAD_LOG_EXCERPT_LENGTH,FULL_PAYLOAD_LOG_INTERVAL)
+
+
+"""Sample devices and the handlers registered for each device type."""
+
+for appliance_id,device_type in [
+    ('Switch-001','Switch'),
+    ('Dimmer-001','Dimmer'),
+    ('Fan-001','Dimmer'),
+    ('SwitchUnreachable-001','SwitchUnreachable'),
+    ('ThermostatAuto-001','ThermostatAuto'),
+    ('ThermostatHeat-001','ThermostatHeat'),
+    ('ThermostatCool-001','ThermostatCool'),
+    ('ThermostatEco-001','ThermostatEco'),
+    ('ThermostatCustom-001','ThermostatCustom'),
+    ('ThermostatOff-001','ThermostatOff'),
+    ('Lock-001','Lock'),
+]:
+    registerDevice(appliance_id,device_type)
+
+for appliance_id in SAMPLE_ERROR_APPLIANCE_INDEX:
+    registerDevice(appliance_id,'SampleError')
+
+registerDeviceHandler('Switch',['TurnOnRequest','TurnOffRequest'],handleConfirmation)
+registerDeviceHandler('Dimmer',['TurnOnRequest','TurnOffRequest','SetPercentageRequest','IncrementPercentageRequest','DecrementPercentageRequest'],handleConfirmation)
+registerDeviceDefaultHandler('SwitchUnreachable',handleUnreachable)
+for mode in ['AUTO','HEAT','COOL','ECO','CUSTOM','OFF']:
+    registerDeviceHandler('Thermostat' + mode.capitalize(),['SetTargetTemperatureRequest','IncrementTargetTemperatureRequest','DecrementTargetTemperatureRequest','GetTemperatureReadingRequest','GetTargetTemperatureRequest'],generateThermostatHandler(mode))
+registerDeviceHandler('Lock',['SetLockStateRequest'],handleSetLockState)
+registerDeviceHandler('Lock',['GetLockStateRequest'],handleGetLockState)
+registerDeviceDefaultHandler('SampleError',handleSampleError)
+
+
+"""Warm-up, run once at import so that its cost is part of the Lambda init phase, not of the first invocation."""
+
+warm_up()
+DISCOVERY_RESPONSE_CACHE.warmUp()
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016-2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Amazon Software License (the "License"). You may not use this file except in
+# compliance with the License. A copy of the License is located at
+#
+#     http://aws.amazon.com/asl/
+#
+# or in the "license" file accompanying this file. This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+"""Shadow validation: spool request/response pairs in the Lambda function, validate them elsewhere.
+
+ValidationSpool.append() writes a pair as one {"request", "response"} JSON line to a local spool
+directory and returns, so that validation is off the latency path of the response to Alexa. The spool
+is a bounded ring of segment files: the active segment is handed over to the worker once it is full or
+old, and when the spool is full the oldest waiting segment is dropped. The worker also claims an active
+segment that no pair was appended to for a minute, so the last pairs of an idle or stopped function are
+validated too.
+
+The worker is a separate process that claims waiting segments, validates every pair in them and
+reports the failures, in the same format as batch_validation.py:
+    python shadow_validation.py /tmp/validation-spool --failures failures.jsonl
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+
+from batch_validation import validate_line
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEGMENT_BYTES = 1024 * 1024
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_SEGMENT_AGE = 10.0
+DEFAULT_STALE_AGE = 60.0
+DEFAULT_POLL_INTERVAL = 1.0
+
+ACTIVE_SUFFIX = '.active'
+READY_SUFFIX = '.ready'
+DRAINING_SUFFIX = '.draining'
+
+
+class ValidationSpool(object):
+    """Append-only, size-bounded spool of request/response pairs waiting to be validated.
+
+    Pairs are appended to an active segment file with a single write each. The segment is renamed to
+    *.ready, which hands it over to the worker, once it holds segment_bytes or is older than
+    segment_age seconds at the next append, or when flush() is called. A segment that is not written
+    to for longer is claimed by the worker as it is (see ValidationWorker), and the next append starts
+    a new one. At most max_bytes of ready segments are kept; older ones are deleted unvalidated and
+    counted in dropped_segments.
+    """
+
+    def __init__(self,directory,segment_bytes=DEFAULT_SEGMENT_BYTES,max_bytes=DEFAULT_MAX_BYTES,segment_age=DEFAULT_SEGMENT_AGE):
+        if not os.path.isdir(directory): os.makedirs(directory)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max(1,max_bytes // segment_bytes)
+        self.segment_age = segment_age
+        self.segment_path = None
+        self.segment_fd = None
+        self.segment_size = 0
+        self.segment_started = 0
+        self.sequence = 0
+        self.appended = 0
+        self.dropped_segments = 0
+
+    def append(self,request,response):
+        line = json.dumps({'request': request,'response': response}) + '\n'
+        if not isinstance(line,bytes): line = line.encode('utf-8')
+
+        # An old segment may have been claimed by the worker, so the pair goes to a new one
+        if self.segment_fd is not None and time.time() - self.segment_started >= self.segment_age: self.flush()
+        if self.segment_fd is None: self.open_segment()
+        os.write(self.segment_fd,line)
+        self.segment_size += len(line)
+        self.appended += 1
+
+        if self.segment_size >= self.segment_bytes: self.flush()
+
+    def flush(self):
+        """Hand the active segment over to the worker, if it holds any pair."""
+
+        if self.segment_fd is None: return
+        os.close(self.segment_fd)
+        self.segment_fd = None
+        try:
+            os.rename(self.segment_path,self.segment_path[:-len(ACTIVE_SUFFIX)] + READY_SUFFIX)
+        except OSError:
+            # The worker claimed it as stale
+            return
+        self.drop_old_segments()
+
+    def open_segment(self):
+        self.sequence += 1
+        self.segment_started = time.time()
+        name = '%013d-%d-%06d' % (int(self.segment_started * 1000),os.getpid(),self.sequence)
+        self.segment_path = os.path.join(self.directory,name + ACTIVE_SUFFIX)
+        self.segment_fd = os.open(self.segment_path,os.O_WRONLY | os.O_CREAT | os.O_APPEND,0o644)
+        self.segment_size = 0
+
+    def drop_old_segments(self):
+        ready = sorted(glob.glob(os.path.join(self.directory,'*' + READY_SUFFIX)))
+        for path in ready[:max(0,len(ready) - self.max_segments)]:
+            try:
+                os.remove(path)
+                self.dropped_segments += 1
+            except OSError:
+                # The worker claimed it in the meantime
+                pass
+
+    def stats(self):
+        return {'appended': self.appended,'dropped_segments': self.dropped_segments}
+
+
+class ValidationWorker(object):
+    """Drains the ready segments of a spool directory and validates every pair in them.
+
+    A segment is claimed by renaming it to *.draining, so several workers can share a spool, and it
+    is deleted once validated. Active segments that were not written to for stale_age seconds are
+    claimed too, since the function that writes them may be idle or gone; stale_age must exceed the
+    segment_age of the spool, after which its next append no longer writes to the segment. Failures
+    are logged and, if failures_file is given, written to it as JSON lines with the segment and line
+    number they were found at.
+    """
+
+    def __init__(self,directory,failures_file=None,stale_age=DEFAULT_STALE_AGE):
+        self.directory = directory
+        self.failures_file = failures_file
+        self.stale_age = stale_age
+        self.records = 0
+        self.invalid = 0
+
+    def drain(self):
+        """Validate every segment that is ready or stale now, and return the number of segments validated."""
+
+        segments = 0
+        for path in self.find_claimable_segments():
+            claimed_path = os.path.splitext(path)[0] + DRAINING_SUFFIX
+            try:
+                os.rename(path,claimed_path)
+            except OSError:
+                # Claimed by another worker, or dropped by the spool
+                continue
+            self.validate_segment(claimed_path)
+            os.remove(claimed_path)
+            segments += 1
+        return segments
+
+    def find_claimable_segments(self):
+        """Return the paths of the ready and stale active segments, oldest first."""
+
+        paths = glob.glob(os.path.join(self.directory,'*' + READY_SUFFIX))
+        now = time.time()
+        for path in glob.glob(os.path.join(self.directory,'*' + ACTIVE_SUFFIX)):
+            try:
+                if now - os.path.getmtime(path) >= self.stale_age: paths.append(path)
+            except OSError:
+                # Handed over in the meantime
+                continue
+        return sorted(paths,key=os.path.basename)
+
+    def run(self,poll_interval=DEFAULT_POLL_INTERVAL):
+        while True:
+            if not self.drain(): time.sleep(poll_interval)
+
+    def validate_segment(self,path):
+        segment = os.path.basename(path)
+        with open(path) as segment_file:
+            for line_number,line in enumerate(segment_file,1):
+                if not line.strip(): continue
+                self.records += 1
+                request_name,response_name,failure = validate_line(line)
+                if failure is None: continue
+
+                self.invalid += 1
+                failure.update({'segment': segment,'line': line_number,'request': request_name,'response': response_name})
+                logger.error('%s %s: %s',response_name,failure['rule'],failure['message'])
+                if self.failures_file is not None:
+                    self.failures_file.write(json.dumps(failure,sort_keys=True) + '\n')
+                    self.failures_file.flush()
+
+    def stats(self):
+        return {'records': self.records,'valid': self.records - self.invalid,'invalid': self.invalid}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Validate the request/response pairs spooled by ValidationSpool.')
+    parser.add_argument('directory',help='spool directory')
+    parser.add_argument('-f','--failures',help='append one JSON line per failing pair to this file')
+    parser.add_argument('--once',action='store_true',help='drain the ready segments and exit instead of polling')
+    parser.add_argument('--stale-age',type=float,default=DEFAULT_STALE_AGE,help='claim active segments not written to for this many seconds (default: %(default)s)')
+    parser.add_argument('--poll-interval',type=float,default=DEFAULT_POLL_INTERVAL,help='seconds between polls of an empty spool (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s')
+    failures_file = open(args.failures,'a') if args.failures else None
+    worker = ValidationWorker(args.directory,failures_file,args.stale_age)
+    try:
+        if args.once:
+            worker.drain()
+        else:
+            worker.run(args.poll_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if failures_file is not None: failures_file.close()
+
+    json.dump(worker.stats(),sys.stdout,indent=2,separators=(',',': '),sort_keys=True)
+    sys.stdout.write('\n')
+    return 1 if worker.invalid else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -22,16 +22,20 @@ The validations are based on the current public Alexa Smart Home API reference:
 https://developer.amazon.com/public/solutions/alexa/alexa-skills-kit/docs/smart-home-skill-api-reference
 """
 
-import logging
+import collections
+import itertools
+import json
+import operator
 import re
 import sys
+import time
 
 """Various constants used in validation."""
 
-VALID_DISCOVERY_REQUEST_NAMES = [
-    'DiscoverAppliancesRequest'
-]
-VALID_CONTROL_REQUEST_NAMES = [
+VALID_DISCOVERY_REQUEST_NAMES = (
+    'DiscoverAppliancesRequest',
+)
+VALID_CONTROL_REQUEST_NAMES = (
     'TurnOnRequest',
     'TurnOffRequest',
     'SetTargetTemperatureRequest',
@@ -41,21 +45,21 @@ VALID_CONTROL_REQUEST_NAMES = [
     'IncrementPercentageRequest',
     'DecrementPercentageRequest',
     'SetLockStateRequest'
-]
-VALID_QUERY_REQUEST_NAMES = [
+)
+VALID_QUERY_REQUEST_NAMES = (
     'GetLockStateRequest',
     'GetTemperatureReadingRequest',
     'GetTargetTemperatureRequest'
-]
-VALID_SYSTEM_REQUEST_NAMES = [
-    'HealthCheckRequest'
-]
+)
+VALID_SYSTEM_REQUEST_NAMES = (
+    'HealthCheckRequest',
+)
 VALID_REQUEST_NAMES = VALID_DISCOVERY_REQUEST_NAMES + VALID_QUERY_REQUEST_NAMES + VALID_CONTROL_REQUEST_NAMES + VALID_SYSTEM_REQUEST_NAMES
 
-VALID_DISCOVERY_RESPONSE_NAMES = [
-    'DiscoverAppliancesResponse'
-]
-VALID_CONTROL_RESPONSE_NAMES = [
+VALID_DISCOVERY_RESPONSE_NAMES = (
+    'DiscoverAppliancesResponse',
+)
+VALID_CONTROL_RESPONSE_NAMES = (
     'TurnOnConfirmation',
     'TurnOffConfirmation',
     'SetTargetTemperatureConfirmation',
@@ -65,8 +69,8 @@ VALID_CONTROL_RESPONSE_NAMES = [
     'IncrementPercentageConfirmation',
     'DecrementPercentageConfirmation',
     'SetLockStateConfirmation'
-]
-VALID_CONTROL_ERROR_RESPONSE_NAMES = [
+)
+VALID_CONTROL_ERROR_RESPONSE_NAMES = (
     'ValueOutOfRangeError',
     'TargetOfflineError',
     'BridgeOfflineError',
@@ -90,18 +94,18 @@ VALID_CONTROL_ERROR_RESPONSE_NAMES = [
     'UnsupportedOperationError',
     'UnsupportedTargetSettingError',
     'UnexpectedInformationReceivedError'
-]
-VALID_QUERY_RESPONSE_NAMES = [
+)
+VALID_QUERY_RESPONSE_NAMES = (
     'GetLockStateResponse',
     'GetTemperatureReadingResponse',
     'GetTargetTemperatureResponse'
-]
-VALID_SYSTEM_RESPONSE_NAMES = [
-    'HealthCheckResponse'
-]
+)
+VALID_SYSTEM_RESPONSE_NAMES = (
+    'HealthCheckResponse',
+)
 VALID_RESPONSE_NAMES = VALID_DISCOVERY_RESPONSE_NAMES + VALID_CONTROL_RESPONSE_NAMES + VALID_CONTROL_ERROR_RESPONSE_NAMES + VALID_QUERY_RESPONSE_NAMES + VALID_SYSTEM_RESPONSE_NAMES
 
-VALID_NON_EMPTY_PAYLOAD_RESPONSE_NAMES = [
+VALID_NON_EMPTY_PAYLOAD_RESPONSE_NAMES = (
     'SetTargetTemperatureConfirmation',
     'IncrementTargetTemperatureConfirmation',
     'DecrementTargetTemperatureConfirmation',
@@ -119,8 +123,8 @@ VALID_NON_EMPTY_PAYLOAD_RESPONSE_NAMES = [
     'RateLimitExceededError',
     'NotSupportedInCurrentModeError',
     'UnexpectedInformationReceivedError'
-]
-VALID_ACTIONS = [
+)
+VALID_ACTIONS = (
     'decrementPercentage',
     'decrementTargetTemperature',
     'getTargetTemperature',
@@ -133,23 +137,23 @@ VALID_ACTIONS = [
     'setTargetTemperature',
     'turnOff',
     'turnOn'
-]
-VALID_TEMPERATURE_MODES = [
+)
+VALID_TEMPERATURE_MODES = (
     'HEAT',
     'COOL',
     'AUTO',
     'ECO',
     'OFF',
     'CUSTOM'
-]
-VALID_CURRENT_DEVICE_MODES = [
+)
+VALID_CURRENT_DEVICE_MODES = (
     'HEAT',
     'COOL',
     'AUTO',
     'AWAY',
     'OTHER'
-]
-VALID_UNABLE_ERROR_INFO_CODES = [
+)
+VALID_UNABLE_ERROR_INFO_CODES = (
     'DEVICE_AJAR',
     'DEVICE_BUSY',
     'DEVICE_JAMMED',
@@ -157,30 +161,30 @@ VALID_UNABLE_ERROR_INFO_CODES = [
     'HARDWARE_FAILURE',
     'LOW_BATTERY',
     'NOT_CALIBRATED'
-]
-VALID_UNWILLING_ERROR_INFO_CODES = [
-    'ThermostatIsOff'
-]
-VALID_TIME_UNITS = [
+)
+VALID_UNWILLING_ERROR_INFO_CODES = (
+    'ThermostatIsOff',
+)
+VALID_TIME_UNITS = (
     'MINUTE',
     'HOUR',
     'DAY'
-]
-VALID_LOCK_STATES = [
+)
+VALID_LOCK_STATES = (
     'LOCKED',
     'UNLOCKED'
-]
-REQUIRED_HEADER_KEYS = [
+)
+REQUIRED_HEADER_KEYS = (
     'namespace',
     'name',
     'payloadVersion',
     'messageId'
-]
-REQUIRED_RESPONSE_KEYS = [
+)
+REQUIRED_RESPONSE_KEYS = (
     'header',
     'payload'
-]
-REQUIRED_DISCOVERED_APPLIANCE_KEYS = [
+)
+REQUIRED_DISCOVERED_APPLIANCE_KEYS = (
     'applianceId',
     'manufacturerName',
     'modelName',
@@ -190,10 +194,689 @@ REQUIRED_DISCOVERED_APPLIANCE_KEYS = [
     'isReachable',
     'actions',
     'additionalApplianceDetails'
-]
+)
 MAX_DISCOVERED_APPLIANCES = 300
+MIN_COLUMNAR_DISCOVERED_APPLIANCES = 8
+
+"""Precomputed lookup sets and request registry used to dispatch validation."""
+
+VALID_DISCOVERY_RESPONSE_NAME_SET = frozenset(VALID_DISCOVERY_RESPONSE_NAMES)
+VALID_CONTROL_RESPONSE_NAME_SET = frozenset(VALID_CONTROL_RESPONSE_NAMES + VALID_CONTROL_ERROR_RESPONSE_NAMES)
+VALID_CONTROL_ERROR_RESPONSE_NAME_SET = frozenset(VALID_CONTROL_ERROR_RESPONSE_NAMES)
+VALID_QUERY_RESPONSE_NAME_SET = frozenset(VALID_QUERY_RESPONSE_NAMES + VALID_CONTROL_ERROR_RESPONSE_NAMES)
+VALID_SYSTEM_RESPONSE_NAME_SET = frozenset(VALID_SYSTEM_RESPONSE_NAMES)
+VALID_NON_EMPTY_PAYLOAD_RESPONSE_NAME_SET = frozenset(VALID_NON_EMPTY_PAYLOAD_RESPONSE_NAMES)
+VALID_ACTION_SET = frozenset(VALID_ACTIONS)
+VALID_TEMPERATURE_MODE_SET = frozenset(VALID_TEMPERATURE_MODES)
+VALID_CURRENT_DEVICE_MODE_SET = frozenset(VALID_CURRENT_DEVICE_MODES)
+VALID_UNABLE_ERROR_INFO_CODE_SET = frozenset(VALID_UNABLE_ERROR_INFO_CODES)
+VALID_UNWILLING_ERROR_INFO_CODE_SET = frozenset(VALID_UNWILLING_ERROR_INFO_CODES)
+VALID_TIME_UNIT_SET = frozenset(VALID_TIME_UNITS)
+VALID_LOCK_STATE_SET = frozenset(VALID_LOCK_STATES)
+REQUIRED_DISCOVERED_APPLIANCE_KEY_SET = frozenset(REQUIRED_DISCOVERED_APPLIANCE_KEYS)
+
+# One bit per action, and the bit of the action each control and query request performs, e.g. turnOn for TurnOnRequest
+ACTION_BITS = dict((action,1 << bit) for bit,action in enumerate(VALID_ACTIONS))
+REQUEST_ACTION_BITS = dict((name,ACTION_BITS[name[0].lower() + name[1:-len('Request')]]) for name in VALID_CONTROL_REQUEST_NAMES + VALID_QUERY_REQUEST_NAMES)
+DISCOVERED_APPLIANCE_ROW = operator.itemgetter(*REQUIRED_DISCOVERED_APPLIANCE_KEYS)
+
+RequestRule = collections.namedtuple('RequestRule',[
+    'category',
+    'title',
+    'namespaces',
+    'namespace_message',
+    'response_names',
+    'error_response_names',
+    'correct_response_name',
+    'correct_response_name_message'
+])
+
+def build_request_rules():
+    """Build the request name registry.
+
+    Each valid request name maps to a RequestRule holding everything check_response_header needs to
+    check the response header, so that classifying a request is a single dict lookup.
+    """
+
+    categories = [
+        ('Discovery',VALID_DISCOVERY_REQUEST_NAMES,['Alexa.ConnectedHome.Discovery'],VALID_DISCOVERY_RESPONSE_NAME_SET,frozenset(),'Response'),
+        ('Control',VALID_CONTROL_REQUEST_NAMES,['Alexa.ConnectedHome.Query','Alexa.ConnectedHome.Control'],VALID_CONTROL_RESPONSE_NAME_SET,VALID_CONTROL_ERROR_RESPONSE_NAME_SET,'Confirmation'),
+        ('Query',VALID_QUERY_REQUEST_NAMES,['Alexa.ConnectedHome.Query','Alexa.ConnectedHome.Control'],VALID_QUERY_RESPONSE_NAME_SET,VALID_CONTROL_ERROR_RESPONSE_NAME_SET,'Response'),
+        ('System',VALID_SYSTEM_REQUEST_NAMES,['Alexa.ConnectedHome.System'],VALID_SYSTEM_RESPONSE_NAME_SET,frozenset(),'Response'),
+    ]
+
+    request_rules = {}
+    for category,request_names,namespaces,response_names,error_response_names,response_suffix in categories:
+        for request_name in request_names:
+            correct_response_name = request_name.replace('Request',response_suffix)
+            if error_response_names:
+                correct_response_name_message = 'header.name must be an error response name or ' + correct_response_name + ' for ' + request_name
+            else:
+                correct_response_name_message = 'header.name must be ' + correct_response_name + ' for ' + request_name
+            request_rules[request_name] = RequestRule(
+                category,
+                category + ' Response',
+                frozenset(namespaces),
+                'header.namespace must be ' + ' or '.join(namespaces),
+                response_names,
+                error_response_names,
+                correct_response_name,
+                correct_response_name_message
+            )
+    return request_rules
+
+REQUEST_RULES = build_request_rules()
+
+"""String constraints, compiled once and checked in a single pass per field."""
+
+try:
+    TEXT_TYPE = unicode
+    JSON_INTEGER_TYPES = (int,long)
+except NameError:
+    TEXT_TYPE = str
+    JSON_INTEGER_TYPES = (int,)
+
+ALPHANUMERIC_CHARACTERS = u'a-zA-Z0-9\u00e4\u00fc\u00f6\u00c4\u00dc\u00d6\u00df'
+
+
+class StringConstraint(object):
+    """Non-emptiness, maximum length and allowed character set of a string field.
+
+    check() returns None for a valid value and otherwise the name of the first failing check, in the
+    order given by checks ('empty', 'length', 'charset'); a value that is not a string fails 'type'.
+    Valid values are accepted by a single regular expression that encodes all the checks at once; only
+    a value it rejects is checked again one rule at a time to find the failing one. The expressions are
+    compiled on the first check, or ahead of time by compile() (see warm_up). first_failure() checks a
+    whole column of values with one more expression, matched over the values joined by NUL characters.
+    On Python 2, byte strings are decoded as UTF-8 once the expression has rejected them, so the German
+    characters allowed in names are accepted in str values too. On Python 3, bytes cannot be serialized
+    to JSON, and fail 'type' like any other value that is not a string.
+    """
+
+    def __init__(self,label,rule_prefix,checks,max_length=None,charset=None,charset_message=None):
+        self.label = label
+        self.rule_prefix = rule_prefix
+        self.checks = checks
+        self.max_length = max_length
+        self.charset = charset
+        self.charset_pattern_source = u'[' + charset + u']*\\Z' if charset else None
+        self.fast_pattern_source = self.build_fast_pattern(charset)
+        self.column_pattern_source = u'(?:' + self.build_fast_pattern(charset,u'[^\\x00]',u'\\x00') + u')*\\Z'
+        self.fast_match = self.compile_and_match
+        self.charset_match = None
+        self.column_match = None
+
+        self.rules = {}
+        self.messages = {
+            'type': label + ' must be a string',
+            'empty': label + ' must not be empty',
+            'length': label + ' must not exceed ' + str(max_length) + ' characters',
+            'charset': label + ' ' + format(charset_message)
+        }
+        for check in ['type','empty','length','charset']:
+            self.rules[check] = rule_prefix + '.' + check
+
+    def build_fast_pattern(self,charset,any_character=u'.',end=u'\\Z'):
+        pattern = u'(?!\\s*' + end + u')' if 'empty' in self.checks else u''
+        pattern += u'[' + charset + u']' if charset and 'charset' in self.checks else any_character
+        if self.max_length is not None and 'length' in self.checks:
+            pattern += u'{1,' + str(self.max_length) + u'}'
+        else:
+            pattern += u'*'
+        return pattern + end
+
+    def compile(self):
+        self.fast_match = re.compile(self.fast_pattern_source,re.UNICODE | re.DOTALL).match
+        self.column_match = re.compile(self.column_pattern_source,re.UNICODE).match
+        if self.charset_pattern_source is not None: self.charset_match = re.compile(self.charset_pattern_source,re.UNICODE).match
+
+    def compile_and_match(self,value):
+        # Stands in for fast_match until the first check, so that checks never test whether it is compiled
+        self.compile()
+        return self.fast_match(value)
+
+    def check(self,value):
+        if not isinstance(value,(TEXT_TYPE,str)): return 'type'
+
+        if self.fast_match(value) is not None: return None
+        if isinstance(value,bytes): value = value.decode('utf-8','replace')
+
+        for check in self.checks:
+            if check == 'empty' and not value.strip(): return check
+            if check == 'length' and len(value) > self.max_length: return check
+            if check == 'charset' and self.charset_match(value) is None: return check
+        return None
+
+    def first_failure(self,values):
+        """Return the index of the first of values that fails check(), or None if all of them pass."""
+
+        value_types = set(map(type,values))
+        if len(value_types) == 1 and value_types <= set([TEXT_TYPE,str]):
+            separator = value_types.pop()('\x00')
+            column = separator.join(values) + separator
+            # A NUL inside a value would shift the columns; such values are checked one at a time
+            if column.count(separator) == len(values):
+                if self.column_match is None: self.compile()
+                if self.column_match(column) is not None: return None
+
+        # The check of the class, as RuleProfiler swaps a timed one in for the check of the instance; the
+        # failure found here is counted when check_discovered_appliance_fields checks the value again
+        check = type(self).check
+        for index,value in enumerate(values):
+            if check(self,value) is not None: return index
+        return None
+
+    def failed(self,check,title,data,path):
+        return check_failed(self.rules[check],title,self.messages[check],data,path)
+
+APPLIANCE_ID_CONSTRAINT = StringConstraint('applianceId','discovery.applianceId',['empty','length','charset'],256,u'a-zA-Z0-9_\\-=#;:?@&','must be alphanumeric or include these special characters: _-=#;:?@&')
+DISCOVERED_APPLIANCE_STRING_CONSTRAINTS = (
+    ('applianceId',APPLIANCE_ID_CONSTRAINT),
+    ('manufacturerName',StringConstraint('manufacturerName','discovery.manufacturerName',['empty','length'],128)),
+    ('modelName',StringConstraint('modelName','discovery.modelName',['empty','length'],128)),
+    ('version',StringConstraint('version','discovery.version',['empty','length'],128)),
+    ('friendlyName',StringConstraint('friendlyName','discovery.friendlyName',['empty','length','charset'],128,ALPHANUMERIC_CHARACTERS + u' ','must be specified in alphanumeric characters and spaces')),
+    ('friendlyDescription',StringConstraint('friendlyDescription','discovery.friendlyDescription',['empty','length'],128))
+)
+MESSAGE_ID_CONSTRAINT = StringConstraint('header.messageId','header.messageId',['charset','empty','length'],127,u'a-zA-Z0-9\\-','must be specified in alphanumeric characters or - ')
+HEALTH_CHECK_DESCRIPTION_CONSTRAINT = StringConstraint('payload.description','payload.description',['empty'])
+TEMPERATURE_MODE_FRIENDLY_NAME_CONSTRAINT = StringConstraint('payload.temperatureMode.friendlyName','payload.temperatureMode.friendlyName',['empty'])
+DEPENDENT_SERVICE_NAME_CONSTRAINT = StringConstraint('payload.dependentServiceName','payload.dependentServiceName',['charset'],None,ALPHANUMERIC_CHARACTERS + u' ','must be specified in alphanumeric characters and spaces')
+FIRMWARE_VERSION_CONSTRAINTS = (
+    ('minimumFirmwareVersion',StringConstraint('payload.minimumFirmwareVersion','payload.minimumFirmwareVersion',['empty','charset'],None,ALPHANUMERIC_CHARACTERS,'must be specified in alphanumeric characters')),
+    ('currentFirmwareVersion',StringConstraint('payload.currentFirmwareVersion','payload.currentFirmwareVersion',['empty','charset'],None,ALPHANUMERIC_CHARACTERS,'must be specified in alphanumeric characters'))
+)
+FAULTING_PARAMETER_CONSTRAINT = StringConstraint('payload.faultingParameter','payload.faultingParameter',['empty'])
+ALPHANUMERIC_CONSTRAINT = StringConstraint('value','value',['charset'],None,ALPHANUMERIC_CHARACTERS,'must be specified in alphanumeric characters')
+STRING_CONSTRAINTS = tuple(constraint for key,constraint in DISCOVERED_APPLIANCE_STRING_CONSTRAINTS + FIRMWARE_VERSION_CONSTRAINTS) + (
+    MESSAGE_ID_CONSTRAINT,
+    HEALTH_CHECK_DESCRIPTION_CONSTRAINT,
+    TEMPERATURE_MODE_FRIENDLY_NAME_CONSTRAINT,
+    DEPENDENT_SERVICE_NAME_CONSTRAINT,
+    FAULTING_PARAMETER_CONSTRAINT,
+    ALPHANUMERIC_CONSTRAINT
+)
+
+MAX_ERROR_EXCERPT_LENGTH = 1000
+DEFAULT_APPLIANCE_CACHE_SIZE = 3000
+DEFAULT_DISCOVERY_INDEX_SIZE = 10000
+MAX_ADDITIONAL_APPLIANCE_DETAILS_SIZE = 5000
+DEFAULT_SAMPLING_RECOVERY_COUNT = 1000
+DEFAULT_PROFILING_INTERVAL = 60.0
+DEFAULT_VALIDATION_RESERVE_MILLIS = 250
+
+# time.perf_counter is only available on Python 3; time.time is the precise clock on Python 2 on Linux
+TIMER = getattr(time,'perf_counter',time.time)
+
+
+class ValidationError(ValueError):
+    """Raised when a response fails validation.
+
+    The error carries the id of the failing rule (e.g. 'discovery.friendlyName.charset'), the JSON path
+    of the offending field and a reference to the data it was found in. The message, including an
+    excerpt of the data capped at MAX_ERROR_EXCERPT_LENGTH characters, is only rendered when the error
+    is converted to a string, e.g. when it is logged.
+    """
+
+    def __init__(self,rule,title,description,data=None,path=None):
+        ValueError.__init__(self,rule,title,description,data,path)
+        self.rule = rule
+        self.title = title
+        self.description = description
+        self.data = data
+        self.path = path
+
+    def __str__(self):
+        return self.title + ' :: ' + self.description + ': ' + format_excerpt(self.data)
+
+    def __repr__(self):
+        return 'ValidationError(' + repr(self.rule) + ', ' + repr(self.path) + ')'
+
+
+class CheckResult(collections.namedtuple('CheckResult',['ok','rule','path','title','description','data'])):
+    """The verdict of check_response.
+
+    ok is True for a valid response. Otherwise rule is the id of the first failing rule and path the JSON
+    path of the offending field. Building a CheckResult does not format anything; to_error() turns it
+    into the ValidationError that validateResponse would have raised.
+    """
+
+    __slots__ = ()
+
+    def to_error(self):
+        return ValidationError(self.rule,self.title,self.description,self.data,self.path)
+
+CHECK_OK = CheckResult(True,None,None,None,None,None)
+
+
+class ApplianceCache(object):
+    """Bounded LRU set of discovered appliances that are known to be valid.
+
+    Appliances are keyed by a tuple of every field that discovery validation looks at, so an appliance
+    that changes in any of them gets a new key and is checked again. Building the key is an order of
+    magnitude cheaper than running the checks, unlike hashing a JSON or repr encoding of the whole dict.
+    Only valid appliances are stored; invalid ones are always fully checked so that the error is
+    reported. hits and misses count cache lookups.
+    """
+
+    def __init__(self,max_size=DEFAULT_APPLIANCE_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self,appliance):
+        """Return the cache key of an appliance, or None if it cannot be cached."""
+
+        try:
+            # A bool or list compares equal to other types that would fail validation (1, tuples, strings)
+            if type(appliance['isReachable']) is not bool or type(appliance['actions']) is not list: return None
+            details = appliance['additionalApplianceDetails']
+            key = (
+                appliance['applianceId'],
+                appliance['manufacturerName'],
+                appliance['modelName'],
+                appliance['version'],
+                appliance['friendlyName'],
+                appliance['friendlyDescription'],
+                appliance['isReachable'],
+                tuple(appliance['actions']),
+                repr(details) if details else details
+            )
+            hash(key)
+        except (KeyError,TypeError):
+            return None
+        return key
+
+    def lookup(self,key):
+        if key in self.entries:
+            # Move the entry to the most recently used end
+            self.entries[key] = self.entries.pop(key)
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def add(self,key):
+        self.entries[key] = True
+        if len(self.entries) > self.max_size: self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {'size': len(self.entries),'max_size': self.max_size,'hits': self.hits,'misses': self.misses}
+
+appliance_cache = None
+
+def enable_appliance_cache(max_size=DEFAULT_APPLIANCE_CACHE_SIZE):
+    """Turn on memoization of valid discovered appliances for this container and return the cache.
+
+    Once enabled, discovery validation skips the per-appliance checks for any appliance that is
+    identical to one already found valid, which makes repeated discoveries of unchanged accounts on a
+    warm container mostly hash lookups. Call disable_appliance_cache to turn it off again.
+    """
+
+    global appliance_cache
+    appliance_cache = ApplianceCache(max_size)
+    return appliance_cache
+
+def disable_appliance_cache():
+    global appliance_cache
+    appliance_cache = None
+
+
+class DiscoveryIndex(object):
+    """Bounded LRU index of the appliances found valid in discovery responses, per account.
+
+    Accounts are keyed by the access token of the discovery request, and map each applianceId to a
+    bitset of its actions, so that control and query responses are checked against the discovered
+    appliances in constant time. Before a discovery response is indexed, its applianceIds must be
+    unique and its friendlyNames distinct, ignoring case and spacing. The least recently used accounts
+    are evicted once the index holds more than max_appliances appliances. A token that was never seen
+    in a discovery, e.g. after a token refresh, is not checked; hits and misses count those lookups.
+    """
+
+    def __init__(self,max_appliances=DEFAULT_DISCOVERY_INDEX_SIZE):
+        self.max_appliances = max_appliances
+        self.accounts = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def add_discovery(self,request,response_name,appliances):
+        """Check the valid appliances of a discovery response against each other, and index them."""
+
+        appliance_actions = {}
+        friendly_names = {}
+        for index,appliance in enumerate(appliances):
+            if appliance['applianceId'] in appliance_actions: return check_failed('discovery.applianceId.duplicate',response_name,'applianceId ' + format(appliance['applianceId']) + ' is not unique',appliance,appliance_path(index,'applianceId'))
+            friendly_name = tuple(appliance['friendlyName'].lower().split())
+            if friendly_name in friendly_names: return check_failed('discovery.friendlyName.duplicate',response_name,'friendlyName must be distinct from ' + appliance_path(friendly_names[friendly_name],'friendlyName'),appliance,appliance_path(index,'friendlyName'))
+            friendly_names[friendly_name] = index
+
+            actions = 0
+            for action in appliance['actions']:
+                actions |= ACTION_BITS[action]
+            appliance_actions[appliance['applianceId']] = actions
+
+        try:
+            access_token = request['payload']['accessToken']
+            previous = self.accounts.pop(access_token,None)
+        except (KeyError,TypeError):
+            return None
+        if previous is not None: self.size -= len(previous)
+        self.accounts[access_token] = appliance_actions
+        self.size += len(appliance_actions)
+        while self.size > self.max_appliances and len(self.accounts) > 1:
+            self.size -= len(self.accounts.popitem(last=False)[1])
+
+    def check_target(self,request,response_name):
+        """Check that the appliance of a control or query request was discovered with the requested action."""
+
+        # Error responses are how an undiscovered appliance or an unsupported action is reported
+        if response_name in VALID_CONTROL_ERROR_RESPONSE_NAME_SET: return None
+        try:
+            access_token = request['payload']['accessToken']
+            appliance_id = request['payload']['appliance']['applianceId']
+            if access_token not in self.accounts:
+                self.misses += 1
+                return None
+            actions = self.accounts[access_token].get(appliance_id)
+        except (KeyError,TypeError):
+            return None
+
+        # Move the account to the most recently used end
+        self.accounts[access_token] = self.accounts.pop(access_token)
+        self.hits += 1
+        if actions is None: return check_failed('appliance.undiscovered',response_name,'request.payload.appliance.applianceId was not discovered for this account',request,'request.payload.appliance.applianceId')
+        # Other request names are left to the namespace rules
+        action_bits = REQUEST_ACTION_BITS.get(request['header']['name'])
+        if action_bits is not None and not actions & action_bits: return check_failed('appliance.action.unsupported',response_name,format(request['header']['name']) + ' is not among the actions discovered for the appliance',request,'request.header.name')
+
+    def clear(self):
+        self.accounts.clear()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {'accounts': len(self.accounts),'appliances': self.size,'max_appliances': self.max_appliances,'hits': self.hits,'misses': self.misses}
+
+discovery_index = None
+
+def enable_discovery_index(max_appliances=DEFAULT_DISCOVERY_INDEX_SIZE):
+    """Turn on indexing of discovered appliances for this container and return the index.
+
+    Once enabled, discovery validation also rejects duplicate applianceIds and friendlyNames, and the
+    responses to control and query requests are checked against the last discovery of the same
+    account: the appliance must have been discovered, with the action of the request among its
+    actions. Call disable_discovery_index to turn it off again.
+    """
+
+    global discovery_index
+    discovery_index = DiscoveryIndex(max_appliances)
+    return discovery_index
+
+def disable_discovery_index():
+    global discovery_index
+    discovery_index = None
+
+schema_engine = None
+
+def enable_schema_engine(engine):
+    """Check responses with a schema engine first, e.g. the compiled JSON Schemas of validation_schema.py.
+
+    engine.accepts(response) must return True only for a response that passes every rule that does not
+    depend on the request. An accepted response is then only checked against the rules its schema cannot
+    express; any other response is checked as usual, so the verdict and the reported rule are the same
+    with or without the engine. Call disable_schema_engine to turn it off again.
+    """
+
+    global schema_engine
+    schema_engine = engine
+    return engine
+
+def disable_schema_engine():
+    global schema_engine
+    schema_engine = None
+
+
+class SamplingPolicy(object):
+    """Decides which responses validateResponse validates, for validation in production.
+
+    A random fraction of the responses is validated. Error responses, and responses whose name has not
+    been found valid yet in this container, are always validated. After a failure every response is
+    validated until recovery_count responses in a row have passed, and then sampling resumes.
+    validated, skipped and failures count the decisions and the failures found.
+    """
+
+    def __init__(self,fraction,recovery_count=DEFAULT_SAMPLING_RECOVERY_COUNT,random_source=None):
+        if not 0.0 <= fraction <= 1.0: raise ValueError('fraction must be between 0 and 1')
+        self.fraction = fraction
+        self.recovery_count = recovery_count
+        if random_source is None:
+            # random is imported only once sampling is used; it takes longer to import than this module
+            import random
+            random_source = random.Random()
+        self.random = random_source
+        self.seen_response_names = set()
+        self.full_validations_left = 0
+        self.validated = 0
+        self.skipped = 0
+        self.failures = 0
+
+    def should_validate(self,response):
+        try:
+            response_name = response['header']['name']
+            sample = self.full_validations_left > 0 or response_name not in self.seen_response_names or response_name in VALID_CONTROL_ERROR_RESPONSE_NAME_SET
+        except (KeyError,TypeError):
+            # A response without a usable name is malformed, and cheap to reject
+            sample = True
+
+        if sample or self.random.random() < self.fraction:
+            self.validated += 1
+            return True
+        self.skipped += 1
+        return False
+
+    def record(self,response,result):
+        if result.ok:
+            self.seen_response_names.add(response['header']['name'])
+            if self.full_validations_left > 0: self.full_validations_left -= 1
+        else:
+            self.failures += 1
+            self.full_validations_left = self.recovery_count
+
+    def stats(self):
+        return {
+            'fraction': self.fraction,
+            'validated': self.validated,
+            'skipped': self.skipped,
+            'failures': self.failures,
+            'full_validations_left': self.full_validations_left
+        }
+
+
+class RuleProfiler(object):
+    """Counts how often each validation check runs and fails, and how long it takes.
+
+    Checks are timed at the granularity at which they are dispatched: the whole response ('response'),
+    each namespace ('namespace.Discovery', ...), the header ('header'), each payload check
+    ('payload.' + response name), each discovered appliance ('discovery.appliance'), each columnar check
+    of a list of appliances ('discovery.columns') and each string constraint (its rule prefix, e.g. 'discovery.friendlyName' or 'header.messageId'). Times include the
+    nested checks. A failure is counted for every check that returned it, and under failed_rules for the
+    exact rule id, e.g. 'discovery.friendlyName.charset'.
+
+    Profiling works by swapping timed wrappers in for the checks, so it costs nothing once uninstalled.
+    If output is given, a JSON line with a snapshot is written to it after a response is checked, at
+    most every interval seconds; the counts are cumulative.
+    """
+
+    def __init__(self,output=None,interval=DEFAULT_PROFILING_INTERVAL):
+        self.output = output
+        self.interval = interval
+        self.last_write = time.time()
+        self.checks = {}
+        self.originals = []
+
+    def install(self):
+        module = globals()
+        self.replace(module,'check_response',self.timed('response',check_response,check_result_rule,True))
+        self.replace(module,'check_response_header',self.timed('header',check_response_header,check_result_rule))
+        self.replace(module,'check_discovered_appliance_fields',self.timed('discovery.appliance',check_discovered_appliance_fields,check_result_rule))
+        self.replace(module,'check_discovered_appliance_columns',self.timed('discovery.columns',check_discovered_appliance_columns,check_result_rule))
+        for namespace,check in list(NAMESPACE_CHECKS.items()):
+            self.replace(NAMESPACE_CHECKS,namespace,self.timed('namespace.' + namespace.split('.')[-1],check,check_result_rule))
+        for response_name,check in list(RESPONSE_PAYLOAD_CHECKS.items()):
+            self.replace(RESPONSE_PAYLOAD_CHECKS,response_name,self.timed('payload.' + response_name,check,check_result_rule))
+        for constraint in STRING_CONSTRAINTS:
+            self.replace(vars(constraint),'check',self.timed(constraint.rule_prefix,constraint.check,constraint.rules.get))
+
+    def uninstall(self):
+        for container,key,original in reversed(self.originals):
+            if original is None:
+                del container[key]
+            else:
+                container[key] = original
+        self.originals = []
+
+    def replace(self,container,key,value):
+        self.originals.append((container,key,container.get(key)))
+        container[key] = value
+
+    def timed(self,name,check,failed_rule,report=False):
+        """Return check wrapped to count its runs, failures and time under name.
+
+        failed_rule maps a result of check to the id of the failing rule, or None if it passed.
+        """
+
+        stats = self.checks.setdefault(name,{'runs': 0,'failures': 0,'seconds': 0.0,'failed_rules': {}})
+        timer = TIMER
+
+        def timed_check(*args):
+            start = timer()
+            result = check(*args)
+            stats['seconds'] += timer() - start
+            stats['runs'] += 1
+            if result is not None:
+                rule = failed_rule(result)
+                if rule is not None:
+                    stats['failures'] += 1
+                    stats['failed_rules'][rule] = stats['failed_rules'].get(rule,0) + 1
+            if report and self.output is not None: self.report()
+            return result
+        return timed_check
+
+    def report(self):
+        now = time.time()
+        if now - self.last_write < self.interval: return
+        self.last_write = now
+        self.output.write(json.dumps({'timestamp': now,'checks': self.snapshot()},sort_keys=True) + '\n')
+        self.output.flush()
+
+    def snapshot(self):
+        """Return a copy of the counts of every check that ran at least once, keyed by check name."""
+
+        snapshot = {}
+        for name,stats in self.checks.items():
+            if stats['runs'] == 0: continue
+            snapshot[name] = dict(stats,failed_rules=dict(stats['failed_rules']))
+        return snapshot
+
+    def clear(self):
+        for stats in self.checks.values():
+            stats.update({'runs': 0,'failures': 0,'seconds': 0.0,'failed_rules': {}})
+
+rule_profiler = None
+
+def enable_profiling(output=None,interval=DEFAULT_PROFILING_INTERVAL):
+    """Turn on per-check profiling of validation for this container and return the profiler.
+
+    Once enabled, every check run through this module is counted and timed; rule_profiler.snapshot()
+    returns the counts, and if output is a file, they are also written to it as JSON lines every interval
+    seconds. Call disable_profiling to remove the instrumentation again.
+    """
+
+    global rule_profiler
+    disable_profiling()
+    rule_profiler = RuleProfiler(output,interval)
+    rule_profiler.install()
+    return rule_profiler
+
+def disable_profiling():
+    global rule_profiler
+    if rule_profiler is not None: rule_profiler.uninstall()
+    rule_profiler = None
 
 
+class ValidationDeadline(object):
+    """The time validation may take before it has to give way to returning the response.
+
+    Validation runs its checks in priority order: the request, the response envelope and header, and
+    the payload, and last the per-appliance checks of a discovery response, which are the only ones whose
+    cost grows with the response. Once the deadline has passed, those are skipped, and skipped_from is set
+    to the path of the first appliance that was not checked. The response is then reported valid as far
+    as it was checked. The deadline is reserve_millis before the given remaining time runs out.
+    """
+
+    def __init__(self,remaining_millis,reserve_millis=DEFAULT_VALIDATION_RESERVE_MILLIS):
+        self.expires = TIMER() + (remaining_millis - reserve_millis) / 1000.0
+        self.skipped_from = None
+
+    @classmethod
+    def from_context(cls,context,reserve_millis=DEFAULT_VALIDATION_RESERVE_MILLIS):
+        """Return the deadline of the Lambda invocation of context, as of now."""
+
+        return cls(context.get_remaining_time_in_millis(),reserve_millis)
+
+    def expired(self):
+        return TIMER() >= self.expires
+
+    def skip(self,path):
+        self.skipped_from = path
+
+    @property
+    def degraded(self):
+        return self.skipped_from is not None
+
+
+def warm_up():
+    """Do the one-time work of validation ahead of the first response, e.g. during Lambda init.
+
+    This looks up the JSON parser of parse_json and compiles every regular expression, which is
+    otherwise done when they are first used, and validates one sample response per namespace, so that
+    the first response of a new container is validated as fast as the following ones.
+    """
+
+    global fast_json_loads
+    fast_json_loads = find_json_parser()
+    for constraint in STRING_CONSTRAINTS:
+        constraint.compile()
+
+    appliance = {
+        'applianceId': 'warm-up',
+        'manufacturerName': 'warm-up',
+        'modelName': 'warm-up',
+        'version': '1',
+        'friendlyName': 'warm up',
+        'friendlyDescription': 'warm-up',
+        'isReachable': True,
+        'actions': ['turnOn'],
+        'additionalApplianceDetails': {}
+    }
+    for namespace,request_name,response_name,payload in [
+        ('Alexa.ConnectedHome.Discovery','DiscoverAppliancesRequest','DiscoverAppliancesResponse',{'discoveredAppliances': [appliance]}),
+        ('Alexa.ConnectedHome.Control','TurnOnRequest','TurnOnConfirmation',{}),
+        ('Alexa.ConnectedHome.Query','GetLockStateRequest','GetLockStateResponse',{'lockState': 'LOCKED'}),
+        ('Alexa.ConnectedHome.System','HealthCheckRequest','HealthCheckResponse',{'description': 'warm-up','isHealthy': True})
+    ]:
+        request = {'header': {'namespace': namespace,'name': request_name,'payloadVersion': '2','messageId': 'warm-up'},'payload': {}}
+        response = {'header': {'namespace': namespace,'name': response_name,'payloadVersion': '2','messageId': 'warm-up'},'payload': payload}
+        check_response(request,response)
+
 def validateContext(context):
     """Validate the Lambda context.
 
@@ -204,44 +887,44 @@ def validateContext(context):
     in an error to the user.
     """
 
-    if context.get_remaining_time_in_millis() > 7000: raise_value_error(generate_error_message('Lambda','timeout must be 7 seconds or less',context))
+    if context.get_remaining_time_in_millis() > 7000: raise_validation_error('context.timeout','Lambda','timeout must be 7 seconds or less',context)
 
 
-def validateResponse(request,response):
+def validateResponse(request,response,policy=None,deadline=None):
     """Validate the response to a request.
 
     This is the main validation method to be called in your Lambda handler, just before you return
     the response to Alexa. This method validates the request to ensure it is valid, and then dispatches
-    to specific response validation methods depending on the request namespace.
+    to specific response validation methods depending on the request namespace. If a SamplingPolicy
+    is given, the response is only validated when the policy samples it. If a ValidationDeadline is
+    given, the per-appliance discovery checks are skipped once it has passed.
     """
 
-    # Validate request
-    if request is None: raise_value_error(generate_error_message('Request','request is missing',request))
-    if not bool(request): raise_value_error(generate_error_message('Request','request must not be empty',request))
-    if not isinstance(request,dict): raise_value_error(generate_error_message('Request','request must be a dict',request))
-    try:
-        request_namespace = request['header']['namespace']
-    except:
-        raise_value_error(generate_error_message('Request','request is invalid',request))
+    if policy is None:
+        raise_if_failed(check_response(request,response,deadline))
+        return
 
-    # Validate response
-    if response is None: raise_value_error(generate_error_message('Response','response is missing',response))
-    if not bool(response): raise_value_error(generate_error_message('Response','response must not be empty',response))
-    if not isinstance(response,dict): raise_value_error(generate_error_message('Response','response must be a dict',response))
+    if not policy.should_validate(response): return
+    result = check_response(request,response,deadline)
+    policy.record(response,result)
+    raise_if_failed(result)
 
-    for required_key in REQUIRED_RESPONSE_KEYS:
-        if required_key not in response: raise_value_error(generate_error_message('Response',format(required_key) + ' is missing',response))
+def validateResponseJson(request,response_bytes,policy=None,deadline=None):
+    """Validate a response serialized to JSON, and return it as (response, response_bytes).
 
-    if request_namespace == 'Alexa.ConnectedHome.Discovery':
-        validateDiscoveryResponse(request,response)
-    elif request_namespace == 'Alexa.ConnectedHome.Control':
-        validateControlResponse(request,response)
-    elif request_namespace == 'Alexa.ConnectedHome.Query':
-        validateQueryResponse(request,response)
-    elif request_namespace == 'Alexa.ConnectedHome.System':
-        validateSystemResponse(request,response)
-    else:
-        raise_value_error(generate_error_message('Request','request.header.namespace is invalid',request))
+    This method validates the bytes that are actually sent, e.g. by a handler that serializes its
+    response once for both logging and sending. The bytes are parsed with the fastest JSON parser
+    installed (see parse_json) and the parsed response is validated as by validateResponse. The parsed
+    response is returned with the very bytes that were validated, so that they can be logged and sent
+    without encoding the response again.
+    """
+
+    try:
+        response = parse_json(response_bytes)
+    except (ValueError,TypeError):
+        raise_validation_error('response.json.invalid','Response','response must be valid JSON',response_bytes)
+    validateResponse(request,response,policy,deadline)
+    return response,response_bytes
 
 def validateSystemResponse(request,response):
     """Validate the response to a Health Check request.
@@ -250,295 +933,550 @@ def validateSystemResponse(request,response):
     https://developer.amazon.com/public/solutions/alexa/alexa-skills-kit/docs/smart-home-skill-api-reference#health-check-messages
     """ 
 
+    raise_if_failed(check_system_response(request,response))
+
+def validateDiscoveryResponse(request,response):
+    """Validate the response to a DiscoverApplianceRequest request.
+
+    This method validates the response to a DiscoverApplianceRequest request, based on the API reference:
+    https://developer.amazon.com/public/solutions/alexa/alexa-skills-kit/docs/smart-home-skill-api-reference#discoverappliancesresponse
+    """ 
+
+    raise_if_failed(check_discovery_response(request,response))
+
+def validateDiscoveryStream(request,header,appliances,deadline=None):
+    """Validate a discovery response whose appliances arrive one at a time.
+
+    This method validates the response header and then each appliance of the iterable as it arrives,
+    raising a ValidationError at the first invalid appliance or at the first appliance over the limit
+    of 300, without waiting for the whole payload.discoveredAppliances list to be assembled.
+    """
+
+    raise_if_failed(check_discovery_stream(request,header,appliances,deadline))
+
+def validateControlResponse(request,response):
+    """Validate the response to a Control request.
+
+    This method validates the response to a Control (e.g. turn on/off, set temperatures, etc.) request, based on the API reference (starting from):
+    https://developer.amazon.com/public/solutions/alexa/alexa-skills-kit/docs/smart-home-skill-api-reference#onoff-messages
+    """ 
+
+    raise_if_failed(check_control_response(request,response))
+
+def validateQueryResponse(request,response):
+    """Validate the response to a Query request.
+
+    This method validates the response to a Query (e.g. ambient temperature, lock state, etc.) request, based on the API reference (starting from):
+    https://developer.amazon.com/public/solutions/alexa/alexa-skills-kit/docs/smart-home-skill-api-reference#onoff-messages
+    """ 
+
+    raise_if_failed(check_query_response(request,response))
+
+def validateResponseHeader(request,response):
+    """Validate the response header.
+
+    This method validates the header of the responses, based on the API reference:
+    https://developer.amazon.com/public/solutions/alexa/alexa-skills-kit/docs/smart-home-skill-api-reference#skill-adapter-directives
+    """ 
+
+    raise_if_failed(check_response_header(request,response))
+
+
+"""Non-raising checks.
+
+Each check returns None if the checked part of the response is valid, or the CheckResult of the first
+rule that failed. The validate* methods above raise a ValidationError built from that result.
+"""
+
+def check_response(request,response,deadline=None):
+    """Check the response to a request without raising.
+
+    This is the non-raising counterpart of validateResponse, for callers that only need a verdict
+    (sampling, metrics, offline audits). It returns CHECK_OK if the response is valid, and otherwise
+    the CheckResult of the first rule that failed, with its rule id and JSON path.
+    """
+
+    return check_request_and_response(request,response,deadline)
+
+def check_request_and_response(request,response,deadline=None):
+    # Validate request
+    if request is None: return check_failed('request.missing','Request','request is missing',request,'request')
+    if not bool(request): return check_failed('request.empty','Request','request must not be empty',request,'request')
+    if not isinstance(request,dict): return check_failed('request.type','Request','request must be a dict',request,'request')
+    try:
+        request_namespace = request['header']['namespace']
+    except:
+        return check_failed('request.invalid','Request','request is invalid',request,'request')
+
+    # Validate response
+    if response is None: return check_failed('response.missing','Response','response is missing',response)
+    if not bool(response): return check_failed('response.empty','Response','response must not be empty',response)
+    if not isinstance(response,dict): return check_failed('response.type','Response','response must be a dict',response)
+
+    for required_key in REQUIRED_RESPONSE_KEYS:
+        if required_key not in response: return check_failed('response.' + required_key + '.missing','Response',format(required_key) + ' is missing',response,required_key)
+
+    namespace_check = get_registered(NAMESPACE_CHECKS,request_namespace)
+    if namespace_check is None: return check_failed('request.namespace.invalid','Request','request.header.namespace is invalid',request,'request.header.namespace')
+    if schema_engine is not None and schema_engine.accepts(response):
+        # The schema of the response name only stands in for the namespace check of the same category
+        if response['header']['name'] in SCHEMA_RESPONSE_NAME_SETS.get(request_namespace,()): return check_schema_residue(request,request_namespace,response) or CHECK_OK
+    return namespace_check(request,response,deadline) or CHECK_OK
+
+def check_system_response(request,response,deadline=None):
     # Validate header
-    validateResponseHeader(request,response)
+    result = check_response_header(request,response)
+    if result is not None: return result
     response_name = response['header']['name']
 
     # Validate response payload
     try:
         payload = response['payload']
     except:
-        raise_value_error(generate_error_message(response_name,'payload is missing',response))
-
-    if payload is None: raise_value_error(generate_error_message(response_name,'payload is missing',payload))
+        return check_failed('payload.missing',response_name,'payload is missing',response,'payload')
 
-    for required_key in ['description','isHealthy']:
-        if required_key not in payload: raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' is missing',payload))
-        if is_empty_string(payload['description']): raise_value_error(generate_error_message(response_name,'payload.description must not be empty',payload))
-        if not isinstance(payload['isHealthy'],bool): raise_value_error(generate_error_message(response_name,'payload.isHealthy must be a boolean',payload))
-
-def validateDiscoveryResponse(request,response):
-    """Validate the response to a DiscoverApplianceRequest request.
+    if payload is None: return check_failed('payload.missing',response_name,'payload is missing',payload,'payload')
+    if not isinstance(payload,dict): return check_failed('payload.type',response_name,'payload must be a dict',payload,'payload')
 
-    This method validates the response to a DiscoverApplianceRequest request, based on the API reference:
-    https://developer.amazon.com/public/solutions/alexa/alexa-skills-kit/docs/smart-home-skill-api-reference#discoverappliancesresponse
-    """ 
+    return check_response_payload(response_name,payload)
 
+def check_discovery_response(request,response,deadline=None):
     # Validate header
-    validateResponseHeader(request,response)
+    result = check_response_header(request,response)
+    if result is not None: return result
     response_name = response['header']['name']
 
     # Validate response payload
     try:
         payload = response['payload']
     except:
-        raise_value_error(generate_error_message(response_name,'payload is missing',response))
-
-    if payload is None: raise_value_error(generate_error_message(response_name,'payload is missing',payload))
-    if not isinstance(payload,dict): raise_value_error(generate_error_message(response_name,'payload must be a dict',payload))
-
-    if 'discoveredAppliances' not in payload: raise_value_error(generate_error_message(response_name,'payload.discoveredAppliances is missing',payload))
-    if not isinstance(payload['discoveredAppliances'],list): raise_value_error(generate_error_message(response_name,'payload.discoveredAppliances must be a list',payload))
-    if len(payload['discoveredAppliances']) > MAX_DISCOVERED_APPLIANCES: raise_value_error(generate_error_message(response_name,'payload.discoveredAppliances must not contain more than 300 appliances',payload))
-
-    # Validate each discovered appliance
-    for discoveredAppliance in payload['discoveredAppliances']:
-        
-        for required_key in REQUIRED_DISCOVERED_APPLIANCE_KEYS:
-            if required_key not in discoveredAppliance: raise_value_error(generate_error_message(response_name,format(required_key) + ' is missing',discoveredAppliance))
-
-        if is_empty_string(discoveredAppliance['applianceId']): raise_value_error(generate_error_message(response_name,'applianceId must not be empty',discoveredAppliance))
-        if len(discoveredAppliance['applianceId']) > 256: raise_value_error(generate_error_message(response_name,'applianceId must not exceed 256 characters',discoveredAppliance))
-        if not re.match('^[a-zA-Z0-9_\-=#;:?@&]*$',discoveredAppliance['applianceId']): raise_value_error(generate_error_message(response_name,'applianceId must be alphanumeric or include these special characters: _-=#;:?@&',discoveredAppliance))
-        if is_empty_string(discoveredAppliance['manufacturerName']): raise_value_error(generate_error_message(response_name,'manufacturerName must not be empty',discoveredAppliance))
-        if len(discoveredAppliance['manufacturerName']) > 128: raise_value_error(generate_error_message(response_name,'manufacturerName must not exceed 128 characters',discoveredAppliance))
-        if is_empty_string(discoveredAppliance['modelName']): raise_value_error(generate_error_message(response_name,'modelName must not be empty',discoveredAppliance))
-        if len(discoveredAppliance['modelName']) > 128: raise_value_error(generate_error_message(response_name,'modelName must not exceed 128 characters',discoveredAppliance))
-        if is_empty_string(discoveredAppliance['version']): raise_value_error(generate_error_message(response_name,'version must not be empty',discoveredAppliance))
-        if len(discoveredAppliance['version']) > 128: raise_value_error(generate_error_message(response_name,'version must not exceed 128 characters',discoveredAppliance))
-        if is_empty_string(discoveredAppliance['friendlyName']): raise_value_error(generate_error_message(response_name,'friendlyName must not be empty',discoveredAppliance))
-        if len(discoveredAppliance['friendlyName']) > 128: raise_value_error(generate_error_message(response_name,'friendlyName must not exceed 128 characters',discoveredAppliance))
-        if not is_alphanumeric_and_spaces(discoveredAppliance['friendlyName']): raise_value_error(generate_error_message(response_name,'friendlyName must be specified in alphanumeric characters and spaces',discoveredAppliance))
-        if is_empty_string(discoveredAppliance['friendlyDescription']): raise_value_error(generate_error_message(response_name,'friendlyDescription must not be empty',discoveredAppliance))
-        if len(discoveredAppliance['friendlyDescription']) > 128: raise_value_error(generate_error_message(response_name,'friendlyDescription must not exceed 128 characters',discoveredAppliance))
-        if not isinstance(discoveredAppliance['isReachable'],bool): raise_value_error(generate_error_message(response_name,'isReachable must be a boolean',discoveredAppliance))
-        if not isinstance(discoveredAppliance['actions'],list): raise_value_error(generate_error_message(response_name,'actions must be a list',discoveredAppliance))
-        if len(discoveredAppliance['actions']) == 0: raise_value_error(generate_error_message(response_name,'actions must not be empty',discoveredAppliance))
-
-        for action in discoveredAppliance['actions']:
-            if action not in VALID_ACTIONS: raise_value_error(generate_error_message(response_name,format(action) + ' is an invalid action',discoveredAppliance))
-
-        if discoveredAppliance['additionalApplianceDetails'] is not None:
-            if sys.getsizeof(discoveredAppliance['additionalApplianceDetails']) > 5000: raise_value_error(generate_error_message(response_name,'additionalApplianceDetails must not exceed 5000 bytes',discoveredAppliance))
+        return check_failed('payload.missing',response_name,'payload is missing',response,'payload')
 
+    if payload is None: return check_failed('payload.missing',response_name,'payload is missing',payload,'payload')
+    if not isinstance(payload,dict): return check_failed('payload.type',response_name,'payload must be a dict',payload,'payload')
 
-def validateControlResponse(request,response):
-    """Validate the response to a Control request.
+    if 'discoveredAppliances' not in payload: return check_failed('discovery.discoveredAppliances.missing',response_name,'payload.discoveredAppliances is missing',payload,'payload.discoveredAppliances')
+    if not isinstance(payload['discoveredAppliances'],list): return check_failed('discovery.discoveredAppliances.type',response_name,'payload.discoveredAppliances must be a list',payload,'payload.discoveredAppliances')
+    if len(payload['discoveredAppliances']) > MAX_DISCOVERED_APPLIANCES: return check_failed('discovery.discoveredAppliances.limit',response_name,'payload.discoveredAppliances must not contain more than 300 appliances',payload,'payload.discoveredAppliances')
 
-    This method validates the response to a Control (e.g. turn on/off, set temperatures, etc.) request, based on the API reference (starting from):
-    https://developer.amazon.com/public/solutions/alexa/alexa-skills-kit/docs/smart-home-skill-api-reference#onoff-messages
-    """ 
+    # Validate each discovered appliance, while there is time left
+    appliances = payload['discoveredAppliances']
+    if deadline is None and appliance_cache is None and len(appliances) >= MIN_COLUMNAR_DISCOVERED_APPLIANCES:
+        result = check_discovered_appliance_columns(response_name,appliances)
+        if result is not None: return result
+    else:
+        for index,discoveredAppliance in enumerate(appliances):
+            if deadline is not None and deadline.expired():
+                deadline.skip('payload.discoveredAppliances[' + str(index) + ']')
+                return None
+            result = check_discovered_appliance(response_name,index,discoveredAppliance)
+            if result is not None: return result
+
+    # Validate the appliances against each other, and index them for the control and query checks
+    if discovery_index is not None: return discovery_index.add_discovery(request,response_name,appliances)
+
+def check_discovery_stream(request,header,appliances,deadline=None):
+    """Check a discovery response whose appliances arrive one at a time.
+
+    appliances can be any iterable of appliance dicts, e.g. backend pages chained together or the items
+    of an incremental JSON parser reading payload.discoveredAppliances from a file or socket. Each
+    appliance is checked as soon as it arrives, and iteration stops at the first invalid appliance or at
+    the first appliance over MAX_DISCOVERED_APPLIANCES, so the full list is never held in memory. Unlike
+    check_discovery_response, the appliance limit is only detected once that appliance is reached.
+    If a ValidationDeadline is given, iteration also stops once it has passed.
+    """
 
     # Validate header
-    validateResponseHeader(request,response)
-    request_name = request['header']['name']
+    result = check_response_header(request,{'header': header})
+    if result is not None: return result
+    response_name = header['name']
+
+    # Validate each discovered appliance as it arrives, while there is time left
+    for index,discoveredAppliance in enumerate(appliances):
+        if index >= MAX_DISCOVERED_APPLIANCES: return check_failed('discovery.discoveredAppliances.limit',response_name,'payload.discoveredAppliances must not contain more than 300 appliances',discoveredAppliance,'payload.discoveredAppliances')
+        if deadline is not None and deadline.expired():
+            deadline.skip('payload.discoveredAppliances[' + str(index) + ']')
+            break
+        result = check_discovered_appliance(response_name,index,discoveredAppliance)
+        if result is not None: return result
+
+    return CHECK_OK
+
+def check_discovered_appliance(response_name,index,discoveredAppliance):
+    """Check one discovered appliance, skipping it if the appliance cache knows it is valid."""
+
+    cache = appliance_cache
+    if cache is None: return check_discovered_appliance_fields(response_name,index,discoveredAppliance)
+
+    key = cache.key(discoveredAppliance)
+    if key is not None and cache.lookup(key): return None
+    result = check_discovered_appliance_fields(response_name,index,discoveredAppliance)
+    if result is None and key is not None: cache.add(key)
+    return result
+
+def check_discovered_appliance_fields(response_name,index,discoveredAppliance):
+    if not isinstance(discoveredAppliance,dict): return check_failed('discovery.appliance.type',response_name,'discovered appliance must be a dict',discoveredAppliance,'payload.discoveredAppliances[' + str(index) + ']')
+    for required_key in REQUIRED_DISCOVERED_APPLIANCE_KEYS:
+        if required_key not in discoveredAppliance: return check_failed('discovery.' + required_key + '.missing',response_name,format(required_key) + ' is missing',discoveredAppliance,appliance_path(index,required_key))
+
+    for key,constraint in DISCOVERED_APPLIANCE_STRING_CONSTRAINTS:
+        failed_check = constraint.check(discoveredAppliance[key])
+        if failed_check is not None: return constraint.failed(failed_check,response_name,discoveredAppliance,appliance_path(index,key))
+    if not isinstance(discoveredAppliance['isReachable'],bool): return check_failed('discovery.isReachable.type',response_name,'isReachable must be a boolean',discoveredAppliance,appliance_path(index,'isReachable'))
+    if not isinstance(discoveredAppliance['actions'],list): return check_failed('discovery.actions.type',response_name,'actions must be a list',discoveredAppliance,appliance_path(index,'actions'))
+    if len(discoveredAppliance['actions']) == 0: return check_failed('discovery.actions.empty',response_name,'actions must not be empty',discoveredAppliance,appliance_path(index,'actions'))
+
+    for action in discoveredAppliance['actions']:
+        if not is_one_of(action,VALID_ACTION_SET): return check_failed('discovery.actions.invalid',response_name,format(action) + ' is an invalid action',discoveredAppliance,appliance_path(index,'actions'))
+
+    if discoveredAppliance['additionalApplianceDetails'] is not None:
+        try:
+            details_size = json_size(discoveredAppliance['additionalApplianceDetails'],MAX_ADDITIONAL_APPLIANCE_DETAILS_SIZE)
+        except TypeError:
+            return check_failed('discovery.additionalApplianceDetails.type',response_name,'additionalApplianceDetails must be serializable to JSON',discoveredAppliance,appliance_path(index,'additionalApplianceDetails'))
+        except JSON_RECURSION_ERROR:
+            # Circular, or nested deeper than its size allows
+            details_size = MAX_ADDITIONAL_APPLIANCE_DETAILS_SIZE + 1
+        if details_size > MAX_ADDITIONAL_APPLIANCE_DETAILS_SIZE: return check_failed('discovery.additionalApplianceDetails.size',response_name,'additionalApplianceDetails must not exceed ' + str(MAX_ADDITIONAL_APPLIANCE_DETAILS_SIZE) + ' bytes',discoveredAppliance,appliance_path(index,'additionalApplianceDetails'))
+
+def check_discovered_appliance_columns(response_name,appliances):
+    """Check discovered appliances a column at a time, with the same result as checking them one by one.
+
+    Every rule is first screened over the whole column of its field, e.g. one regular expression over
+    all friendlyNames, which finds the first appliance that may fail any rule. Only the appliances from
+    that one on are then checked one at a time, so that the first failing rule and its path are exactly
+    those of check_discovered_appliance_fields. Used for long lists when neither the appliance cache
+    nor a deadline needs the appliances to be visited one by one.
+    """
+
+    for index in range(find_first_suspect_appliance(appliances),len(appliances)):
+        result = check_discovered_appliance_fields(response_name,index,appliances[index])
+        if result is not None: return result
+
+def find_first_suspect_appliance(appliances):
+    """Return the index of the first appliance that may fail a discovery rule, or len(appliances).
+
+    Every appliance before the returned index passes every rule. Each screen only looks at the
+    appliances before the first suspect found by the previous ones.
+    """
+
+    # Appliances that are not dicts with every required key are left to the per-appliance checks
+    first = len(appliances)
+    rows = None
+    if set(map(type,appliances)) == set([dict]):
+        try:
+            rows = list(map(DISCOVERED_APPLIANCE_ROW,appliances))
+        except KeyError:
+            pass
+    if rows is None:
+        first = first_index(appliances,lambda appliance: type(appliance) is not dict or not REQUIRED_DISCOVERED_APPLIANCE_KEY_SET.issubset(appliance))
+        if first == 0: return 0
+        rows = list(map(DISCOVERED_APPLIANCE_ROW,appliances[:first]))
+    columns = dict(zip(REQUIRED_DISCOVERED_APPLIANCE_KEYS,zip(*rows)))
+
+    for key,constraint in DISCOVERED_APPLIANCE_STRING_CONSTRAINTS:
+        index = constraint.first_failure(columns[key][:first])
+        if index is not None: first = index
+
+    is_reachable = columns['isReachable'][:first]
+    if set(map(type,is_reachable)) - set([bool]): first = first_index(is_reachable,lambda value: type(value) is not bool)
+
+    actions = columns['actions'][:first]
+    if set(map(type,actions)) - set([list]) or 0 in map(len,actions) or not is_subset(itertools.chain.from_iterable(actions),VALID_ACTION_SET):
+        first = first_index(actions,lambda value: type(value) is not list or len(value) == 0 or not is_subset(value,VALID_ACTION_SET))
+
+    return first_oversized_details(columns['additionalApplianceDetails'][:first])
+
+def first_oversized_details(details):
+    """Return the index of the first additionalApplianceDetails that fails its rules, or len(details).
+
+    Runs of details are measured together by the C encoder, which is much faster than json_size. A run
+    whose encoding exceeds the limit is split into runs expected to be half the limit, or in halves if it
+    cannot be encoded, so a column of small details costs a few json.dumps calls. A single one is
+    measured by json_size, like check_discovered_appliance_fields does.
+    """
+
+    if len(details) > 1:
+        try:
+            size = len(json.dumps(details))
+            if size <= MAX_ADDITIONAL_APPLIANCE_DETAILS_SIZE: return len(details)
+            run_length = max(1,len(details) * MAX_ADDITIONAL_APPLIANCE_DETAILS_SIZE // (2 * size))
+        except Exception:
+            run_length = len(details) // 2
+        for start in range(0,len(details),run_length):
+            run = details[start:start + run_length]
+            index = first_oversized_details(run)
+            if index < len(run): return start + index
+        return len(details)
+
+    for index,value in enumerate(details):
+        try:
+            if value is not None and json_size(value,MAX_ADDITIONAL_APPLIANCE_DETAILS_SIZE) > MAX_ADDITIONAL_APPLIANCE_DETAILS_SIZE: return index
+        except (TypeError,JSON_RECURSION_ERROR):
+            return index
+    return len(details)
+
+
+def check_schema_residue(request,request_namespace,response):
+    """Check the rules of a response accepted by the schema engine that its schema cannot express.
+
+    These are the rules relating the response to its request, the serialized size of each
+    additionalApplianceDetails and the checks of the discovery index, as the check of the request
+    namespace runs them. The response name must be in SCHEMA_RESPONSE_NAME_SETS for that namespace.
+    Since every other rule passed, the first of these that fails is the first failing rule of the
+    response.
+    """
+
+    result = check_response_header(request,response)
+    if result is not None: return result
+    response_name = response['header']['name']
+
+    if request_namespace == 'Alexa.ConnectedHome.Discovery':
+        appliances = response['payload']['discoveredAppliances']
+        index = first_oversized_details(tuple(appliance['additionalApplianceDetails'] for appliance in appliances))
+        if index < len(appliances): return check_discovered_appliance_fields(response_name,index,appliances[index])
+        if discovery_index is not None: return discovery_index.add_discovery(request,response_name,appliances)
+    elif discovery_index is not None and request_namespace != 'Alexa.ConnectedHome.System':
+        return discovery_index.check_target(request,response_name)
+
+
+def check_control_response(request,response,deadline=None):
+    # Validate header
+    result = check_response_header(request,response)
+    if result is not None: return result
     response_name = response['header']['name']
 
     # Validate response payload
     try:
         payload = response['payload']
     except:
-        raise_value_error(generate_error_message(response_name,'payload is missing',response))
+        return check_failed('payload.missing',response_name,'payload is missing',response,'payload')
 
-    if payload is None: raise_value_error(generate_error_message(response_name,'payload is missing',payload))
-    if not isinstance(payload,dict): raise_value_error(generate_error_message(response_name,'payload must be a dict',payload))
+    if payload is None: return check_failed('payload.missing',response_name,'payload is missing',payload,'payload')
+    if not isinstance(payload,dict): return check_failed('payload.type',response_name,'payload must be a dict',payload,'payload')
 
-    # Validate non-empty control response payload
-    if response_name not in VALID_NON_EMPTY_PAYLOAD_RESPONSE_NAMES:
-        if bool(payload): raise_value_error(generate_error_message(response_name,'payload must be empty',payload))
-    else:
-        if not bool(payload): raise_value_error(generate_error_message(response_name,'payload must not be empty',payload))
-
-    # Validate thermostat control response payload
-    if response_name in ['SetTargetTemperatureConfirmation','IncrementTargetTemperatureConfirmation','DecrementTargetTemperatureConfirmation']: 
-        # Validate payload
-        for required_key in ['targetTemperature','temperatureMode','previousState']:
-            if required_key not in payload: raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' is missing',payload))
-        if 'value' not in payload['targetTemperature']: raise_value_error(generate_error_message(response_name,'payload.targetTemperature.value is missing',payload))
-        if not is_number(payload['targetTemperature']['value']): raise_value_error(generate_error_message(response_name,'payload.targetTemperature.value must be a number',payload))
-        if 'value' not in payload['temperatureMode']: raise_value_error(generate_error_message(response_name,'payload.temperatureMode.value is missing',payload))
-        if payload['temperatureMode']['value'] not in VALID_TEMPERATURE_MODES: raise_value_error(generate_error_message(response_name,'payload.temperatureMode.value is invalid',payload))
-
-        # Validate payload.previousState
-        for required_key in ['targetTemperature','temperatureMode']:
-            if required_key not in payload['previousState']: raise_value_error(generate_error_message(response_name,'payload.previousState.' + format(required_key) + ' is missing',payload))
-        if 'value' not in payload['previousState']['targetTemperature']: raise_value_error(generate_error_message(response_name,'payload.previousState.targetTemperature.value is missing',payload))
-        if not is_number(payload['previousState']['targetTemperature']['value']): raise_value_error(generate_error_message(response_name,'payload.previousState.targetTemperature.value must be a number',payload))
-        if 'value' not in payload['previousState']['temperatureMode']: raise_value_error(generate_error_message(response_name,'payload.previousState.temperatureMode.value is missing',payload))
-        if payload['previousState']['temperatureMode']['value'] not in VALID_TEMPERATURE_MODES: raise_value_error(generate_error_message(response_name,'payload.previousState.temperatureMode.value is invalid',payload))
-
-    # Validate lock control response payload
-    if response_name in ['SetLockStateResponse']:
-        for required_key in ['lockState']:
-            if required_key not in payload: raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' is missing',payload))
-        if payload['lockState'] not in VALID_LOCK_STATES: raise_value_error(generate_error_message(response_name,'payload.lockState is invalid',payload))
-
-    # Validate control error response payload
-    if response_name == 'ValueOutOfRangeError':
-        for required_key in ['minimumValue','maximumValue']:
-            if required_key not in payload: raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' is missing',payload))
-            if not is_number(payload[required_key]): raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' must be a number',payload))
-
-    if response_name == 'DependentServiceUnavailableError':
-        required_key = 'dependentServiceName'
-        if required_key not in payload: raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' is missing',payload))
-        if not is_alphanumeric_and_spaces(payload[required_key]): raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' must be specified in alphanumeric characters and spaces',payload))
-
-    if response_name in ['TargetFirmwareOutdatedError','TargetBridgeFirmwareOutdatedError']:
-        for required_key in ['minimumFirmwareVersion','currentFirmwareVersion']:
-            if required_key not in payload: raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' is missing',payload))
-            if is_empty_string(payload[required_key]): raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' must not be empty',payload))
-            if not is_alphanumeric(payload[required_key]): raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' must be specified in alphanumeric characters',payload))
-
-    if response_name == 'UnableToSetValueError':
-        required_key = 'errorInfo'
-        if required_key not in payload: raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' is missing',payload))
-        for required_key in ['code','description']:
-            if required_key not in payload['errorInfo']: raise_value_error(generate_error_message(response_name,'payload.errorInfo' + format(required_key) + ' is missing',payload))
-        if payload['errorInfo']['code'] not in VALID_UNABLE_ERROR_INFO_CODES: raise_value_error(generate_error_message(response_name,'payload.errorInfo.code is invalid',payload))
-
-    if response_name == 'UnableToGetValueError': validateQueryResponse(request,response) # this is a really ugly hack
-
-    if response_name == 'UnwillingToSetValueError':
-        required_key = 'errorInfo'
-        if required_key not in payload: raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' is missing',payload))
-        for required_key in ['code','description']:
-            if required_key not in payload['errorInfo']: raise_value_error(generate_error_message(response_name,'payload.errorInfo' + format(required_key) + ' is missing',payload))
-        if payload['errorInfo']['code'] not in VALID_UNWILLING_ERROR_INFO_CODES: raise_value_error(generate_error_message(response_name,'payload.errorInfo.code is invalid',payload))
-
-    if response_name == 'RateLimitExceededError':
-        for required_key in ['rateLimit','timeUnit']:
-            if required_key not in payload: raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' is missing',payload))
-        if not payload['rateLimit'].isdigit(): raise_value_error(generate_error_message(response_name,'payload.rateLimit must be a positive integer',payload))
-        if payload['timeUnit'] not in VALID_TIME_UNITS: raise_value_error(generate_error_message(response_name,'payload.timeUnit is invalid',payload))
-
-    if response_name == 'NotSupportedInCurrentModeError':
-        required_key = 'currentDeviceMode'
-        if required_key not in payload: raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' is missing',payload))
-        if payload[required_key] not in VALID_CURRENT_DEVICE_MODES: raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' is invalid',payload))
-
-    if response_name == 'UnexpectedInformationReceivedError':
-        required_key = 'faultingParameter'
-        if required_key not in payload: raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' is missing',payload))
-        if is_empty_string(payload[required_key]): raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' must not be empty',payload))
-
-def validateQueryResponse(request,response):
-    """Validate the response to a Query request.
+    result = check_response_payload(response_name,payload)
+    if result is not None or discovery_index is None: return result
 
-    This method validates the response to a Query (e.g. ambient temperature, lock state, etc.) request, based on the API reference (starting from):
-    https://developer.amazon.com/public/solutions/alexa/alexa-skills-kit/docs/smart-home-skill-api-reference#onoff-messages
-    """ 
+    # Validate the target appliance against its discovery
+    return discovery_index.check_target(request,response_name)
 
+def check_query_response(request,response,deadline=None):
     # Validate header
-    validateResponseHeader(request,response)
+    result = check_response_header(request,response)
+    if result is not None: return result
     response_name = response['header']['name']
 
     # Validate response payload
     try:
         payload = response['payload']
     except:
-        raise_value_error(generate_error_message(response_name,'payload is missing',response))
+        return check_failed('payload.missing',response_name,'payload is missing',response,'payload')
 
-    if payload is None: raise_value_error(generate_error_message(response_name,'payload is missing',payload))
-    if not isinstance(payload,dict): raise_value_error(generate_error_message(response_name,'payload must be a dict',payload))
+    if payload is None: return check_failed('payload.missing',response_name,'payload is missing',payload,'payload')
+    if not isinstance(payload,dict): return check_failed('payload.type',response_name,'payload must be a dict',payload,'payload')
 
-    # Validate non-empty control response payload
-    if response_name not in VALID_NON_EMPTY_PAYLOAD_RESPONSE_NAMES:
-        if bool(payload): raise_value_error(generate_error_message(response_name,'payload must be empty',payload))
-    else:
-        if not bool(payload): raise_value_error(generate_error_message(response_name,'payload must not be empty',payload))
-
-    # Validate thermostat query response payload
-    if response_name in 'GetTemperatureReadingResponse': 
-        for required_key in ['temperatureReading']:
-            if required_key not in payload: raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' is missing',payload))
-        if 'value' not in payload['temperatureReading']: raise_value_error(generate_error_message(response_name,'payload.temperatureReading.value is missing',payload))
-        if not is_number(payload['temperatureReading']['value']): raise_value_error(generate_error_message(response_name,'payload.temperatureReading.value must be a number',payload))
-
-    if response_name in 'GetTargetTemperatureResponse': 
-        for required_key in ['temperatureMode']:
-            if required_key not in payload: raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' is missing',payload))
-        if 'value' not in payload['temperatureMode']: raise_value_error(generate_error_message(response_name,'payload.temperatureMode.value is missing',payload))
-        if payload['temperatureMode']['value'] not in VALID_TEMPERATURE_MODES: raise_value_error(generate_error_message(response_name,'payload.temperatureMode.value is invalid',payload))
-
-        mode = payload['temperatureMode']['value']
-
-        for optional_key in ['targetTemperature','coolingTargetTemperature','heatingTargetTemperature']:
-            if optional_key in payload:
-                if 'value' not in payload[optional_key]: raise_value_error(generate_error_message(response_name,'payload.' + optional_key + '.value is missing',payload))
-                if not is_number(payload[optional_key]['value']): raise_value_error(generate_error_message(response_name,'payload.' + optional_key + '.value must be a number',payload))
-
-        if mode == 'CUSTOM':
-            if 'friendlyName' not in payload['temperatureMode']: raise_value_error(generate_error_message(response_name,'payload.temperatureMode.friendlyName is missing',payload))
-            if is_empty_string(payload['temperatureMode']['friendlyName']): raise_value_error(generate_error_message(response_name,'payload.temperatureMode.friendlyName must not be empty',payload))
-
-    # Validate lock query response payload
-    if response_name in ['GetLockStateResponse']:
-        for required_key in ['lockState']:
-            if required_key not in payload: raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' is missing',payload))
-        if payload['lockState'] not in VALID_LOCK_STATES: raise_value_error(generate_error_message(response_name,'payload.lockState is invalid',payload))
-
-    # Validate query error response payload
-    if response_name == 'UnableToGetValueError':
-        required_key = 'errorInfo'
-        if required_key not in payload: raise_value_error(generate_error_message(response_name,'payload.' + format(required_key) + ' is missing',payload))
-        for required_key in ['code','description']:
-            if required_key not in payload['errorInfo']: raise_value_error(generate_error_message(response_name,'payload.errorInfo' + format(required_key) + ' is missing',payload))
-        if payload['errorInfo']['code'] not in VALID_UNABLE_ERROR_INFO_CODES: raise_value_error(generate_error_message(response_name,'payload.errorInfo.code is invalid',payload))
+    result = check_response_payload(response_name,payload)
+    if result is not None or discovery_index is None: return result
 
+    # Validate the target appliance against its discovery
+    return discovery_index.check_target(request,response_name)
 
-def validateResponseHeader(request,response):
-    """Validate the response header.
+def check_response_payload(response_name,payload):
+    """Check a control, query or system response payload.
 
-    This method validates the header of the responses, based on the API reference:
-    https://developer.amazon.com/public/solutions/alexa/alexa-skills-kit/docs/smart-home-skill-api-reference#skill-adapter-directives
-    """ 
+    This method checks whether the payload must be empty, and then runs only the payload check
+    registered for the response name in RESPONSE_PAYLOAD_CHECKS, if there is one.
+    """
 
+    # Validate non-empty control and query response payload
+    if response_name not in VALID_SYSTEM_RESPONSE_NAME_SET:
+        if response_name not in VALID_NON_EMPTY_PAYLOAD_RESPONSE_NAME_SET:
+            if bool(payload): return check_failed('payload.mustBeEmpty',response_name,'payload must be empty',payload,'payload')
+        else:
+            if not bool(payload): return check_failed('payload.empty',response_name,'payload must not be empty',payload,'payload')
+
+    payload_check = RESPONSE_PAYLOAD_CHECKS.get(response_name)
+    if payload_check is not None: return payload_check(response_name,payload)
+
+def check_health_check_payload(response_name,payload):
+    for required_key in ['description','isHealthy']:
+        if required_key not in payload: return missing_payload_key(response_name,payload,required_key)
+    failed_check = HEALTH_CHECK_DESCRIPTION_CONSTRAINT.check(payload['description'])
+    if failed_check is not None: return HEALTH_CHECK_DESCRIPTION_CONSTRAINT.failed(failed_check,response_name,payload,'payload.description')
+    if not isinstance(payload['isHealthy'],bool): return check_failed('payload.isHealthy.type',response_name,'payload.isHealthy must be a boolean',payload,'payload.isHealthy')
+
+def check_temperature_confirmation_payload(response_name,payload):
+    # Validate payload
+    for required_key in ['targetTemperature','temperatureMode','previousState']:
+        if required_key not in payload: return missing_payload_key(response_name,payload,required_key)
+    for required_key in ['targetTemperature','temperatureMode','previousState']:
+        if not isinstance(payload[required_key],dict): return non_dict_payload_key(response_name,payload,required_key)
+    if 'value' not in payload['targetTemperature']: return missing_payload_key(response_name,payload,'targetTemperature.value')
+    if not is_number(payload['targetTemperature']['value']): return check_failed('payload.targetTemperature.value.type',response_name,'payload.targetTemperature.value must be a number',payload,'payload.targetTemperature.value')
+    if 'value' not in payload['temperatureMode']: return missing_payload_key(response_name,payload,'temperatureMode.value')
+    if not is_one_of(payload['temperatureMode']['value'],VALID_TEMPERATURE_MODE_SET): return check_failed('payload.temperatureMode.value.invalid',response_name,'payload.temperatureMode.value is invalid',payload,'payload.temperatureMode.value')
+
+    # Validate payload.previousState
+    for required_key in ['targetTemperature','temperatureMode']:
+        if required_key not in payload['previousState']: return missing_payload_key(response_name,payload,'previousState.' + required_key)
+    for required_key in ['targetTemperature','temperatureMode']:
+        if not isinstance(payload['previousState'][required_key],dict): return non_dict_payload_key(response_name,payload,'previousState.' + required_key)
+    if 'value' not in payload['previousState']['targetTemperature']: return missing_payload_key(response_name,payload,'previousState.targetTemperature.value')
+    if not is_number(payload['previousState']['targetTemperature']['value']): return check_failed('payload.previousState.targetTemperature.value.type',response_name,'payload.previousState.targetTemperature.value must be a number',payload,'payload.previousState.targetTemperature.value')
+    if 'value' not in payload['previousState']['temperatureMode']: return missing_payload_key(response_name,payload,'previousState.temperatureMode.value')
+    if not is_one_of(payload['previousState']['temperatureMode']['value'],VALID_TEMPERATURE_MODE_SET): return check_failed('payload.previousState.temperatureMode.value.invalid',response_name,'payload.previousState.temperatureMode.value is invalid',payload,'payload.previousState.temperatureMode.value')
+
+def check_lock_state_payload(response_name,payload):
+    for required_key in ['lockState']:
+        if required_key not in payload: return missing_payload_key(response_name,payload,required_key)
+    if not is_one_of(payload['lockState'],VALID_LOCK_STATE_SET): return check_failed('payload.lockState.invalid',response_name,'payload.lockState is invalid',payload,'payload.lockState')
+
+def check_temperature_reading_payload(response_name,payload):
+    for required_key in ['temperatureReading']:
+        if required_key not in payload: return missing_payload_key(response_name,payload,required_key)
+    if not isinstance(payload['temperatureReading'],dict): return non_dict_payload_key(response_name,payload,'temperatureReading')
+    if 'value' not in payload['temperatureReading']: return missing_payload_key(response_name,payload,'temperatureReading.value')
+    if not is_number(payload['temperatureReading']['value']): return check_failed('payload.temperatureReading.value.type',response_name,'payload.temperatureReading.value must be a number',payload,'payload.temperatureReading.value')
+
+def check_target_temperature_payload(response_name,payload):
+    for required_key in ['temperatureMode']:
+        if required_key not in payload: return missing_payload_key(response_name,payload,required_key)
+    if not isinstance(payload['temperatureMode'],dict): return non_dict_payload_key(response_name,payload,'temperatureMode')
+    if 'value' not in payload['temperatureMode']: return missing_payload_key(response_name,payload,'temperatureMode.value')
+    if not is_one_of(payload['temperatureMode']['value'],VALID_TEMPERATURE_MODE_SET): return check_failed('payload.temperatureMode.value.invalid',response_name,'payload.temperatureMode.value is invalid',payload,'payload.temperatureMode.value')
+
+    mode = payload['temperatureMode']['value']
+
+    for optional_key in ['targetTemperature','coolingTargetTemperature','heatingTargetTemperature']:
+        if optional_key in payload:
+            if not isinstance(payload[optional_key],dict): return non_dict_payload_key(response_name,payload,optional_key)
+            if 'value' not in payload[optional_key]: return missing_payload_key(response_name,payload,optional_key + '.value')
+            if not is_number(payload[optional_key]['value']): return check_failed('payload.' + optional_key + '.value.type',response_name,'payload.' + optional_key + '.value must be a number',payload,'payload.' + optional_key + '.value')
+
+    if mode == 'CUSTOM':
+        if 'friendlyName' not in payload['temperatureMode']: return missing_payload_key(response_name,payload,'temperatureMode.friendlyName')
+        failed_check = TEMPERATURE_MODE_FRIENDLY_NAME_CONSTRAINT.check(payload['temperatureMode']['friendlyName'])
+        if failed_check is not None: return TEMPERATURE_MODE_FRIENDLY_NAME_CONSTRAINT.failed(failed_check,response_name,payload,'payload.temperatureMode.friendlyName')
+
+def check_value_out_of_range_payload(response_name,payload):
+    for required_key in ['minimumValue','maximumValue']:
+        if required_key not in payload: return missing_payload_key(response_name,payload,required_key)
+        if not is_number(payload[required_key]): return check_failed('payload.' + required_key + '.type',response_name,'payload.' + format(required_key) + ' must be a number',payload,'payload.' + required_key)
+
+def check_dependent_service_unavailable_payload(response_name,payload):
+    required_key = 'dependentServiceName'
+    if required_key not in payload: return missing_payload_key(response_name,payload,required_key)
+    failed_check = DEPENDENT_SERVICE_NAME_CONSTRAINT.check(payload[required_key])
+    if failed_check is not None: return DEPENDENT_SERVICE_NAME_CONSTRAINT.failed(failed_check,response_name,payload,'payload.dependentServiceName')
+
+def check_firmware_outdated_payload(response_name,payload):
+    for required_key,constraint in FIRMWARE_VERSION_CONSTRAINTS:
+        if required_key not in payload: return missing_payload_key(response_name,payload,required_key)
+        failed_check = constraint.check(payload[required_key])
+        if failed_check is not None: return constraint.failed(failed_check,response_name,payload,'payload.' + required_key)
+
+def check_unable_error_info_payload(response_name,payload):
+    return check_error_info_payload(response_name,payload,VALID_UNABLE_ERROR_INFO_CODE_SET)
+
+def check_unwilling_error_info_payload(response_name,payload):
+    return check_error_info_payload(response_name,payload,VALID_UNWILLING_ERROR_INFO_CODE_SET)
+
+def check_error_info_payload(response_name,payload,valid_codes):
+    required_key = 'errorInfo'
+    if required_key not in payload: return missing_payload_key(response_name,payload,required_key)
+    if not isinstance(payload['errorInfo'],dict): return non_dict_payload_key(response_name,payload,'errorInfo')
+    for required_key in ['code','description']:
+        if required_key not in payload['errorInfo']: return check_failed('payload.errorInfo.' + required_key + '.missing',response_name,'payload.errorInfo' + format(required_key) + ' is missing',payload,'payload.errorInfo.' + required_key)
+    if not is_one_of(payload['errorInfo']['code'],valid_codes): return check_failed('payload.errorInfo.code.invalid',response_name,'payload.errorInfo.code is invalid',payload,'payload.errorInfo.code')
+
+def check_rate_limit_exceeded_payload(response_name,payload):
+    for required_key in ['rateLimit','timeUnit']:
+        if required_key not in payload: return missing_payload_key(response_name,payload,required_key)
+    if not isinstance(payload['rateLimit'],(TEXT_TYPE,str)) or not payload['rateLimit'].isdigit(): return check_failed('payload.rateLimit.type',response_name,'payload.rateLimit must be a positive integer',payload,'payload.rateLimit')
+    if not is_one_of(payload['timeUnit'],VALID_TIME_UNIT_SET): return check_failed('payload.timeUnit.invalid',response_name,'payload.timeUnit is invalid',payload,'payload.timeUnit')
+
+def check_not_supported_in_current_mode_payload(response_name,payload):
+    required_key = 'currentDeviceMode'
+    if required_key not in payload: return missing_payload_key(response_name,payload,required_key)
+    if not is_one_of(payload[required_key],VALID_CURRENT_DEVICE_MODE_SET): return check_failed('payload.currentDeviceMode.invalid',response_name,'payload.' + format(required_key) + ' is invalid',payload,'payload.currentDeviceMode')
+
+def check_unexpected_information_received_payload(response_name,payload):
+    required_key = 'faultingParameter'
+    if required_key not in payload: return missing_payload_key(response_name,payload,required_key)
+    failed_check = FAULTING_PARAMETER_CONSTRAINT.check(payload[required_key])
+    if failed_check is not None: return FAULTING_PARAMETER_CONSTRAINT.failed(failed_check,response_name,payload,'payload.faultingParameter')
+
+
+def check_response_header(request,response):
+    if 'name' not in request['header']: return check_failed('request.name.missing','Request','request.header.name is missing',request,'request.header.name')
     request_name = request['header']['name']
     header = response['header']
 
     # Validate if request_name is valid
-    if request_name not in VALID_REQUEST_NAMES: raise_value_error(generate_error_message('Request','request name is invalid',request))
+    request_rule = get_registered(REQUEST_RULES,request_name)
+    if request_rule is None: return check_failed('request.name.invalid','Request','request name is invalid',request,'request.header.name')
 
     # Validate if header exists
-    if header is None: raise_value_error(generate_error_message('Response','response header is missing',response))
+    if header is None: return check_failed('header.missing','Response','response header is missing',response,'header')
+    if not isinstance(header,dict): return check_failed('header.type','Response','response header must be a dict',header,'header')
 
     # Validate header required params
     for required_header_key in REQUIRED_HEADER_KEYS:
-        if required_header_key not in header: raise_value_error(generate_error_message('Response','header.' + required_header_key + ' is required',header))
+        if required_header_key not in header: return check_failed('header.' + required_header_key + '.missing','Response','header.' + required_header_key + ' is required',header,'header.' + required_header_key)
 
     # Validate header namespace and name
-    if request_name in VALID_DISCOVERY_REQUEST_NAMES:
-        if header['namespace'] != 'Alexa.ConnectedHome.Discovery': raise_value_error(generate_error_message('Discovery Response','header.namespace must be Alexa.ConnectedHome.Discovery',header))
-        if header['name'] not in VALID_DISCOVERY_RESPONSE_NAMES: raise_value_error(generate_error_message('Discovery Response','header.name is invalid',header))
-        correct_response_name = request_name.replace('Request','Response')
-        if header['name'] != correct_response_name: raise_value_error(generate_error_message('Discovery Response','header.name must be ' + correct_response_name + ' for ' + request_name,header))
-
-    if request_name in VALID_CONTROL_REQUEST_NAMES:
-        if header['namespace'] not in ['Alexa.ConnectedHome.Query','Alexa.ConnectedHome.Control']: raise_value_error(generate_error_message('Control Response','header.namespace must be Alexa.ConnectedHome.Query or Alexa.ConnectedHome.Control',header))
-        if header['name'] not in VALID_CONTROL_RESPONSE_NAMES + VALID_CONTROL_ERROR_RESPONSE_NAMES: raise_value_error(generate_error_message('Control Response','header.name is invalid',header))
-        if header['name'] not in VALID_CONTROL_ERROR_RESPONSE_NAMES:
-            correct_response_name = request_name.replace('Request','Confirmation')
-            if header['name'] != correct_response_name: raise_value_error(generate_error_message('Control Response','header.name must be an error response name or ' + correct_response_name + ' for ' + request_name,header))
-
-    if request_name in VALID_QUERY_REQUEST_NAMES:
-        if header['namespace'] not in ['Alexa.ConnectedHome.Query','Alexa.ConnectedHome.Control']: raise_value_error(generate_error_message('Query Response','header.namespace must be Alexa.ConnectedHome.Query or Alexa.ConnectedHome.Control',header))
-        if header['name'] not in VALID_QUERY_RESPONSE_NAMES + VALID_CONTROL_ERROR_RESPONSE_NAMES: raise_value_error(generate_error_message('Query Response','header.name is invalid',header))
-        if header['name'] not in VALID_CONTROL_ERROR_RESPONSE_NAMES:
-            correct_response_name = request_name.replace('Request','Response')
-            if header['name'] != correct_response_name: raise_value_error(generate_error_message('Query Response','header.name must be an error response name or ' + correct_response_name + ' for ' + request_name,header))
-    
-    if request_name in VALID_SYSTEM_REQUEST_NAMES:
-        if header['namespace'] != 'Alexa.ConnectedHome.System': raise_value_error(generate_error_message('System Response','header.namespace must be Alexa.ConnectedHome.System',header))
-        if header['name'] not in VALID_SYSTEM_RESPONSE_NAMES: raise_value_error(generate_error_message('System Response','header.name is invalid',header))
-        correct_response_name = request_name.replace('Request','Response')
-        if header['name'] != correct_response_name: raise_value_error(generate_error_message('System Response','header.name must be ' + correct_response_name + ' for ' + request_name,header))
-    
+    if not is_one_of(header['namespace'],request_rule.namespaces): return check_failed('header.namespace.invalid',request_rule.title,request_rule.namespace_message,header,'header.namespace')
+    if not is_one_of(header['name'],request_rule.response_names): return check_failed('header.name.invalid',request_rule.title,'header.name is invalid',header,'header.name')
+    if not is_one_of(header['name'],request_rule.error_response_names):
+        if header['name'] != request_rule.correct_response_name: return check_failed('header.name.mismatch',request_rule.title,request_rule.correct_response_name_message,header,'header.name')
+
     # Validate common header constraints
-    if header['payloadVersion'] != '2': raise_value_error(generate_error_message(header['name'],'header.payloadVersion must be \'2\' (string)',header))
-    if not re.match('^[a-zA-Z0-9\-]*$',header['messageId']): raise_value_error(generate_error_message(header['name'],'header.messageId must be specified in alphanumeric characters or - ',header))
-    if is_empty_string(header['messageId']): raise_value_error(generate_error_message(header['name'],'header.messageId must not be empty',header))
-    if len(header['messageId']) > 127: raise_value_error(generate_error_message(header['name'],'header.messageId must not exceed 127 characters',header))
+    if header['payloadVersion'] != '2': return check_failed('header.payloadVersion.invalid',header['name'],'header.payloadVersion must be \'2\' (string)',header,'header.payloadVersion')
+    failed_check = MESSAGE_ID_CONSTRAINT.check(header['messageId'])
+    if failed_check is not None: return MESSAGE_ID_CONSTRAINT.failed(failed_check,header['name'],header,'header.messageId')
+
+
+"""Dispatch tables, keyed by request namespace and by response name.
+
+Namespace checks take (request, response, deadline); only the discovery check has checks to skip.
+"""
+
+NAMESPACE_CHECKS = {
+    'Alexa.ConnectedHome.Discovery': check_discovery_response,
+    'Alexa.ConnectedHome.Control': check_control_response,
+    'Alexa.ConnectedHome.Query': check_query_response,
+    'Alexa.ConnectedHome.System': check_system_response
+}
+
+# Response names whose schema checks the same rules as the namespace check, less check_schema_residue
+SCHEMA_RESPONSE_NAME_SETS = {
+    'Alexa.ConnectedHome.Discovery': VALID_DISCOVERY_RESPONSE_NAME_SET,
+    'Alexa.ConnectedHome.Control': VALID_CONTROL_RESPONSE_NAME_SET,
+    'Alexa.ConnectedHome.Query': VALID_QUERY_RESPONSE_NAME_SET,
+    'Alexa.ConnectedHome.System': VALID_SYSTEM_RESPONSE_NAME_SET
+}
+
+RESPONSE_PAYLOAD_CHECKS = {
+    'SetTargetTemperatureConfirmation': check_temperature_confirmation_payload,
+    'IncrementTargetTemperatureConfirmation': check_temperature_confirmation_payload,
+    'DecrementTargetTemperatureConfirmation': check_temperature_confirmation_payload,
+    'SetLockStateConfirmation': check_lock_state_payload,
+    'GetLockStateResponse': check_lock_state_payload,
+    'GetTemperatureReadingResponse': check_temperature_reading_payload,
+    'GetTargetTemperatureResponse': check_target_temperature_payload,
+    'ValueOutOfRangeError': check_value_out_of_range_payload,
+    'DependentServiceUnavailableError': check_dependent_service_unavailable_payload,
+    'TargetFirmwareOutdatedError': check_firmware_outdated_payload,
+    'TargetBridgeFirmwareOutdatedError': check_firmware_outdated_payload,
+    'UnableToGetValueError': check_unable_error_info_payload,
+    'UnableToSetValueError': check_unable_error_info_payload,
+    'UnwillingToSetValueError': check_unwilling_error_info_payload,
+    'RateLimitExceededError': check_rate_limit_exceeded_payload,
+    'NotSupportedInCurrentModeError': check_not_supported_in_current_mode_payload,
+    'UnexpectedInformationReceivedError': check_unexpected_information_received_payload,
+    'HealthCheckResponse': check_health_check_payload
+}
 
 
 """Utility functions."""
@@ -547,20 +1485,199 @@ def is_number(s):
     try:
         float(s)
         return True
-    except ValueError:
+    except (ValueError,TypeError):
         return False
 
 def is_alphanumeric_and_spaces(s):
-    return re.match('^[a-zA-Z0-9äüöÄÜÖß ]*$',s)
+    return DEPENDENT_SERVICE_NAME_CONSTRAINT.check(s) is None
 
 def is_alphanumeric(s):
-    return re.match('^[a-zA-Z0-9äüöÄÜÖß]*$',s)    
+    return ALPHANUMERIC_CONSTRAINT.check(s) is None
 
 def is_empty_string(s):
     return len(str(s).strip()) == 0
 
+def is_one_of(value,valid_values):
+    try:
+        return value in valid_values
+    except TypeError:
+        return False
+
+def is_subset(values,valid_values):
+    try:
+        return valid_values.issuperset(values)
+    except TypeError:
+        return False
+
+def first_index(values,predicate):
+    """Return the index of the first of values for which predicate is true, or len(values)."""
+
+    for index,value in enumerate(values):
+        if predicate(value): return index
+    return len(values)
+
+def get_registered(registry,key):
+    try:
+        return registry.get(key)
+    except TypeError:
+        return None
+
+def appliance_path(index,key):
+    return 'payload.discoveredAppliances[' + str(index) + '].' + key
+
 def raise_value_error(message):
     raise ValueError(message)
 
+def raise_validation_error(rule,title,description,data,path=None):
+    raise ValidationError(rule,title,description,data,path)
+
+def raise_if_failed(result):
+    if result is not None and not result.ok: raise result.to_error()
+
+def check_result_rule(result):
+    return None if result is None or result.ok else result.rule
+
+def check_failed(rule,title,description,data,path=None):
+    return CheckResult(False,rule,path,title,description,data)
+
+def missing_payload_key(response_name,payload,key):
+    return CheckResult(False,'payload.' + key + '.missing','payload.' + key,response_name,'payload.' + key + ' is missing',payload)
+
+def non_dict_payload_key(response_name,payload,key):
+    return CheckResult(False,'payload.' + key + '.type','payload.' + key,response_name,'payload.' + key + ' must be a dict',payload)
+
 def generate_error_message(title,message,data):
     return title + ' :: ' + message + ': ' + format(data)
+
+def format_excerpt(data,limit=MAX_ERROR_EXCERPT_LENGTH):
+    """Format data the way format(data) does, stopping once more than limit characters are rendered."""
+
+    if type(data) not in (dict,list,tuple):
+        excerpt = format(data)
+    else:
+        chunks = []
+        length = 0
+        for chunk in iter_repr_chunks(data):
+            chunks.append(chunk)
+            length += len(chunk)
+            if length > limit: break
+        excerpt = ''.join(chunks)
+
+    if len(excerpt) > limit: excerpt = excerpt[:limit] + '...'
+    return excerpt
+
+def iter_repr_chunks(data):
+    if type(data) is dict:
+        yield '{'
+        separator = ''
+        for key,value in data.items():
+            yield separator + repr(key) + ': '
+            for chunk in iter_repr_chunks(value): yield chunk
+            separator = ', '
+        yield '}'
+    elif type(data) in (list,tuple):
+        yield '[' if type(data) is list else '('
+        separator = ''
+        for value in data:
+            yield separator
+            for chunk in iter_repr_chunks(value): yield chunk
+            separator = ', '
+        if type(data) is tuple and len(data) == 1: yield ','
+        yield ']' if type(data) is list else ')'
+    else:
+        yield repr(data)
+
+try:
+    JSON_RECURSION_ERROR = RecursionError
+except NameError:
+    JSON_RECURSION_ERROR = RuntimeError
+
+def json_size(data,limit):
+    """Return the size in bytes of json.dumps(data), as the Lambda runtime serializes a response.
+
+    The value is walked without building the JSON string, and the walk stops as soon as the size is known
+    to exceed limit, in which case any number above limit is returned. With the default ensure_ascii=True
+    the output is pure ASCII, so its length in characters is its UTF-8 length in bytes. Raises TypeError,
+    like json.dumps, for a value that cannot be serialized, and JSON_RECURSION_ERROR for a circular value
+    whose walk nests deeper than the recursion limit before exceeding limit, e.g. a list containing itself.
+    """
+
+    if data is None or data is True: return 4
+    if data is False: return 5
+    if isinstance(data,(TEXT_TYPE,str)):
+        # Every character is encoded in at least one byte, plus the two quotes
+        if len(data) + 2 > limit: return len(data) + 2
+        return len(json.encoder.encode_basestring_ascii(data))
+    if isinstance(data,float): return len(json_float_repr(data))
+    if isinstance(data,JSON_INTEGER_TYPES): return len(str(int(data)))
+
+    # An empty container already exceeds a limit below 2, which stops the walk of a circular value
+    if isinstance(data,(dict,list,tuple)) and limit < 2: return 2
+
+    if isinstance(data,dict):
+        size = 2
+        for key,value in data.items():
+            if size > 2: size += 2
+            size += json_key_size(key,limit - size) + 2
+            if size > limit: return size
+            size += json_size(value,limit - size)
+            if size > limit: return size
+        return size
+
+    if isinstance(data,(list,tuple)):
+        size = 2
+        for value in data:
+            if size > 2: size += 2
+            size += json_size(value,limit - size)
+            if size > limit: return size
+        return size
+
+    raise TypeError(repr(data) + ' is not JSON serializable')
+
+def json_key_size(key,limit):
+    if isinstance(key,(TEXT_TYPE,str)): return json_size(key,limit)
+    if key is None or key is True or key is False or isinstance(key,(float,) + JSON_INTEGER_TYPES):
+        # Non-string keys are converted to the string of their JSON value
+        return json_size(key,limit) + 2
+    raise TypeError('key ' + repr(key) + ' is not a string')
+
+def json_float_repr(value):
+    if value != value: return 'NaN'
+    if value == float('inf'): return 'Infinity'
+    if value == -float('inf'): return '-Infinity'
+    return float.__repr__(value)
+
+FAST_JSON_PARSERS = ('orjson','ujson')
+fast_json_loads = None
+
+def find_json_parser():
+    """Return the loads function of the first of FAST_JSON_PARSERS that is installed, or json.loads."""
+
+    for module_name in FAST_JSON_PARSERS:
+        try:
+            return __import__(module_name).loads
+        except ImportError:
+            pass
+    return json.loads
+
+def parse_json(data):
+    """Parse a JSON document (bytes or text) with the fastest JSON parser installed.
+
+    The parser is looked up on the first call, or by warm_up. The fast parsers are stricter than the
+    json module, e.g. about NaN or very large integers, so a document they reject is parsed again by
+    json, and what is valid JSON does not depend on which parser is installed.
+    """
+
+    global fast_json_loads
+    if fast_json_loads is None: fast_json_loads = find_json_parser()
+    try:
+        return fast_json_loads(data)
+    except ValueError:
+        if fast_json_loads is json.loads: raise
+        return json.loads(data)
+
+
+if __name__ == '__main__':
+    # Validate a JSONL corpus of request/response pairs, see batch_validation.py
+    from batch_validation import main
+    sys.exit(main())
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016-2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Amazon Software License (the "License"). You may not use this file except in
+# compliance with the License. A copy of the License is located at
+#
+#     http://aws.amazon.com/asl/
+#
+# or in the "license" file accompanying this file. This file is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+"""JSON Schemas of the responses checked by validation.py, and an engine that validates with them.
+
+build_response_schema() derives a JSON Schema (draft-07) document for a response name from the same
+constants and string constraints as validation.py, so that other services can validate responses
+without importing it. A schema covers every rule that only depends on the response itself; the rules
+relating a response to its request, and the serialized size of additionalApplianceDetails, are left
+to validation.check_schema_residue. Numbers given as strings are accepted in decimal notation.
+
+CompiledSchemaEngine compiles the schemas into Python code with a code-generating validator, by
+default fastjsonschema if it is installed, and plugs them into validation.py:
+    enable_compiled_schemas()
+
+The schemas can be exported one file per response name:
+    python validation_schema.py --output-dir schemas
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import validation
+
+SCHEMA_DIALECT = 'http://json-schema.org/draft-07/schema#'
+
+# What float() accepts, except for the underscores between digits accepted by Python 3
+NUMBER_STRING_PATTERN = u'^\\s*[+-]?(?:(?:[0-9]+(?:\\.[0-9]*)?|\\.[0-9]+)(?:[eE][+-]?[0-9]+)?|[iI][nN][fF](?:[iI][nN][iI][tT][yY])?|[nN][aA][nN])\\s*$'
+NUMBER_SCHEMA = {'anyOf': [{'type': ['number','boolean']},{'type': 'string','pattern': NUMBER_STRING_PATTERN}]}
+
+
+def build_response_schemas():
+    """Return the schema of every valid response name, keyed by response name."""
+
+    return dict((response_name,build_response_schema(response_name)) for response_name in validation.VALID_RESPONSE_NAMES)
+
+def build_response_schema(response_name):
+    namespaces = set()
+    for request_rule in validation.REQUEST_RULES.values():
+        if response_name in request_rule.response_names: namespaces.update(request_rule.namespaces)
+
+    return {
+        '$schema': SCHEMA_DIALECT,
+        'title': response_name,
+        'type': 'object',
+        'required': list(validation.REQUIRED_RESPONSE_KEYS),
+        'properties': {
+            'header': {
+                'type': 'object',
+                'required': list(validation.REQUIRED_HEADER_KEYS),
+                'properties': {
+                    'namespace': {'enum': sorted(namespaces)},
+                    'name': {'const': response_name},
+                    'payloadVersion': {'const': '2'},
+                    'messageId': string_schema(validation.MESSAGE_ID_CONSTRAINT)
+                }
+            },
+            'payload': build_payload_schema(response_name)
+        }
+    }
+
+def build_payload_schema(response_name):
+    if response_name in validation.VALID_DISCOVERY_RESPONSE_NAME_SET: return discovery_payload_schema()
+
+    schema = {'type': 'object'}
+    if response_name not in validation.VALID_SYSTEM_RESPONSE_NAME_SET:
+        if response_name in validation.VALID_NON_EMPTY_PAYLOAD_RESPONSE_NAME_SET:
+            schema['minProperties'] = 1
+        else:
+            schema['maxProperties'] = 0
+
+    payload_schema = PAYLOAD_SCHEMAS.get(response_name)
+    if payload_schema is not None: schema.update(payload_schema())
+    return schema
+
+def string_schema(constraint):
+    """Return the schema of a validation.StringConstraint."""
+
+    schema = {'type': 'string'}
+    if 'length' in constraint.checks and constraint.max_length is not None: schema['maxLength'] = constraint.max_length
+    pattern = u''
+    if 'empty' in constraint.checks: pattern = u'^(?!\\s*$)'
+    if 'charset' in constraint.checks: pattern = (pattern or u'^') + u'[' + constraint.charset + u']*$'
+    if pattern: schema['pattern'] = pattern
+    return schema
+
+def object_schema(properties,required=None):
+    return {
+        'type': 'object',
+        'required': list(properties) if required is None else required,
+        'properties': properties
+    }
+
+def value_schema(schema):
+    return object_schema({'value': schema})
+
+def enum_schema(valid_values):
+    return {'enum': list(valid_values)}
+
+
+"""Payload schemas, mirroring validation.RESPONSE_PAYLOAD_CHECKS."""
+
+def discovery_payload_schema():
+    properties = dict((key,string_schema(constraint)) for key,constraint in validation.DISCOVERED_APPLIANCE_STRING_CONSTRAINTS)
+    properties.update({
+        'isReachable': {'type': 'boolean'},
+        'actions': {'type': 'array','minItems': 1,'items': enum_schema(validation.VALID_ACTIONS)},
+        'additionalApplianceDetails': {'description': 'must not exceed ' + str(validation.MAX_ADDITIONAL_APPLIANCE_DETAILS_SIZE) + ' bytes when serialized to JSON'}
+    })
+    return object_schema({
+        'discoveredAppliances': {
+            'type': 'array',
+            'maxItems': validation.MAX_DISCOVERED_APPLIANCES,
+            'items': object_schema(properties,list(validation.REQUIRED_DISCOVERED_APPLIANCE_KEYS))
+        }
+    })
+
+def health_check_payload_schema():
+    return object_schema({
+        'description': string_schema(validation.HEALTH_CHECK_DESCRIPTION_CONSTRAINT),
+        'isHealthy': {'type': 'boolean'}
+    })
+
+def temperature_confirmation_payload_schema():
+    return object_schema({
+        'targetTemperature': value_schema(NUMBER_SCHEMA),
+        'temperatureMode': value_schema(enum_schema(validation.VALID_TEMPERATURE_MODES)),
+        'previousState': object_schema({
+            'targetTemperature': value_schema(NUMBER_SCHEMA),
+            'temperatureMode': value_schema(enum_schema(validation.VALID_TEMPERATURE_MODES))
+        })
+    })
+
+def lock_state_payload_schema():
+    return object_schema({'lockState': enum_schema(validation.VALID_LOCK_STATES)})
+
+def temperature_reading_payload_schema():
+    return object_schema({'temperatureReading': value_schema(NUMBER_SCHEMA)})
+
+def target_temperature_payload_schema():
+    temperature_mode = value_schema(enum_schema(validation.VALID_TEMPERATURE_MODES))
+    temperature_mode.update({
+        'if': {'properties': {'value': {'const': 'CUSTOM'}}},
+        'then': object_schema({'friendlyName': string_schema(validation.TEMPERATURE_MODE_FRIENDLY_NAME_CONSTRAINT)})
+    })
+    return object_schema({
+        'temperatureMode': temperature_mode,
+        'targetTemperature': value_schema(NUMBER_SCHEMA),
+        'coolingTargetTemperature': value_schema(NUMBER_SCHEMA),
+        'heatingTargetTemperature': value_schema(NUMBER_SCHEMA)
+    },['temperatureMode'])
+
+def value_out_of_range_payload_schema():
+    return object_schema({'minimumValue': NUMBER_SCHEMA,'maximumValue': NUMBER_SCHEMA})
+
+def dependent_service_unavailable_payload_schema():
+    return object_schema({'dependentServiceName': string_schema(validation.DEPENDENT_SERVICE_NAME_CONSTRAINT)})
+
+def firmware_outdated_payload_schema():
+    return object_schema(dict((key,string_schema(constraint)) for key,constraint in validation.FIRMWARE_VERSION_CONSTRAINTS),[key for key,constraint in validation.FIRMWARE_VERSION_CONSTRAINTS])
+
+def unable_error_info_payload_schema():
+    return error_info_payload_schema(validation.VALID_UNABLE_ERROR_INFO_CODES)
+
+def unwilling_error_info_payload_schema():
+    return error_info_payload_schema(validation.VALID_UNWILLING_ERROR_INFO_CODES)
+
+def error_info_payload_schema(valid_codes):
+    return object_schema({'errorInfo': object_schema({'code': enum_schema(valid_codes),'description': {}})})
+
+def rate_limit_exceeded_payload_schema():
+    return object_schema({
+        'rateLimit': {'type': 'string','pattern': u'^[0-9]+$'},
+        'timeUnit': enum_schema(validation.VALID_TIME_UNITS)
+    })
+
+def not_supported_in_current_mode_payload_schema():
+    return object_schema({'currentDeviceMode': enum_schema(validation.VALID_CURRENT_DEVICE_MODES)})
+
+def unexpected_information_received_payload_schema():
+    return object_schema({'faultingParameter': string_schema(validation.FAULTING_PARAMETER_CONSTRAINT)})
+
+PAYLOAD_SCHEMAS = {
+    'SetTargetTemperatureConfirmation': temperature_confirmation_payload_schema,
+    'IncrementTargetTemperatureConfirmation': temperature_confirmation_payload_schema,
+    'DecrementTargetTemperatureConfirmation': temperature_confirmation_payload_schema,
+    'SetLockStateConfirmation': lock_state_payload_schema,
+    'GetLockStateResponse': lock_state_payload_schema,
+    'GetTemperatureReadingResponse': temperature_reading_payload_schema,
+    'GetTargetTemperatureResponse': target_temperature_payload_schema,
+    'ValueOutOfRangeError': value_out_of_range_payload_schema,
+    'DependentServiceUnavailableError': dependent_service_unavailable_payload_schema,
+    'TargetFirmwareOutdatedError': firmware_outdated_payload_schema,
+    'TargetBridgeFirmwareOutdatedError': firmware_outdated_payload_schema,
+    'UnableToGetValueError': unable_error_info_payload_schema,
+    'UnableToSetValueError': unable_error_info_payload_schema,
+    'UnwillingToSetValueError': unwilling_error_info_payload_schema,
+    'RateLimitExceededError': rate_limit_exceeded_payload_schema,
+    'NotSupportedInCurrentModeError': not_supported_in_current_mode_payload_schema,
+    'UnexpectedInformationReceivedError': unexpected_information_received_payload_schema,
+    'HealthCheckResponse': health_check_payload_schema
+}
+
+
+class CompiledSchemaEngine(object):
+    """Schema engine for validation.enable_schema_engine, with one compiled validator per response name.
+
+    compile_schema turns a schema into a function that raises an exception for an invalid document, as
+    fastjsonschema.compile does, and must match a pattern's $ only at the end of the string, as ECMA 262
+    and fastjsonschema do but Python's re does not. Each schema is compiled the first time a response of
+    its name is checked, so that only the response names a skill sends cost compile time.
+
+    Validators such as fastjsonschema take a tuple for a JSON array, but the rules only take a list, so
+    a response with a tuple where its schema has an array is rejected before it is validated.
+    """
+
+    def __init__(self,compile_schema):
+        self.compile_schema = compile_schema
+        self.validators = {}
+        self.array_paths = {}
+        self.accepted = 0
+        self.rejected = 0
+
+    def accepts(self,response):
+        try:
+            response_name = response['header']['name']
+            validator = self.validators.get(response_name)
+        except (KeyError,TypeError):
+            return False
+        if validator is None:
+            if response_name not in validation.VALID_RESPONSE_NAMES: return False
+            schema = build_response_schema(response_name)
+            self.array_paths[response_name] = tuple(find_array_paths(schema))
+            validator = self.validators[response_name] = self.compile_schema(schema)
+
+        try:
+            if any(has_tuple_at(response,path) for path in self.array_paths[response_name]): raise TypeError('tuple is not a list')
+            validator(response)
+        except Exception:
+            self.rejected += 1
+            return False
+        self.accepted += 1
+        return True
+
+    def stats(self):
+        return {'compiled': len(self.validators),'accepted': self.accepted,'rejected': self.rejected}
+
+def find_array_paths(schema,path=()):
+    """Yield the path of every array in schema, as a tuple of property names and None for array items."""
+
+    if schema.get('type') == 'array':
+        yield path
+        if isinstance(schema.get('items'),dict):
+            for item_path in find_array_paths(schema['items'],path + (None,)): yield item_path
+    for key,property_schema in schema.get('properties',{}).items():
+        for property_path in find_array_paths(property_schema,path + (key,)): yield property_path
+
+def has_tuple_at(document,path):
+    """Return whether a value at path in document, as yielded by find_array_paths, is a tuple."""
+
+    value = document
+    for index,key in enumerate(path):
+        if key is None:
+            # The array itself is checked at its own path; only a list is walked into
+            if not isinstance(value,list): return False
+            return any(has_tuple_at(item,path[index + 1:]) for item in value)
+        if not isinstance(value,dict) or key not in value: return False
+        value = value[key]
+    return isinstance(value,tuple)
+
+def enable_compiled_schemas(compile_schema=None):
+    """Plug a CompiledSchemaEngine into validation.py and return it.
+
+    Without compile_schema, fastjsonschema.compile is used, and None is returned without changing
+    anything if fastjsonschema is not installed.
+    """
+
+    if compile_schema is None:
+        try:
+            import fastjsonschema
+        except ImportError:
+            return None
+        compile_schema = fastjsonschema.compile
+    return validation.enable_schema_engine(CompiledSchemaEngine(compile_schema))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export the JSON Schema of every response name.')
+    parser.add_argument('-o','--output-dir',help='write one <response name>.json file per response name to this directory, instead of one JSON object to stdout')
+    args = parser.parse_args(argv)
+
+    schemas = build_response_schemas()
+    if args.output_dir is None:
+        json.dump(schemas,sys.stdout,indent=2,separators=(',',': '),sort_keys=True)
+        sys.stdout.write('\n')
+        return 0
+
+    if not os.path.isdir(args.output_dir): os.makedirs(args.output_dir)
+    for response_name,schema in schemas.items():
+        with open(os.path.join(args.output_dir,response_name + '.json'),'w') as schema_file:
+            json.dump(schema,schema_file,indent=2,separators=(',',': '),sort_keys=True)
+            schema_file.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())